@@ -1,8 +1,15 @@
 # backend/logger_util.py
+import hashlib
 import os
+import random
+from contextvars import ContextVar
 from pathlib import Path
+from typing import Any, Optional
+
 from loguru import logger
 
+from utils.tracing import current_trace_id
+
 # ----------------------------------------------------------------------
 # 1️⃣  Où placer les logs ?
 # ----------------------------------------------------------------------
@@ -16,35 +23,118 @@ LOG_DIR.mkdir(parents=True, exist_ok=True)
 # ----------------------------------------------------------------------
 # 2️⃣  Configuration de Loguru
 # ----------------------------------------------------------------------
+LOG_ROTATION = os.getenv("LOG_ROTATION", "00:00")        # nouveau fichier chaque jour
+LOG_RETENTION = os.getenv("LOG_RETENTION", "30 days")
+LOG_COMPRESSION = os.getenv("LOG_COMPRESSION", "gz") or None
+# Chaînes plus longues : tronquées, avec longueur et hash du contenu complet
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "512"))
+LOG_MAX_ITEMS = int(os.getenv("LOG_MAX_ITEMS", "50"))
+# Taux d’échantillonnage des logs de succès par endpoint : « infer=0.2,search=0.05,default=1 »
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, rate in (
+        item.split("=", 1) for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if "=" in item
+    )
+}
+# Réponses plus lentes : toujours journalisées, quel que soit l’échantillonnage
+LOG_ALWAYS_SLOW_MS = int(os.getenv("LOG_ALWAYS_SLOW_MS", "5000"))
+
 logger.remove()  # désactive la configuration par défaut de Loguru
 
-# On écrit les logs au format JSONL (un objet JSON par ligne)
+# On écrit les logs au format JSONL (un objet JSON par ligne), via une file :
+# l’écriture disque se fait dans le thread de fond de Loguru, pas sur la requête.
 logger.add(
     LOG_DIR / "app.log",
-    rotation="30 days",          # rotation quotidienne, suppression après 30 jours
-    retention="30 days",
+    rotation=LOG_ROTATION,       # rotation quotidienne, fichiers compressés
+    retention=LOG_RETENTION,
+    compression=LOG_COMPRESSION,
     serialize=True,              # JSONL → chaque ligne est un JSON
+    enqueue=True,
     level="INFO",
 )
 
+
 # ----------------------------------------------------------------------
-# 3️⃣  Fonctions utilitaires (appelées depuis main.py)
+# 3️⃣  Plafonnement des champs et échantillonnage
+# ----------------------------------------------------------------------
+def cap_payload(value: Any, depth: int = 0) -> Any:
+    """
+    Copie de `value` bornée en taille : chaînes longues remplacées par
+    {"preview", "length", "sha256"}, listes et dicts limités à LOG_MAX_ITEMS.
+    """
+    if isinstance(value, str):
+        if len(value) <= LOG_MAX_FIELD_CHARS:
+            return value
+        digest = hashlib.sha256(value.encode("utf-8", "replace")).hexdigest()[:16]
+        return {"preview": value[:LOG_MAX_FIELD_CHARS], "length": len(value), "sha256": digest}
+    if depth >= 4:
+        return "…"
+    if isinstance(value, dict):
+        items = list(value.items())
+        capped = {str(k): cap_payload(v, depth + 1) for k, v in items[:LOG_MAX_ITEMS]}
+        if len(items) > LOG_MAX_ITEMS:
+            capped["_omitted"] = len(items) - LOG_MAX_ITEMS
+        return capped
+    if isinstance(value, (list, tuple)):
+        capped = [cap_payload(v, depth + 1) for v in value[:LOG_MAX_ITEMS]]
+        if len(value) > LOG_MAX_ITEMS:
+            capped.append({"_omitted": len(value) - LOG_MAX_ITEMS})
+        return capped
+    return value
+
+
+def sample_rate(endpoint: str) -> float:
+    return LOG_SAMPLE_RATES.get(endpoint, LOG_SAMPLE_RATES.get("default", 1.0))
+
+
+# Décision prise à la requête et réutilisée pour la réponse (même contexte)
+_sampled: ContextVar[Optional[bool]] = ContextVar("log_sampled", default=None)
+
+
+def _draw(endpoint: str) -> bool:
+    rate = sample_rate(endpoint)
+    return rate >= 1.0 or random.random() < rate
+
+
+# ----------------------------------------------------------------------
+# 4️⃣  Fonctions utilitaires (appelées depuis main.py)
 # ----------------------------------------------------------------------
 def log_request(endpoint: str, payload: dict):
-    """Log d’une requête entrante."""
-    logger.info("request", endpoint=endpoint, payload=payload)
+    """Log d’une requête entrante (échantillonné selon LOG_SAMPLE_RATES)."""
+    sampled = _draw(endpoint)
+    _sampled.set(sampled)
+    if sampled:
+        logger.info(
+            "request",
+            endpoint=endpoint,
+            payload=cap_payload(payload),
+            sample_rate=sample_rate(endpoint),
+            trace_id=current_trace_id(),
+        )
 
 
 def log_response(endpoint: str, response: dict, latency_ms: int):
-    """Log de la réponse renvoyée au client."""
+    """Log de la réponse renvoyée au client (toujours gardé si lent)."""
+    sampled = _sampled.get()
+    if sampled is None:
+        sampled = _draw(endpoint)
+    if not sampled and latency_ms < LOG_ALWAYS_SLOW_MS:
+        return
     logger.info(
         "response",
         endpoint=endpoint,
-        response=response,
+        response=cap_payload(response),
         latency_ms=latency_ms,
+        sample_rate=sample_rate(endpoint) if sampled else None,
+        trace_id=current_trace_id(),
     )
 
 
 def log_error(endpoint: str, error: str):
-    """Log d’une erreur interne."""
-    logger.error("error", endpoint=endpoint, error=error)
\ No newline at end of file
+    """Log d’une erreur interne (jamais échantillonné)."""
+    logger.error("error", endpoint=endpoint, error=cap_payload(error), trace_id=current_trace_id())
+
+
+def flush_logs():
+    """Attend que la file de Loguru soit écrite (à l’arrêt de l’API)."""
+    logger.complete()
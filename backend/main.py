@@ -1,25 +1,121 @@
 # backend/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
+import json
+import os
 import time
+from pathlib import Path
+from typing import List, Literal, Optional, Tuple
 
 # ----- IMPORTS ABSOLUS -----
 from schemas import (
     InferRequest, InferResponse,
-    SearchRequest, SearchResponse,
+    SearchRequest, SearchResponse, SearchBatchRequest, SearchBatchResponse,
+    IngestRequest, IngestJobStatus,
     RunTestsRequest, RunTestsResult,
-    UpdateModelResponse, HealthResponse,
+    RunTestsBatchRequest, RunTestsBatchItem,
+    UpdateModelRequest, ModelJobStatus, HealthResponse, ReadyResponse,
+    CacheStatsResponse, QueueStats, RouterStats, BackendState,
+    TraceListResponse, TraceDetail,
+    SessionInferRequest, SessionInferResponse,
 )
-from utils.preprocess import build_prompt
-from utils.postprocess import postprocess_code
-from utils.ollama_client import generate_code, OllamaError
-from utils.chroma_client import search_kb, add_documents
-from utils.sandbox_client import run_tests_in_sandbox, SandboxError
-from logger_util import log_request, log_response, log_error
+from utils.preprocess import assemble_prompt, followup_prompt, replay_instructions
+from utils.postprocess import postprocess_code_async, FenceStripper
+from utils.ollama_client import (
+    stream_code, generate_with_context, warm_model, pull_model, OllamaError,
+    start_client, close_client, get_client,
+    DEFAULT_MODEL,
+)
+from utils.cache import completion_cache, sandbox_cache, make_key
+from utils.dispatcher import dispatcher, PRIORITIES, QueueFullError
+from utils.router import router
+from utils.backends import pool
+from utils.sessions import Session, sessions
+from utils.chroma_client import (
+    search_kb, search_kb_batch, add_documents, warm_up_collection, warm_up_embedder,
+)
+from utils.lexical_index import lexical_index
+from utils.formatters import start_pool as start_formatters, shutdown_pool as stop_formatters
+from utils.ingest import ingest_directory, INGEST_BATCH_SIZE, INGEST_WORKERS
+from utils.jobs import jobs
+from utils.sandbox_client import run_tests_cached, SandboxError, batch_parallelism
+from utils.metrics import MetricsMiddleware, REGISTRY, CONTENT_TYPE, gauge, render_metrics
+from utils.tracing import TracingMiddleware, traces, TRACING_ENABLED
+from utils.warmup import readiness
+from logger_util import log_request, log_response, log_error, flush_logs
 
 # ---------------------------
 
-app = FastAPI(title="chloe‑code API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Client HTTP Ollama partagé (pool de connexions keep‑alive)
+    await start_client()
+    # Vérification périodique des serveurs Ollama (santé, modèles installés / chargés)
+    pool.start(get_client)
+    # Pool de formateurs (Black, sqlfluff) démarré à chaud, hors de la boucle
+    start_formatters()
+    # Préchauffage en tâche de fond : l’API accepte les connexions tout de
+    # suite (/healthz), /readyz passe à 200 quand les dépendances sont prêtes.
+    readiness.start(
+        {
+            "chroma": lambda: asyncio.to_thread(warm_up_collection),
+            "embedder": lambda: asyncio.to_thread(warm_up_embedder),
+            "ollama": lambda: warm_model(GENERATION_PARAMS["model"]),
+        },
+        on_error=lambda name, error: log_error("startup", f"Préchauffage {name} : {error}"),
+    )
+    try:
+        yield
+    finally:
+        readiness.stop()
+        pool.stop()
+        await close_client()
+        stop_formatters()
+        # Journal BM25 → segment compact, relu en mmap au prochain démarrage
+        await asyncio.to_thread(lexical_index.flush)
+        await asyncio.to_thread(flush_logs)
+
+
+app = FastAPI(title="chloe‑code API", version="0.1.0", lifespan=lifespan)
+# Compteurs / durées par route, exposés sur /metrics
+app.add_middleware(MetricsMiddleware)
+# Trace par requête (X-Trace-Id), spans des étapes, profilage sur demande
+app.add_middleware(TracingMiddleware)
+
+# Code dangereux (utils/scanner.py) : bloqué si activé, sinon simple avertissement
+BLOCK_DANGEROUS_CODE = os.getenv("BLOCK_DANGEROUS_CODE", "false").lower() in ("1", "true", "yes")
+
+# Paramètres de génération – font partie de la clé du cache de complétions.
+# Jamais modifiés sur place : /v1/update-model remplace le dict entier, et
+# chaque requête en lit une seule fois la référence (modèle cohérent de bout en bout).
+GENERATION_PARAMS = {
+    "model": DEFAULT_MODEL,
+    "max_tokens": 1024,
+    "temperature": 0.7,
+}
+
+
+def _completion_key(prompt: str, language: str, params: dict, latency: str) -> Tuple[str, int]:
+    """
+    Clé du cache de complétions et jeton de génération du cache, lu avant
+    l’appel au modèle : une complétion produite pendant une invalidation
+    (modèle re‑téléchargé) n’est pas mise en cache.
+    """
+    return make_key(prompt, language, params, latency), completion_cache.generation
+
+
+def _queue_full(exc: QueueFullError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+
+
+async def _stream_in_slot(prompt: str, priority: int, params: dict):
+    """stream_code exécuté dans un créneau du dispatcher (libéré en fin de flux)."""
+    async with dispatcher.slot(priority):
+        async for token in stream_code(prompt, **params):
+            yield token
+
 
 # -------------------------------------------------
 # Health‑check
@@ -29,6 +125,15 @@ async def health_check():
     return HealthResponse()
 
 
+@app.get("/readyz", response_model=ReadyResponse, responses={503: {"model": ReadyResponse}})
+async def readiness_check():
+    """Prêt quand les dépendances de READY_REQUIRED sont préchauffées (503 sinon)."""
+    resp = ReadyResponse(ready=readiness.ready, dependencies=readiness.snapshot())
+    if not resp.ready:
+        return JSONResponse(status_code=503, content=resp.dict())
+    return resp
+
+
 # -------------------------------------------------
 # 1️⃣  Génération de code
 # -------------------------------------------------
@@ -36,40 +141,334 @@ async def health_check():
 async def infer(req: InferRequest):
     start = time.time()
     log_request("infer", req.dict())
+    params = GENERATION_PARAMS
     try:
-        prompt = build_prompt(req.prompt, req.file_path, req.language)
-        raw = generate_code(prompt)                     # Ollama
-        code, warning = postprocess_code(
-            raw, req.language or "python", block_dangerous=False
+        language = req.language or "python"
+        prompt, prompt_tokens = await assemble_prompt(
+            req.prompt, req.file_path, req.language, use_kb=req.use_kb
         )
+        key, generation = _completion_key(prompt, language, params, req.latency)
+        hit = None if req.no_cache else await completion_cache.aget(key)
+        if hit is not None:
+            code, warning, model = hit["code"], hit["warning"], hit.get("model")
+        else:
+            # Modèle choisi par le routeur, appels via le dispatcher (fusion
+            # des appels identiques, file par priorité), relance sur le modèle
+            # suivant si la sortie est rejetée par les validateurs
+            raw, model = await router.generate(
+                prompt, params,
+                language=language,
+                prompt_tokens=prompt_tokens,
+                latency=req.latency,
+                priority=PRIORITIES[req.priority],
+            )
+            code, warning = await postprocess_code_async(
+                raw, language, block_dangerous=BLOCK_DANGEROUS_CODE
+            )
+            await completion_cache.aset(
+                key, {"code": code, "warning": warning, "model": model},
+                tag=params["model"], generation=generation,
+            )
         latency = int((time.time() - start) * 1000)
         resp = InferResponse(
             code=code,
             explanation=None,
             latency_ms=latency,
             warning=warning,
+            cached=hit is not None,
+            prompt_tokens=prompt_tokens,
+            model=model,
         )
         log_response("infer", resp.dict(), latency)
         return resp
     except OllamaError as exc:
         log_error("infer", str(exc))
         raise HTTPException(status_code=502, detail=str(exc))
+    except QueueFullError as exc:
+        log_error("infer", str(exc))
+        raise _queue_full(exc)
+
+
+def _sse(event: str, data: dict) -> str:
+    """Formate un évènement Server‑Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/v1/infer/stream")
+async def infer_stream(req: InferRequest):
+    """
+    Variante streaming de /v1/infer (Server‑Sent Events).
+    - `token` : fragments de code (fences Markdown déjà retirées) ;
+    - `done`  : InferResponse final (syntaxe vérifiée, formaté) + ttft_ms ;
+    - `error` : erreur Ollama survenue en cours de flux.
+    """
+    start = time.time()
+    log_request("infer-stream", req.dict())
+    params = GENERATION_PARAMS
+    language = req.language or "python"
+    prompt, prompt_tokens = await assemble_prompt(
+        req.prompt, req.file_path, req.language, use_kb=req.use_kb
+    )
+    key, generation = _completion_key(prompt, language, params, req.latency)
+    hit = None if req.no_cache else await completion_cache.aget(key)
+    if hit is not None:
+        latency = int((time.time() - start) * 1000)
+        resp = InferResponse(
+            code=hit["code"],
+            explanation=None,
+            latency_ms=latency,
+            warning=hit["warning"],
+            ttft_ms=latency,
+            cached=True,
+            prompt_tokens=prompt_tokens,
+            model=hit.get("model"),
+        )
+        log_response("infer-stream", resp.dict(), latency)
+
+        async def cached_events():
+            yield _sse("token", {"text": hit["code"]})
+            yield _sse("done", resp.dict())
+
+        return StreamingResponse(cached_events(), media_type="text/event-stream")
+
+    # Les tokens déjà envoyés ne peuvent pas être repris : pas de relance sur
+    # un autre modèle, le petit modèle n’est utilisé que sur demande explicite.
+    model = params["model"]
+    if req.latency == "fast":
+        model = router.plan(
+            model, prompt_tokens=prompt_tokens, language=language, latency="fast"
+        )[0][0]
+    tokens = _stream_in_slot(prompt, PRIORITIES[req.priority], {**params, "model": model})
+
+    # On attend le premier token avant de répondre : une erreur d’appel
+    # à Ollama est ainsi encore remontée en HTTP 502.
+    try:
+        first = await tokens.__anext__()
+    except StopAsyncIteration:
+        first = ""
+    except OllamaError as exc:
+        log_error("infer-stream", str(exc))
+        raise HTTPException(status_code=502, detail=str(exc))
+    except QueueFullError as exc:
+        log_error("infer-stream", str(exc))
+        raise _queue_full(exc)
+    ttft = int((time.time() - start) * 1000)
+
+    async def events():
+        stripper = FenceStripper()
+        raw_parts = [first]
+        text = stripper.feed(first)
+        if text:
+            yield _sse("token", {"text": text})
+        try:
+            async for token in tokens:
+                raw_parts.append(token)
+                text = stripper.feed(token)
+                if text:
+                    yield _sse("token", {"text": text})
+        except OllamaError as exc:
+            log_error("infer-stream", str(exc))
+            yield _sse("error", {"detail": str(exc)})
+            return
+        text = stripper.finish()
+        if text:
+            yield _sse("token", {"text": text})
+
+        code, warning = await postprocess_code_async(
+            "".join(raw_parts), language, block_dangerous=BLOCK_DANGEROUS_CODE
+        )
+        await completion_cache.aset(
+            key, {"code": code, "warning": warning, "model": model},
+            tag=params["model"], generation=generation,
+        )
+        latency = int((time.time() - start) * 1000)
+        resp = InferResponse(
+            code=code,
+            explanation=None,
+            latency_ms=latency,
+            warning=warning,
+            ttft_ms=ttft,
+            prompt_tokens=prompt_tokens,
+            model=model,
+        )
+        log_response("infer-stream", resp.dict(), latency)
+        yield _sse("done", resp.dict())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _session_rebuild_reason(
+    session: Optional[Session], requested: Optional[str], model: str, language: str
+) -> Optional[str]:
+    """None si le context de la session peut être repris tel quel."""
+    if session is None:
+        return "expired" if requested else "new"
+    if session.model != model:
+        return "model_changed"
+    if session.language != language:
+        return "language_changed"
+    if not session.context:
+        return "no_context"
+    return None
+
+
+@app.post("/v1/sessions/infer", response_model=SessionInferResponse)
+async def infer_session(req: SessionInferRequest):
+    """
+    Génération dans une session : au premier tour le prompt complet est
+    construit, ensuite seule la nouvelle instruction est envoyée avec le
+    `context` Ollama du tour précédent (préfixe non ré‑évalué).  Si le
+    context est perdu (session expirée, modèle ou langage changé), le prompt
+    complet est reconstruit en rejouant les instructions de la session.
+    """
+    start = time.time()
+    log_request("infer-session", req.dict())
+    params = GENERATION_PARAMS
+    language = req.language or "python"
+    session = sessions.get(req.session_id) if req.session_id else None
+    rebuilt = _session_rebuild_reason(session, req.session_id, params["model"], language)
+    if session is None:
+        session = Session(
+            req.session_id, model=params["model"], language=language, file_path=req.file_path
+        )
+    try:
+        if rebuilt is None:
+            prompt, prompt_tokens = followup_prompt(req.prompt)
+            context = session.context.tolist()
+        else:
+            prompt, prompt_tokens = await assemble_prompt(
+                replay_instructions(session.instructions, req.prompt),
+                req.file_path or session.file_path, req.language, use_kb=req.use_kb,
+            )
+            context = None
+        # Pas de fusion des appels ni de routage : le context est propre au modèle
+        # actif, et le serveur du tour précédent garde le préfixe en cache KV
+        async with dispatcher.slot(PRIORITIES[req.priority]):
+            raw, new_context, backend = await generate_with_context(
+                prompt, context, backend=session.backend if context else None, **params
+            )
+    except OllamaError as exc:
+        log_error("infer-session", str(exc))
+        raise HTTPException(status_code=502, detail=str(exc))
+    except QueueFullError as exc:
+        log_error("infer-session", str(exc))
+        raise _queue_full(exc)
+
+    code, warning = await postprocess_code_async(
+        raw, language, block_dangerous=BLOCK_DANGEROUS_CODE
+    )
+    session.language = language
+    session.advance(params["model"], req.prompt, new_context, backend)
+    sessions.put(session)
+    latency = int((time.time() - start) * 1000)
+    resp = SessionInferResponse(
+        code=code,
+        explanation=None,
+        latency_ms=latency,
+        warning=warning,
+        prompt_tokens=prompt_tokens,
+        model=params["model"],
+        session_id=session.id,
+        turn=session.turns,
+        context_reused=rebuilt is None,
+        rebuilt=rebuilt,
+    )
+    log_response("infer-session", resp.dict(), latency)
+    return resp
+
+
+@app.delete("/v1/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str):
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session inconnue ou expirée")
 
 
 # -------------------------------------------------
 # 2️⃣  Recherche KB
 # -------------------------------------------------
 @app.get("/v1/search", response_model=SearchResponse)
-async def search(q: str, k: int = 5):
+async def search(
+    q: str,
+    k: int = 5,
+    mode: Literal["vector", "lexical", "hybrid", "auto"] = "vector",
+):
     start = time.time()
-    log_request("search", {"q": q, "k": k})
-    results = search_kb(q, k)
+    log_request("search", {"q": q, "k": k, "mode": mode})
+    results = await asyncio.to_thread(search_kb, q, k, mode)   # modèle + ANN hors boucle
     resp = SearchResponse(results=results)
     latency = int((time.time() - start) * 1000)
     log_response("search", resp.dict(), latency)
     return resp
 
 
+@app.post("/v1/search/batch", response_model=SearchBatchResponse)
+async def search_batch(req: SearchBatchRequest):
+    start = time.time()
+    log_request("search-batch", {"queries": len(req.queries)})
+    results = await asyncio.to_thread(
+        search_kb_batch, [(q.query, q.k, q.mode) for q in req.queries]
+    )
+    resp = SearchBatchResponse(responses=[SearchResponse(results=r) for r in results])
+    latency = int((time.time() - start) * 1000)
+    log_response("search-batch", {"queries": len(req.queries)}, latency)
+    return resp
+
+
+# Racines autorisées pour l’ingestion (séparées par « : ») ; vide = ingestion
+# par l’API refusée (scripts/ingest_kb.py reste disponible)
+INGEST_ALLOWED_ROOTS = [
+    Path(p).resolve() for p in os.getenv("INGEST_ALLOWED_ROOTS", "").split(os.pathsep) if p
+]
+
+
+def _ingest_allowed(path: Path) -> bool:
+    return any(path == root or root in path.parents for root in INGEST_ALLOWED_ROOTS)
+
+
+@app.post("/v1/ingest", response_model=IngestJobStatus, status_code=202)
+async def ingest(req: IngestRequest):
+    """Lance l’indexation incrémentale d’un répertoire en tâche de fond."""
+    log_request("ingest", req.dict())
+    root = Path(req.path).expanduser().resolve()
+    if not root.is_dir():
+        raise HTTPException(status_code=400, detail=f"Répertoire introuvable : {req.path}")
+    if not _ingest_allowed(root):
+        raise HTTPException(status_code=403, detail="Répertoire hors des racines autorisées")
+    if jobs.active("ingest") is not None:
+        raise HTTPException(status_code=409, detail="Une ingestion est déjà en cours")
+
+    async def work(job):
+        start = time.time()
+        try:
+            stats = await asyncio.to_thread(
+                ingest_directory,
+                str(root),
+                source=req.source,
+                batch_size=req.batch_size or INGEST_BATCH_SIZE,
+                workers=req.workers or INGEST_WORKERS,
+                progress=job.progress.update,
+            )
+        except Exception as exc:
+            log_error("ingest", str(exc))
+            raise
+        log_response("ingest", stats, int((time.time() - start) * 1000))
+
+    job = jobs.submit("ingest", work)
+    return IngestJobStatus(**job.to_dict())
+
+
+@app.get("/v1/ingest/{job_id}", response_model=IngestJobStatus)
+async def ingest_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None or job.kind != "ingest":
+        raise HTTPException(status_code=404, detail="Tâche inconnue")
+    return IngestJobStatus(**job.to_dict())
+
+
 # -------------------------------------------------
 # 3️⃣  Exécution de tests sandbox
 # -------------------------------------------------
@@ -78,11 +477,14 @@ async def run_tests(req: RunTestsRequest):
     start = time.time()
     log_request("run-tests", req.dict())
     try:
-        status, log, duration = run_tests_in_sandbox(req.code, req.language)
+        status, log, duration, cached = await run_tests_cached(
+            req.code, req.language, no_cache=req.no_cache
+        )
         resp = RunTestsResult(
             status=status,
             log=log,
             duration_ms=duration,
+            cached=cached,
         )
         latency = int((time.time() - start) * 1000)
         log_response("run-tests", resp.dict(), latency)
@@ -92,28 +494,212 @@ async def run_tests(req: RunTestsRequest):
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.post("/v1/run-tests/batch")
+async def run_tests_batch(req: RunTestsBatchRequest):
+    """
+    Exécute un lot de snippets en parallèle (borné par les ressources du sandbox)
+    et renvoie les RunTestsBatchItem en NDJSON, dans l’ordre de complétion.
+    """
+    start = time.time()
+    log_request("run-tests-batch", {"items": len(req.items), "deadline_s": req.deadline_s})
+    limit = asyncio.Semaphore(batch_parallelism())
+
+    async def run_one(index: int, item: RunTestsRequest) -> RunTestsBatchItem:
+        async with limit:
+            try:
+                status, log, duration, cached = await run_tests_cached(
+                    item.code, item.language, no_cache=item.no_cache
+                )
+            except SandboxError as exc:
+                return RunTestsBatchItem(index=index, error=str(exc))
+        return RunTestsBatchItem(
+            index=index,
+            result=RunTestsResult(
+                status=status, log=log, duration_ms=duration, cached=cached
+            ),
+        )
+
+    async def lines():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + req.deadline_s
+        tasks = {
+            asyncio.ensure_future(run_one(i, item)): i
+            for i, item in enumerate(req.items)
+        }
+        pending = set(tasks)
+        counts = {"passed": 0, "failed": 0, "error": 0, "unfinished": 0}
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    item = task.result()
+                    counts[item.result.status if item.result else "error"] += 1
+                    yield item.json() + "\n"
+            for task in pending:
+                task.cancel()
+                counts["unfinished"] += 1
+                item = RunTestsBatchItem(index=tasks[task], error="Délai du lot dépassé")
+                yield item.json() + "\n"
+        finally:
+            # Client déconnecté ou délai dépassé : rien ne doit continuer à tourner
+            for task in tasks:
+                task.cancel()
+            latency = int((time.time() - start) * 1000)
+            log_response("run-tests-batch", counts, latency)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 # -------------------------------------------------
 # 4️⃣  Mise à jour du modèle (pull‑on‑demand)
 # -------------------------------------------------
-@app.post("/v1/update-model", response_model=UpdateModelResponse)
-async def update_model():
-    # Simple appel à Ollama via docker exec
-    import subprocess, shlex
-    try:
-        subprocess.run(
-            "docker exec chloe-code-ollama-1 ollama pull llama2-13b-chat-q4_0",
-            shell=True,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        return UpdateModelResponse(
-            message="Model updated",
-            model="llama2-13b-chat-q4_0",
-            version=None,
-        )
-    except subprocess.CalledProcessError as exc:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Ollama pull failed: {exc.stderr.decode()}",
-        )
\ No newline at end of file
+async def _activate_model(model: str) -> None:
+    """
+    Bascule les générations sur `model` : une seule réaffectation du dict,
+    les requêtes en cours terminent avec l’ancien modèle.  Les complétions
+    en cache des deux modèles (poids éventuellement mis à jour) sont invalidées.
+    """
+    global GENERATION_PARAMS
+    previous = GENERATION_PARAMS["model"]
+    GENERATION_PARAMS = {**GENERATION_PARAMS, "model": model}
+    for tag in {previous, model}:
+        await completion_cache.ainvalidate(tag=tag)
+
+
+def _model_job_status(job) -> ModelJobStatus:
+    return ModelJobStatus(**job.to_dict(), active_model=GENERATION_PARAMS["model"])
+
+
+@app.post("/v1/update-model", response_model=ModelJobStatus, status_code=202)
+async def update_model(req: Optional[UpdateModelRequest] = None):
+    """
+    Télécharge un modèle via l’API HTTP d’Ollama en tâche de fond
+    (pulling → warming → active) ; le modèle actif continue de servir
+    pendant tout le téléchargement et n’est remplacé qu’une fois le nouveau
+    chargé en mémoire.
+    """
+    req = req or UpdateModelRequest()
+    model = req.model or GENERATION_PARAMS["model"]
+    log_request("update-model", {"model": model, "activate": req.activate})
+    if jobs.active("model-pull") is not None:
+        raise HTTPException(status_code=409, detail="Un téléchargement de modèle est déjà en cours")
+
+    async def work(job):
+        start = time.time()
+        job.progress.update(model=model, phase="pulling")
+        try:
+            await pull_model(model, progress=job.progress.update)
+            if req.activate:
+                # Chargement hors dispatcher : aucun créneau de génération consommé
+                job.progress["phase"] = "warming"
+                await warm_model(model)
+                await _activate_model(model)
+                job.progress["phase"] = "active"
+            else:
+                if model == GENERATION_PARAMS["model"]:
+                    # Poids du modèle actif remplacés : ses complétions sont périmées
+                    await completion_cache.ainvalidate(tag=model)
+                job.progress["phase"] = "pulled"
+        except Exception as exc:
+            log_error("update-model", str(exc))
+            raise
+        log_response("update-model", dict(job.progress), int((time.time() - start) * 1000))
+
+    job = jobs.submit("model-pull", work)
+    return _model_job_status(job)
+
+
+@app.get("/v1/update-model/{job_id}", response_model=ModelJobStatus)
+async def update_model_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None or job.kind != "model-pull":
+        raise HTTPException(status_code=404, detail="Tâche inconnue")
+    return _model_job_status(job)
+
+
+# -------------------------------------------------
+# 5️⃣  Statistiques des caches
+# -------------------------------------------------
+@app.get("/v1/cache/stats", response_model=CacheStatsResponse)
+async def cache_stats():
+    return CacheStatsResponse(caches={
+        "completions": completion_cache.stats(),
+        "sandbox": sandbox_cache.stats(),
+    })
+
+
+# -------------------------------------------------
+# 6️⃣  File d’attente Ollama
+# -------------------------------------------------
+@app.get("/v1/queue", response_model=QueueStats)
+async def queue_stats():
+    return QueueStats(**dispatcher.stats())
+
+
+@app.get("/v1/backends", response_model=List[BackendState])
+async def backends_state():
+    """Serveurs Ollama du pool : santé, éjection, requêtes en cours, modèles."""
+    return [BackendState(**b) for b in pool.snapshot()]
+
+
+@app.get("/v1/router", response_model=RouterStats)
+async def router_stats():
+    """Modèles rapides configurés et statistiques (latence, rejets) par modèle."""
+    return RouterStats(**router.snapshot())
+
+
+# -------------------------------------------------
+# 7️⃣  Métriques Prometheus
+# -------------------------------------------------
+DISPATCHER_GAUGE = gauge("chloe_ollama_dispatcher", "État du dispatcher Ollama (GET /v1/queue)", ("stat",))
+CACHE_GAUGE = gauge("chloe_cache", "Compteurs des caches (GET /v1/cache/stats)", ("cache", "stat"))
+SESSION_GAUGE = gauge("chloe_sessions", "Compteurs du stockage des sessions", ("stat",))
+ROUTER_GAUGE = gauge("chloe_router_model", "Statistiques du routeur par modèle (GET /v1/router)", ("model", "stat"))
+
+
+def _collect_state() -> None:
+    for stat, value in dispatcher.stats().items():
+        DISPATCHER_GAUGE.set(value, stat=stat)
+    for cache in (completion_cache, sandbox_cache):
+        stats = cache.stats()
+        for stat in ("memory_entries", "memory_hits", "disk_hits", "misses"):
+            CACHE_GAUGE.set(stats[stat], cache=stats["name"], stat=stat)
+    for stat, value in sessions.stats().items():
+        SESSION_GAUGE.set(value, stat=stat)
+    for model, stats in router.snapshot()["models"].items():
+        for stat in ("latency_ms", "failure_rate"):
+            if stats[stat] is not None:
+                ROUTER_GAUGE.set(stats[stat], model=model, stat=stat)
+
+
+REGISTRY.add_collector(_collect_state)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Compteurs, jauges et histogrammes (par étape, langage, modèle) au format texte Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+
+# -------------------------------------------------
+# 8️⃣  Traces des dernières requêtes
+# -------------------------------------------------
+@app.get("/debug/traces", response_model=TraceListResponse)
+async def list_traces(limit: int = 50, min_ms: float = 0.0, name: Optional[str] = None):
+    """Dernières traces (les plus récentes d’abord), filtrables par durée et par route."""
+    if not TRACING_ENABLED:
+        raise HTTPException(status_code=404, detail="Traçage désactivé")
+    return TraceListResponse(traces=[t.summary() for t in traces.recent(limit, min_ms, name)])
+
+
+@app.get("/debug/traces/{trace_id}", response_model=TraceDetail)
+async def get_trace(trace_id: str):
+    trace = traces.get(trace_id) if TRACING_ENABLED else None
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace inconnue ou expirée")
+    return TraceDetail(**trace.to_dict())
@@ -1,7 +1,7 @@
 # backend/schemas.py
 from __future__ import annotations
-from typing import List, Optional, Literal
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional, Literal
+from pydantic import BaseModel, ConfigDict, Field
 
 
 # ----------------------------------------------------------------------
@@ -21,6 +21,23 @@ class InferRequest(BaseModel):
         None,
         description="Langage cible (facultatif, aide le LLM à choisir le bon fence)"
     )
+    no_cache: bool = Field(
+        False,
+        description="Ignore le cache de complétions (force un appel à Ollama)"
+    )
+    priority: Literal["interactive", "batch"] = Field(
+        "interactive",
+        description="Priorité dans la file Ollama (batch = bots / CI, servis après)"
+    )
+    use_kb: bool = Field(
+        False,
+        description="Ajoute au prompt les extraits les plus pertinents de la KB"
+    )
+    latency: Literal["fast", "balanced", "quality"] = Field(
+        "balanced",
+        description="Classe de latence : fast = petit modèle, quality = modèle actif, "
+                    "balanced = choix du routeur selon les statistiques"
+    )
 
 
 class InferResponse(BaseModel):
@@ -35,6 +52,22 @@ class InferResponse(BaseModel):
         None,
         description="Avertissement éventuel (ex. tests échoués, code dangereux)"
     )
+    ttft_ms: Optional[int] = Field(
+        None,
+        description="Temps jusqu’au premier token en millisecondes (mode streaming)"
+    )
+    cached: bool = Field(
+        False,
+        description="True si la réponse provient du cache de complétions"
+    )
+    prompt_tokens: Optional[int] = Field(
+        None,
+        description="Taille du prompt envoyé au modèle, en tokens"
+    )
+    model: Optional[str] = Field(
+        None,
+        description="Modèle qui a produit le code (choisi par le routeur)"
+    )
 
 
 # ----------------------------------------------------------------------
@@ -43,6 +76,10 @@ class InferResponse(BaseModel):
 class SearchRequest(BaseModel):
     query: str = Field(..., description="Texte de la recherche")
     k: int = Field(5, ge=1, le=20, description="Nombre de résultats à retourner")
+    mode: Literal["vector", "lexical", "hybrid", "auto"] = Field(
+        "vector",
+        description="vector (embeddings), lexical (BM25), hybrid (fusion RRF) ou auto",
+    )
 
 class SearchResult(BaseModel):
     title: str = Field(..., description="Titre du document/source")
@@ -53,6 +90,34 @@ class SearchResult(BaseModel):
 class SearchResponse(BaseModel):
     results: List[SearchResult]
 
+class SearchBatchRequest(BaseModel):
+    queries: List[SearchRequest] = Field(
+        ..., min_length=1, max_length=256, description="Requêtes, traitées en un seul lot"
+    )
+
+class SearchBatchResponse(BaseModel):
+    responses: List[SearchResponse] = Field(..., description="Une réponse par requête, dans l’ordre")
+
+class IngestRequest(BaseModel):
+    path: str = Field(..., description="Répertoire (côté serveur) à indexer")
+    source: Optional[str] = Field(
+        None, description="Nom de la source dans la KB (défaut : nom du répertoire)"
+    )
+    batch_size: Optional[int] = Field(None, ge=1, le=4096, description="Blocs par lot d’embedding")
+    workers: Optional[int] = Field(None, ge=1, le=16, description="Threads d’embedding")
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: Literal["queued", "running", "done", "failed"]
+    progress: Dict[str, Any] = Field(
+        default_factory=dict, description="Compteurs fichiers / blocs traités"
+    )
+    error: Optional[str] = None
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
 
 # ----------------------------------------------------------------------
 # 3️⃣  Exécution de tests dans le sandbox
@@ -63,27 +128,202 @@ class RunTestsRequest(BaseModel):
         "python", "r", "julia", "javascript", "typescript",
         "sql", "bash", "latex"
     ] = Field(..., description="Langage du snippet")
+    no_cache: bool = Field(
+        False,
+        description="Force l’exécution (code non déterministe : aléatoire, horloge, réseau…)"
+    )
 
 class RunTestsResult(BaseModel):
     status: Literal["passed", "failed", "error"]
     log: str = Field(..., description="Stdout + stderr du sandbox")
-    duration_ms: int = Field(..., description="Temps d’exécution du sandbox")
+    duration_ms: int = Field(
+        ..., description="Temps d’exécution du sandbox (celui de l’exécution d’origine si cached)"
+    )
+    cached: bool = Field(False, description="True si le résultat provient du cache")
+
+class RunTestsBatchRequest(BaseModel):
+    items: List[RunTestsRequest] = Field(..., min_length=1, max_length=500)
+    deadline_s: float = Field(
+        300, gt=0, le=3600,
+        description="Délai global du lot ; les éléments non terminés sont annulés"
+    )
+
+class RunTestsBatchItem(BaseModel):
+    """Une ligne NDJSON de la réponse de /v1/run-tests/batch."""
+    index: int = Field(..., description="Position de l’élément dans `items`")
+    result: Optional[RunTestsResult] = None
+    error: Optional[str] = Field(None, description="Erreur sandbox / délai dépassé")
 
 
 # ----------------------------------------------------------------------
 # 4️⃣  Mise à jour du modèle LLM (pull‑on‑demand)
 # ----------------------------------------------------------------------
-class UpdateModelResponse(BaseModel):
-    message: str = Field(..., description="Message de confirmation")
-    model: str = Field(..., description="Nom du modèle mis à jour")
-    version: Optional[str] = Field(
-        None,
-        description="Version du modèle (ex. tag Git ou date)"
+class UpdateModelRequest(BaseModel):
+    model: Optional[str] = Field(
+        None, description="Modèle à télécharger (défaut : modèle actif, pour le mettre à jour)"
     )
+    activate: bool = Field(
+        True, description="Basculer les générations sur ce modèle une fois préchauffé"
+    )
+
+
+class ModelJobStatus(IngestJobStatus):
+    """Tâche de téléchargement de modèle (POST / GET /v1/update-model)."""
+    active_model: str = Field(..., description="Modèle servant actuellement les générations")
+
+
+# ----------------------------------------------------------------------
+# 5️⃣  Statistiques des caches
+# ----------------------------------------------------------------------
+class CacheStats(BaseModel):
+    name: str
+    memory_entries: int = Field(..., description="Entrées dans le niveau mémoire (LRU)")
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    hit_rate: float = Field(..., description="Taux de succès global (0‑1)")
+
+class CacheStatsResponse(BaseModel):
+    caches: Dict[str, CacheStats]
 
 
 # ----------------------------------------------------------------------
-# 5️⃣  Health‑check
+# 6️⃣  File d’attente Ollama
+# ----------------------------------------------------------------------
+class QueueStats(BaseModel):
+    max_concurrency: int = Field(..., description="Appels Ollama simultanés autorisés")
+    in_flight: int = Field(..., description="Appels Ollama en cours")
+    queue_depth: int = Field(..., description="Requêtes en attente d’un créneau")
+    max_queue: int
+    completed: int
+    coalesced: int = Field(..., description="Requêtes fusionnées avec un appel identique en cours")
+    rejected: int = Field(..., description="Requêtes refusées (file pleine)")
+    avg_wait_ms: float
+    max_wait_ms: float
+    last_wait_ms: float
+
+
+class BackendState(BaseModel):
+    url: str
+    healthy: bool = Field(..., description="Dernières vérifications actives (/api/tags) réussies")
+    ejected: bool = Field(..., description="Écarté temporairement après des erreurs répétées")
+    outstanding: int = Field(..., description="Requêtes en cours sur ce serveur")
+    requests: int
+    errors: int
+    installed: Optional[List[str]] = Field(None, description="Modèles installés (None = pas encore vérifié)")
+    loaded: Optional[List[str]] = Field(None, description="Modèles en mémoire (/api/ps)")
+    last_error: Optional[str] = None
+    last_check: Optional[float] = None
+
+
+class FastModel(BaseModel):
+    model: str
+    max_prompt_tokens: int = Field(..., description="Au‑delà, le prompt part sur le modèle actif")
+
+
+class ModelRouteStats(BaseModel):
+    latency_ms: Optional[float] = Field(None, description="Moyenne mobile de la durée d’appel (hors file)")
+    failure_rate: float = Field(..., description="Moyenne mobile des sorties rejetées par les validateurs")
+    requests: int
+    failures: int
+
+
+class RouterStats(BaseModel):
+    enabled: bool = Field(..., description="False si aucun modèle rapide n’est configuré")
+    fast_models: List[FastModel] = Field(default_factory=list)
+    languages: List[str] = Field(default_factory=list)
+    models: Dict[str, ModelRouteStats] = Field(default_factory=dict)
+
+
+# ----------------------------------------------------------------------
+# 7️⃣  Health‑check
 # ----------------------------------------------------------------------
 class HealthResponse(BaseModel):
-    status: Literal["ok"] = "ok"
\ No newline at end of file
+    status: Literal["ok"] = "ok"
+
+class DependencyState(BaseModel):
+    state: Literal["pending", "ready", "failed", "disabled"] = Field(
+        ..., description="failed = dernier essai en échec, nouvel essai programmé ; "
+                         "disabled = préchauffage désactivé (WARMUP_ENABLED=false)"
+    )
+    attempts: int
+    error: Optional[str] = None
+    duration_ms: Optional[int] = Field(None, description="Durée du préchauffage réussi")
+
+class ReadyResponse(BaseModel):
+    ready: bool
+    dependencies: Dict[str, DependencyState]
+
+
+# ----------------------------------------------------------------------
+# 8️⃣  Traces (diagnostic)
+# ----------------------------------------------------------------------
+class TraceSummary(BaseModel):
+    trace_id: str
+    name: str = Field(..., description="Méthode et chemin de la requête")
+    started_at: float = Field(..., description="Horodatage Unix du début")
+    duration_ms: Optional[float] = None
+    status: Optional[int] = Field(None, description="Code HTTP renvoyé")
+    spans: int = Field(..., description="Nombre de spans enregistrés")
+    profiled: bool = False
+
+class TraceListResponse(BaseModel):
+    traces: List[TraceSummary]
+
+class TraceDetail(TraceSummary):
+    spans: List[Dict[str, Any]] = Field(
+        ..., description="Spans {id, parent, name, start_ms, duration_ms, error?, attributs…}"
+    )
+    dropped_spans: int = 0
+    profile: Optional[Dict[str, Any]] = Field(
+        None, description="Profil échantillonné (piles « folded ») si demandé par X-Profile"
+    )
+
+
+# ----------------------------------------------------------------------
+# 9️⃣  Sessions (raffinements successifs)
+# ----------------------------------------------------------------------
+class SessionInferRequest(BaseModel):
+    """
+    Tour d’une session : champs de `InferRequest` sans `no_cache` ni
+    `latency` (ni cache ni routage, le context est propre au modèle actif) ;
+    un champ inconnu est refusé (422) plutôt qu’ignoré.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    prompt: str = Field(..., description="Nouvelle instruction de l’utilisateur")
+    file_path: Optional[str] = Field(
+        None,
+        description="Chemin du fichier actif (utilisé quand le prompt complet est construit)"
+    )
+    language: Optional[Literal[
+        "python", "r", "julia", "javascript", "typescript",
+        "sql", "bash", "latex"
+    ]] = Field(
+        None,
+        description="Langage cible (facultatif, aide le LLM à choisir le bon fence)"
+    )
+    priority: Literal["interactive", "batch"] = Field(
+        "interactive",
+        description="Priorité dans la file Ollama (batch = bots / CI, servis après)"
+    )
+    use_kb: bool = Field(
+        False,
+        description="Ajoute au prompt complet les extraits les plus pertinents de la KB"
+    )
+    session_id: Optional[str] = Field(
+        None,
+        pattern=r"^[A-Za-z0-9_-]{1,64}$",
+        description="Session à poursuivre (absent = nouvelle session)"
+    )
+
+
+class SessionInferResponse(InferResponse):
+    session_id: str = Field(..., description="À renvoyer au tour suivant")
+    turn: int = Field(..., description="Numéro du tour dans la session (1 = premier)")
+    context_reused: bool = Field(
+        ..., description="True si seul le nouveau message a été envoyé (context Ollama réutilisé)"
+    )
+    rebuilt: Optional[Literal["new", "expired", "model_changed", "language_changed", "no_context"]] = Field(
+        None, description="Raison de la reconstruction du prompt complet"
+    )
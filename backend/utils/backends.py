@@ -0,0 +1,240 @@
+# backend/utils/backends.py
+import asyncio
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import httpx
+
+from utils.metrics import REGISTRY, counter, gauge, histogram
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+def normalize_host(host: str) -> str:
+    """« hôte:port » accepté, comme pour la CLI ollama."""
+    host = host.strip().rstrip("/")
+    return host if "://" in host else f"http://{host}"
+
+
+# Serveurs Ollama (séparés par des virgules) ; défaut : OLLAMA_HOST seul
+OLLAMA_HOSTS = [
+    normalize_host(host)
+    for host in os.getenv("OLLAMA_HOSTS", os.getenv("OLLAMA_HOST", "http://ollama:11434")).split(",")
+    if host.strip()
+]
+# Vérification active : GET /api/tags (modèles installés) et /api/ps (chargés)
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "2"))
+OLLAMA_UNHEALTHY_AFTER = int(os.getenv("OLLAMA_UNHEALTHY_AFTER", "2"))
+# Éjection passive : N erreurs consécutives (réseau / 5xx) → écarté N secondes
+OLLAMA_EJECT_AFTER = int(os.getenv("OLLAMA_EJECT_AFTER", "3"))
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))
+# Coût, en requêtes en cours, d’un serveur qui devra d’abord charger le modèle
+OLLAMA_COLD_PENALTY = float(os.getenv("OLLAMA_COLD_PENALTY", "2"))
+
+BACKEND_REQUESTS = counter(
+    "chloe_ollama_backend_requests_total", "Appels Ollama par serveur et issue", ("backend", "outcome")
+)
+BACKEND_SECONDS = histogram(
+    "chloe_ollama_backend_seconds", "Durée des appels Ollama par serveur", ("backend",)
+)
+BACKEND_GAUGE = gauge(
+    "chloe_ollama_backend", "État des serveurs Ollama (GET /v1/backends)", ("backend", "stat")
+)
+
+
+# ----------------------------------------------------------------------
+# Serveur Ollama
+# ----------------------------------------------------------------------
+class Backend:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.outstanding = 0
+        self.healthy = True               # optimiste tant qu’aucune vérification n’a échoué
+        self.installed: Optional[Set[str]] = None    # None = pas encore interrogé
+        self.loaded: Optional[Set[str]] = None
+        self.check_failures = 0
+        self.failures = 0                 # erreurs consécutives sur le trafic réel
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_check: Optional[float] = None
+
+    @property
+    def ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.ejected
+
+    def has_model(self, model: str) -> bool:
+        return self.installed is None or model in self.installed
+
+    def is_loaded(self, model: str) -> bool:
+        return self.loaded is not None and model in self.loaded
+
+    def mark(self, model: str, loaded: bool = False) -> None:
+        """Modèle installé (et chargé) sur ce serveur, sans attendre la prochaine vérification."""
+        if self.installed is not None:
+            self.installed.add(model)
+        if loaded:
+            self.loaded = (self.loaded or set()) | {model}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected": self.ejected,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "installed": sorted(self.installed) if self.installed is not None else None,
+            "loaded": sorted(self.loaded) if self.loaded is not None else None,
+            "last_error": self.last_error,
+            "last_check": self.last_check,
+        }
+
+
+def _is_backend_fault(exc: BaseException) -> bool:
+    """Erreur imputable au serveur (réseau, 5xx) plutôt qu’à la requête."""
+    if isinstance(exc, httpx.RequestError) or isinstance(exc.__cause__, httpx.RequestError):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status is not None and status >= 500
+
+
+# ----------------------------------------------------------------------
+# Pool : moins de requêtes en cours, vérifications actives, éjection passive
+# ----------------------------------------------------------------------
+class BackendPool:
+    """
+    Répartit les appels entre plusieurs serveurs Ollama :
+    - seuls les serveurs sains et non éjectés qui ont le modèle installé
+      sont candidats (aucun ne l’a : tous, Ollama répondra 404) ; parmi eux,
+      le moins chargé (requêtes en cours), un serveur où le modèle n’est pas
+      encore en mémoire comptant `OLLAMA_COLD_PENALTY` requêtes de plus ;
+    - une tâche de fond interroge /api/tags et /api/ps de chaque serveur ;
+    - `OLLAMA_EJECT_AFTER` erreurs consécutives écartent un serveur
+      `OLLAMA_EJECT_SECONDS` secondes.
+    Si aucun serveur n’est disponible, tous redeviennent candidats (mieux
+    vaut tenter un serveur douteux que refuser toutes les requêtes).
+    `prefer` (sessions) désigne le serveur qui détient déjà le préfixe en
+    cache KV : retenu quelle que soit sa charge tant qu’il est disponible et
+    a le modèle.
+    """
+
+    def __init__(self, hosts: List[str] = OLLAMA_HOSTS) -> None:
+        self.backends = [Backend(url) for url in hosts]
+        self._rotation = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    # -- Sélection ------------------------------------------------------
+    def pick(self, model: str, prefer: Optional[str] = None) -> Backend:
+        if prefer is not None:
+            for backend in self.backends:
+                if backend.url == prefer and backend.available and backend.has_model(model):
+                    return backend
+        with_model = [b for b in self.backends if b.has_model(model)] or self.backends
+        candidates = [b for b in with_model if b.available] or with_model
+        # Rotation à égalité : les serveurs inactifs se partagent le trafic
+        offset = next(self._rotation)
+        order = candidates[offset % len(candidates):] + candidates[:offset % len(candidates)]
+        return min(
+            order,
+            key=lambda b: b.outstanding + (0 if b.is_loaded(model) else OLLAMA_COLD_PENALTY),
+        )
+
+    @asynccontextmanager
+    async def lease(self, model: str, prefer: Optional[str] = None):
+        """Réserve le serveur choisi pour `model` pendant le bloc ; l’issue alimente l’éjection."""
+        backend = self.pick(model, prefer)
+        backend.outstanding += 1
+        backend.requests += 1
+        start = time.perf_counter()
+        try:
+            yield backend
+        except Exception as exc:
+            if _is_backend_fault(exc):
+                self._failed(backend, exc)
+                BACKEND_REQUESTS.inc(backend=backend.url, outcome="error")
+            else:
+                if getattr(exc, "status_code", None) == 404 and backend.installed is not None:
+                    backend.installed.discard(model)     # liste des modèles périmée
+                BACKEND_REQUESTS.inc(backend=backend.url, outcome="rejected")
+            raise
+        else:
+            backend.failures = 0
+            backend.mark(model, loaded=True)
+            BACKEND_REQUESTS.inc(backend=backend.url, outcome="ok")
+        finally:
+            backend.outstanding -= 1
+            BACKEND_SECONDS.observe(time.perf_counter() - start, backend=backend.url)
+
+    def _failed(self, backend: Backend, exc: BaseException) -> None:
+        backend.errors += 1
+        backend.failures += 1
+        backend.last_error = f"{type(exc).__name__}: {exc}"
+        if backend.failures >= OLLAMA_EJECT_AFTER:
+            backend.ejected_until = time.monotonic() + OLLAMA_EJECT_SECONDS
+            backend.failures = 0
+
+    # -- Vérifications actives -----------------------------------------
+    async def check(self, backend: Backend, client: httpx.AsyncClient) -> None:
+        timeout = httpx.Timeout(OLLAMA_HEALTH_TIMEOUT)
+        backend.last_check = time.time()
+        try:
+            response = await client.get(f"{backend.url}/api/tags", timeout=timeout)
+            response.raise_for_status()
+            installed = {m.get("name") or m.get("model") for m in response.json().get("models", [])}
+        except (httpx.HTTPError, ValueError) as exc:
+            backend.check_failures += 1
+            backend.last_error = f"{type(exc).__name__}: {exc}"
+            if backend.check_failures >= OLLAMA_UNHEALTHY_AFTER:
+                backend.healthy = False
+            return
+        backend.healthy, backend.check_failures = True, 0
+        backend.installed = installed
+        try:
+            response = await client.get(f"{backend.url}/api/ps", timeout=timeout)
+            if response.status_code == 200:
+                backend.loaded = {m.get("name") or m.get("model") for m in response.json().get("models", [])}
+        except (httpx.HTTPError, ValueError):
+            pass                        # /api/ps absent des anciennes versions d’Ollama
+
+    async def check_all(self, client: httpx.AsyncClient) -> None:
+        await asyncio.gather(*(self.check(b, client) for b in self.backends))
+
+    async def _run(self, get_client: Callable[[], httpx.AsyncClient], interval: float) -> None:
+        while True:
+            await self.check_all(get_client())
+            await asyncio.sleep(interval)
+
+    def start(self, get_client: Callable[[], httpx.AsyncClient], interval: float = OLLAMA_HEALTH_INTERVAL) -> None:
+        """Lance les vérifications périodiques (une seule tâche pour tous les serveurs)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(get_client, interval))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [b.to_dict() for b in self.backends]
+
+
+pool = BackendPool()
+
+
+def _collect() -> None:
+    for backend in pool.backends:
+        BACKEND_GAUGE.set(backend.outstanding, backend=backend.url, stat="outstanding")
+        BACKEND_GAUGE.set(1 if backend.available else 0, backend=backend.url, stat="available")
+
+
+REGISTRY.add_collector(_collect)
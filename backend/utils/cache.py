@@ -0,0 +1,270 @@
+# backend/utils/cache.py
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# ----------------------------------------------------------------------
+# Répertoire du cache persistant : voisin de CHROMA_DB_PATH par défaut
+# ----------------------------------------------------------------------
+CACHE_DIR = Path(
+    os.getenv(
+        "CACHE_DIR",
+        str(
+            Path(os.getenv("CHROMA_DB_PATH", os.path.expanduser("~/.chroma")))
+            .expanduser()
+            .parent
+            / "chloe-cache"
+        ),
+    )
+)
+
+
+def make_key(*parts: Any) -> str:
+    """Clé de cache stable (SHA‑256) à partir de valeurs sérialisables en JSON."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ----------------------------------------------------------------------
+# Cache à deux niveaux : LRU mémoire + SQLite sur disque
+# ----------------------------------------------------------------------
+class TwoTierCache:
+    """
+    Cache clé → valeur JSON avec un niveau mémoire (LRU) devant un niveau
+    persistant SQLite.  Les entrées expirent après `ttl` secondes et chaque
+    niveau est borné en nombre d’entrées (éviction des moins récemment lues).
+    Un `tag` optionnel (ex. nom du modèle) permet une invalidation ciblée.
+
+    Depuis la boucle asyncio, utiliser `aget` / `aset` : seul le niveau
+    mémoire est consulté sur la boucle, les accès SQLite passent par un
+    thread (`asyncio.to_thread`).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: Path,
+        *,
+        max_entries: int = 1024,
+        max_disk_entries: int = 100_000,
+        ttl: float = 7 * 24 * 3600,
+    ) -> None:
+        self.name = name
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()          # niveau mémoire (jamais tenu pendant une E/S)
+        self._db_lock = threading.Lock()       # connexion SQLite
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self._generation = 0                   # incrémenté par invalidate()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # -- SQLite (ouvert à la première utilisation) ---------------------
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path), check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, tag TEXT,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries(accessed)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_tag ON entries(tag)")
+            self._db = db
+        return self._db
+
+    def _remember(self, key: str, value: Any, tag: Optional[str], created: float) -> None:
+        self._memory[key] = (value, tag, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_get(self, key: str, now: float) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, tag, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return True, value
+                del self._memory[key]
+        return False, None
+
+    def _disk_get(self, key: str, now: float) -> Optional[Any]:
+        generation = self._generation
+        with self._db_lock:
+            db = self._conn()
+            row = db.execute(
+                "SELECT value, tag, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            raw, tag, created = row
+            if now - created > self.ttl:
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                db.commit()
+                self.misses += 1
+                return None
+            db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            db.commit()
+            self.disk_hits += 1
+        value = json.loads(raw)
+        # Pas de remontée en mémoire d’une entrée invalidée depuis la lecture
+        self._remember_if_current(key, value, tag, created, generation)
+        return value
+
+    def _disk_set(self, key: str, raw: str, tag: Optional[str], now: float, generation: int) -> None:
+        with self._db_lock:
+            if generation != self._generation:
+                return                      # invalidé entre‑temps : valeur périmée
+            db = self._conn()
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, tag, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, raw, tag, now, now),
+            )
+            self._writes += 1
+            # L’éviction disque n’est vérifiée que périodiquement (COUNT coûteux)
+            if self._writes % 100 == 0:
+                self._evict_disk(db, now)
+            db.commit()
+
+    # -- API publique --------------------------------------------------
+    def get(self, key: str) -> Optional[Any]:
+        """Retourne la valeur associée à `key` ou None (absente / expirée)."""
+        now = time.time()
+        found, value = self._memory_get(key, now)
+        return value if found else self._disk_get(key, now)
+
+    @property
+    def generation(self) -> int:
+        """
+        Jeton à lire *avant* de calculer une valeur et à passer à `set` /
+        `aset` : si `invalidate` a eu lieu entre‑temps, la valeur (calculée
+        sur des données périmées, ex. anciens poids du modèle) n’est pas gardée.
+        """
+        return self._generation
+
+    def _remember_if_current(self, key: str, value: Any, tag: Optional[str], now: float, generation: int) -> bool:
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._remember(key, value, tag, now)
+            return True
+
+    def set(self, key: str, value: Any, *, tag: Optional[str] = None, generation: Optional[int] = None) -> None:
+        """Enregistre `value` (sérialisable en JSON) dans les deux niveaux."""
+        now = time.time()
+        generation = self._generation if generation is None else generation
+        raw = json.dumps(value, ensure_ascii=False)
+        if self._remember_if_current(key, value, tag, now, generation):
+            self._disk_set(key, raw, tag, now, generation)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """`get` sans bloquer la boucle : le niveau SQLite est lu dans un thread."""
+        now = time.time()
+        found, value = self._memory_get(key, now)
+        if found:
+            return value
+        return await asyncio.to_thread(self._disk_get, key, now)
+
+    async def aset(
+        self, key: str, value: Any, *, tag: Optional[str] = None, generation: Optional[int] = None
+    ) -> None:
+        """`set` sans bloquer la boucle : écriture SQLite (et éviction) dans un thread."""
+        now = time.time()
+        generation = self._generation if generation is None else generation
+        raw = json.dumps(value, ensure_ascii=False)
+        if self._remember_if_current(key, value, tag, now, generation):
+            await asyncio.to_thread(self._disk_set, key, raw, tag, now, generation)
+
+    def _evict_disk(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        (count,) = db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            db.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM entries ORDER BY accessed ASC LIMIT ?)",
+                (excess,),
+            )
+
+    def invalidate(self, tag: Optional[str] = None) -> None:
+        """Supprime les entrées portant `tag`, ou tout le cache si `tag` est None."""
+        with self._db_lock:
+            self._generation += 1
+            with self._lock:
+                if tag is None:
+                    self._memory.clear()
+                else:
+                    for key in [k for k, (_, t, _) in self._memory.items() if t == tag]:
+                        del self._memory[key]
+            db = self._conn()
+            if tag is None:
+                db.execute("DELETE FROM entries")
+            else:
+                db.execute("DELETE FROM entries WHERE tag = ?", (tag,))
+            db.commit()
+
+    async def ainvalidate(self, tag: Optional[str] = None) -> None:
+        """`invalidate` sans bloquer la boucle (DELETE SQLite dans un thread)."""
+        await asyncio.to_thread(self.invalidate, tag)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "name": self.name,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# ----------------------------------------------------------------------
+# Cache des complétions /v1/infer
+# ----------------------------------------------------------------------
+completion_cache = TwoTierCache(
+    "completions",
+    CACHE_DIR / "completions.sqlite3",
+    max_entries=int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "1024")),
+    max_disk_entries=int(os.getenv("COMPLETION_CACHE_MAX_DISK_ENTRIES", "100000")),
+    ttl=float(os.getenv("COMPLETION_CACHE_TTL", str(7 * 24 * 3600))),
+)
+
+
+# ----------------------------------------------------------------------
+# Cache des résultats du sandbox (/v1/run-tests)
+# ----------------------------------------------------------------------
+sandbox_cache = TwoTierCache(
+    "sandbox",
+    CACHE_DIR / "sandbox.sqlite3",
+    max_entries=int(os.getenv("SANDBOX_CACHE_MAX_ENTRIES", "1024")),
+    max_disk_entries=int(os.getenv("SANDBOX_CACHE_MAX_DISK_ENTRIES", "100000")),
+    ttl=float(os.getenv("SANDBOX_CACHE_TTL", str(24 * 3600))),
+)
@@ -1,10 +1,14 @@
 # backend/utils/chroma_client.py
+import hashlib
 import os
-import uuid
-from typing import List, Dict, Any
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 
-import chromadb
-from chromadb.utils import embedding_functions
+from utils.lexical_index import lexical_index
+from utils.metrics import stage
 
 # ----------------------------------------------------------------------
 # Chemin du vecteur‑store (défini via variable d’environnement ou fallback)
@@ -15,84 +19,346 @@ CHROMA_DB_PATH = os.getenv(
 )
 
 # ----------------------------------------------------------------------
-# Client persistant – API moderne (v0.5+)
+# Modèle d’embedding (chargé une seule fois, résident en mémoire)
 # ----------------------------------------------------------------------
-# Le constructeur accepte simplement le chemin du répertoire.
-client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
 
 # ----------------------------------------------------------------------
-# Collection unique « default » – créée à la volée si elle n’existe pas
+# Recherche hybride (BM25 + vecteurs)
+# ----------------------------------------------------------------------
+SEARCH_DEFAULT_MODE = os.getenv("SEARCH_DEFAULT_MODE", "vector")
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "4"))   # × k par liste
+
+# ----------------------------------------------------------------------
+# Collection unique « default » – créée à la volée si elle n’existe pas
 # ----------------------------------------------------------------------
 _COLLECTION_NAME = "default"
 
+_lock = threading.Lock()
+_client = None
+_embedder = None
+_collection = None
+
+
+def get_client():
+    """
+    Client persistant Chroma (API v0.5+), créé au premier appel : l’import
+    de `chromadb` (~1 s) n’a pas lieu à l’import de l’API mais pendant le
+    préchauffage en tâche de fond (ou à la première recherche).
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import chromadb
+                _client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    return _client
+
+
+def get_embedder():
+    """
+    Retourne le modèle SentenceTransformer, chargé au premier appel puis
+    conservé pour toute la durée de vie du processus.
+    """
+    global _embedder
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                from sentence_transformers import SentenceTransformer
+                _embedder = SentenceTransformer(EMBEDDING_MODEL, device=EMBEDDING_DEVICE)
+    return _embedder
+
+
 def _get_collection():
     """
-    Retourne (ou crée) la collection nommée « default ».
-    Utilise le même embedding function que précédemment.
+    Retourne (ou crée) la collection nommée « default ».
+    Le handle est mis en cache ; les embeddings sont toujours calculés par
+    nous (`embed_texts` / `embed_queries`), la collection n’a donc pas
+    d’embedding function propre.
     """
-    if _COLLECTION_NAME in client.list_collections():
-        return client.get_collection(name=_COLLECTION_NAME)
+    global _collection
+    if _collection is None:
+        client = get_client()
+        with _lock:
+            if _collection is None:
+                _collection = client.get_or_create_collection(
+                    name=_COLLECTION_NAME,
+                    embedding_function=None,
+                    metadata={"description": "Knowledge base for chloe‑code"},
+                )
+    return _collection
 
-    embed_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2",
-        device="cpu",               # on utilise le CPU (ou le GPU via CoreML si disponible)
-    )
-    return client.create_collection(
-        name=_COLLECTION_NAME,
-        embedding_function=embed_fn,
-        metadata={"description": "Knowledge base for chloe‑code"},
+
+def warm_up_collection() -> None:
+    """Ouvre la collection (et reconstruit l’index BM25 s’il est vide)."""
+    collection = _get_collection()
+    if len(lexical_index) == 0 and collection.count() > 0:
+        rebuild_lexical_index()
+
+
+def warm_up_embedder() -> None:
+    """Charge le modèle d’embedding et exécute un premier encodage."""
+    embed_queries(["warm-up"])
+
+
+def warm_up() -> None:
+    """Charge le modèle d’embedding et ouvre la collection (appelé au démarrage)."""
+    warm_up_collection()
+    warm_up_embedder()
+
+
+def rebuild_lexical_index(page_size: int = 1000) -> int:
+    """Reconstruit l’index BM25 à partir des documents de la collection."""
+    collection = _get_collection()
+    lexical_index.clear()
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=["documents"])
+        if not page["ids"]:
+            break
+        lexical_index.add(page["ids"], page["documents"])
+        offset += len(page["ids"])
+    lexical_index.flush()
+    return offset
+
+
+# ----------------------------------------------------------------------
+# Embeddings
+# ----------------------------------------------------------------------
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Calcule les embeddings de `texts` par lots de EMBEDDING_BATCH_SIZE."""
+    if not texts:
+        return []
+    vectors = get_embedder().encode(
+        texts,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        convert_to_numpy=True,
+        show_progress_bar=False,
     )
+    return vectors.tolist()
+
+
+def _normalize_query(query: str) -> str:
+    """Normalisation de la clé du cache : Unicode NFC + espaces compactés."""
+    return " ".join(unicodedata.normalize("NFC", query).split())
+
+
+class _QueryEmbeddingCache:
+    """LRU (thread‑safe) texte de requête normalisé → embedding."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_query_cache = _QueryEmbeddingCache(QUERY_EMBEDDING_CACHE_SIZE)
+
+
+def embed_queries(queries: List[str]) -> List[List[float]]:
+    """
+    Embeddings des requêtes : les requêtes déjà vues sont servies par le LRU,
+    les autres sont calculées en un seul lot.
+    """
+    keys = [_normalize_query(q) for q in queries]
+    vectors: List[Optional[List[float]]] = [_query_cache.get(k) for k in keys]
+    missing = sorted({k for k, v in zip(keys, vectors) if v is None})
+    if missing:
+        computed = dict(zip(missing, embed_texts(missing)))
+        for key, vector in computed.items():
+            _query_cache.put(key, vector)
+        vectors = [v if v is not None else computed[k] for k, v in zip(keys, vectors)]
+    return vectors
+
 
 # ----------------------------------------------------------------------
 # 1️⃣  Recherche de documents
 # ----------------------------------------------------------------------
-def search_kb(query: str, k: int = 5) -> List[Dict[str, Any]]:
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][\w.:$-]*$")
+
+
+def _item(doc: str, meta: Optional[Dict[str, Any]], score: float) -> Dict[str, Any]:
+    meta = meta or {}
+    return {
+        "title": meta.get("title", "Untitled"),
+        "snippet": doc,
+        "url": meta.get("url"),
+        "score": round(score, 4),
+    }
+
+
+def _fetch(ids: List[str]) -> Dict[str, Tuple[str, Optional[Dict[str, Any]]]]:
+    """Documents et métadonnées de `ids` (lecture Chroma, sans embedding)."""
+    if not ids:
+        return {}
+    got = _get_collection().get(ids=ids, include=["documents", "metadatas"])
+    return {
+        doc_id: (doc, meta)
+        for doc_id, doc, meta in zip(got["ids"], got["documents"], got["metadatas"])
+    }
+
+
+def _lexical(query: str, k: int) -> List[Dict[str, Any]]:
+    hits = lexical_index.search(query, k)
+    if not hits:
+        return []
+    docs = _fetch([doc_id for doc_id, _ in hits])
+    best = hits[0][1]
+    # Score BM25 ramené à 0‑1 relativement au meilleur résultat
+    return [
+        _item(*docs[doc_id], score / best)
+        for doc_id, score in hits
+        if doc_id in docs
+    ]
+
+
+def _fuse(
+    vector: Tuple[List[str], List[str], List[Dict[str, Any]]],
+    lexical: List[Tuple[str, float]],
+    k: int,
+) -> List[Dict[str, Any]]:
+    """Reciprocal‑rank fusion des deux classements, score ramené à 0‑1."""
+    ids, docs, metas = vector
+    fused: Dict[str, float] = {}
+    for rank, doc_id in enumerate(ids):
+        fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    for rank, (doc_id, _) in enumerate(lexical):
+        fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    top = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+    known = {doc_id: (doc, meta) for doc_id, doc, meta in zip(ids, docs, metas)}
+    known.update(_fetch([doc_id for doc_id, _ in top if doc_id not in known]))
+    best = 2.0 / (RRF_K + 1)
+    return [_item(*known[doc_id], score / best) for doc_id, score in top if doc_id in known]
+
+
+def search_kb(query: str, k: int = 5, mode: str = SEARCH_DEFAULT_MODE) -> List[Dict[str, Any]]:
     """
-    Recherche les `k` documents les plus similaires à `query`.
+    Recherche les `k` documents les plus pertinents pour `query`.
     Retourne une liste de dicts compatibles avec le schéma SearchResult.
+    Appel bloquant (modèle + ANN) : à exécuter hors de la boucle asyncio.
+
+    `mode` : « vector » (similarité d’embedding), « lexical » (BM25, sans
+    embedding), « hybrid » (fusion RRF des deux) ou « auto » (lexical pour
+    une requête identifiant qui a des résultats, hybride sinon).
     """
-    collection = _get_collection()
-    results = collection.query(
-        query_texts=[query],
-        n_results=k,
-        include=["documents", "metadatas", "distances"],
-    )
-    docs = results["documents"][0]
-    metas = results["metadatas"][0]
-    distances = results["distances"][0]
-
-    items = []
-    for doc, meta, dist in zip(docs, metas, distances):
-        score = 1.0 - float(dist)          # distance → score (0‑1)
-        items.append(
-            {
-                "title": meta.get("title", "Untitled"),
-                "snippet": doc,
-                "url": meta.get("url"),
-                "score": round(score, 4),
-            }
+    return search_kb_batch([(query, k, mode)])[0]
+
+
+def search_kb_batch(queries: List[Tuple[Any, ...]]) -> List[List[Dict[str, Any]]]:
+    """
+    Recherche groupée sur des tuples (query, k[, mode]) : les requêtes qui ont
+    besoin de vecteurs partagent un seul lot d’embeddings et un seul
+    `collection.query` (avec le plus grand `k`), puis sont tronquées.
+    Retourne les résultats dans l’ordre des requêtes.
+    """
+    with stage("search_kb"):
+        return _search_batch(queries)
+
+
+def _search_batch(queries: List[Tuple[Any, ...]]) -> List[List[Dict[str, Any]]]:
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+    vector_needed: List[Tuple[int, str, int, str]] = []
+    for index, (query, k, *rest) in enumerate(queries):
+        mode = rest[0] if rest else SEARCH_DEFAULT_MODE
+        if mode == "auto":
+            # Chemin rapide : un identifiant trouvé par BM25 n’a pas besoin du modèle
+            if _IDENTIFIER_RE.match(query.strip()):
+                results[index] = _lexical(query, k)
+                if results[index]:
+                    continue
+            mode = "hybrid"
+        if mode == "lexical":
+            results[index] = _lexical(query, k)
+        else:
+            vector_needed.append((index, query, k, mode))
+
+    if vector_needed:
+        n_results = max(
+            k * (HYBRID_CANDIDATES if m == "hybrid" else 1)
+            for _, _, k, m in vector_needed
         )
-    return items
+        answer = _get_collection().query(
+            query_embeddings=embed_queries([query for _, query, _, _ in vector_needed]),
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"],
+        )
+        for (index, query, k, mode), ids, docs, metas, distances in zip(
+            vector_needed, answer["ids"], answer["documents"],
+            answer["metadatas"], answer["distances"],
+        ):
+            if mode == "hybrid":
+                lexical = lexical_index.search(query, k * HYBRID_CANDIDATES)
+                cut = k * HYBRID_CANDIDATES
+                results[index] = _fuse((ids[:cut], docs[:cut], metas[:cut]), lexical, k)
+            else:
+                results[index] = [
+                    _item(doc, meta, 1.0 - float(dist))      # distance → score (0‑1)
+                    for doc, meta, dist in zip(docs[:k], metas[:k], distances[:k])
+                ]
+    return results
 
 # ----------------------------------------------------------------------
 # 2️⃣  Ajout / indexation de documents
 # ----------------------------------------------------------------------
+def content_id(document: str, namespace: str = "") -> str:
+    """Identifiant stable d’un document : hash de son contenu (et d’un espace de noms)."""
+    raw = f"{namespace}\0{document}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+
 def add_documents(
     documents: List[str],
     metadatas: List[Dict[str, Any]] = None,
-) -> None:
+    ids: Optional[List[str]] = None,
+) -> List[str]:
     """
-    Ajoute une série de blocs de code (documents) dans la collection.
+    Ajoute (ou met à jour) une série de blocs de code (documents) dans la collection.
     Si `metadatas` n’est pas fourni, on crée des titres génériques.
+    Sans `ids`, l’identifiant est le hash du contenu : réindexer le même
+    document ne crée pas de doublon.  Retourne les ids utilisés.
     """
     collection = _get_collection()
+    if ids is None:
+        ids = [content_id(doc) for doc in documents]
     if metadatas is None:
-        metadatas = [{"title": f"doc-{uuid.uuid4()}"} for _ in documents]
+        metadatas = [{"title": f"doc-{doc_id}"} for doc_id in ids]
 
-    ids = [str(uuid.uuid4()) for _ in documents]
+    # Un même contenu présent plusieurs fois dans le lot → une seule entrée
+    unique = {doc_id: (doc, meta) for doc_id, doc, meta in zip(ids, documents, metadatas)}
+    ids = list(unique)
+    documents = [doc for doc, _ in unique.values()]
+    metadatas = [meta for _, meta in unique.values()]
 
-    collection.add(
+    collection.upsert(
         ids=ids,
         documents=documents,
+        embeddings=embed_texts(documents),
         metadatas=metadatas,
-    )
\ No newline at end of file
+    )
+    lexical_index.add(ids, documents)
+    return ids
+
+
+def delete_documents(ids: List[str]) -> None:
+    """Supprime les documents `ids` de la collection."""
+    if ids:
+        _get_collection().delete(ids=ids)
+        lexical_index.delete(ids)
@@ -0,0 +1,155 @@
+# backend/utils/dispatcher.py
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from utils.tracing import span
+
+# ----------------------------------------------------------------------
+# Priorités (plus petit = servi en premier)
+# ----------------------------------------------------------------------
+PRIORITIES = {
+    "interactive": 0,     # /v1/infer depuis l’éditeur
+    "batch": 10,          # bots, CI, traitements de masse
+}
+
+
+class QueueFullError(RuntimeError):
+    """La file d’attente vers Ollama a atteint sa taille maximale."""
+
+
+# ----------------------------------------------------------------------
+# Dispatcher : coalescing « single‑flight » + file de priorité bornée
+# ----------------------------------------------------------------------
+class OllamaDispatcher:
+    """
+    Couche d’accès à Ollama :
+    - au plus `max_concurrency` appels amont simultanés ;
+    - les appels en attente sont servis par priorité puis ordre d’arrivée,
+      dans la limite de `max_queue` (au‑delà : QueueFullError) ;
+    - les appels identiques (même clé) en cours sont fusionnés : un seul appel
+      amont, tous les demandeurs reçoivent le même résultat.
+    """
+
+    def __init__(self, max_concurrency: int = 2, max_queue: int = 64) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Statistiques
+        self.acquired = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    # -- Sémaphore à priorité ------------------------------------------
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def _acquire(self, priority: int) -> None:
+        start = time.perf_counter()
+        if self._active < self.max_concurrency and self.queue_depth == 0:
+            self._active += 1
+        else:
+            if self.queue_depth >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(
+                    f"File d’attente Ollama pleine ({self.max_queue} requêtes)"
+                )
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+            try:
+                with span("ollama_queue", priority=priority, depth=self.queue_depth):
+                    await fut
+            except asyncio.CancelledError:
+                # Le créneau a pu être attribué juste avant l’annulation
+                if fut.done() and not fut.cancelled():
+                    self._release()
+                raise
+        waited = time.perf_counter() - start
+        self.acquired += 1
+        self._wait_total += waited
+        self._wait_last = waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def _release(self) -> None:
+        # Le créneau est transmis directement au prochain demandeur vivant
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITIES["interactive"]):
+        """Réserve un créneau d’appel amont pour la durée du bloc `async with`."""
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self.completed += 1
+            self._release()
+
+    # -- Single‑flight --------------------------------------------------
+    async def _execute(self, factory: Callable[[], Awaitable[Any]], priority: int) -> Any:
+        async with self.slot(priority):
+            return await factory()
+
+    async def run(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITIES["interactive"],
+    ) -> Any:
+        """
+        Exécute `factory()` sous contrôle du dispatcher.
+        Si un appel de même `key` est déjà en cours, on attend son résultat.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._execute(factory, priority))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        # shield : l’annulation d’un demandeur n’interrompt pas l’appel partagé
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()      # évite « exception was never retrieved »
+
+    # -- Statistiques ---------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        acquired = self.acquired
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._active,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self._wait_total / acquired * 1000, 2) if acquired else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 2),
+            "last_wait_ms": round(self._wait_last * 1000, 2),
+        }
+
+
+dispatcher = OllamaDispatcher(
+    max_concurrency=int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2")),
+    max_queue=int(os.getenv("OLLAMA_MAX_QUEUE", "64")),
+)
@@ -0,0 +1,212 @@
+# backend/utils/file_context.py
+import ast
+import mmap
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+FILE_CONTEXT_CACHE_SIZE = int(os.getenv("FILE_CONTEXT_CACHE_SIZE", "256"))
+# Pendant ce délai, un fichier déjà analysé n’est même pas re‑stat()é
+FILE_CONTEXT_STAT_TTL = float(os.getenv("FILE_CONTEXT_STAT_TTL", "2"))
+# Au‑delà, lecture par mmap et extraction par regex (pas d’ast, pas de décodage complet)
+FILE_CONTEXT_MMAP_BYTES = int(os.getenv("FILE_CONTEXT_MMAP_BYTES", str(256 * 1024)))
+FILE_CONTEXT_MAX_SYMBOLS = int(os.getenv("FILE_CONTEXT_MAX_SYMBOLS", "40"))
+# L’en‑tête des imports s’arrête à la première définition, ou après N octets
+FILE_CONTEXT_HEADER_BYTES = int(os.getenv("FILE_CONTEXT_HEADER_BYTES", str(64 * 1024)))
+
+LANGUAGE_BY_EXT = {
+    ".py": "python",
+    ".r": "r",
+    ".jl": "julia",
+    ".js": "javascript", ".mjs": "javascript", ".cjs": "javascript", ".jsx": "javascript",
+    ".ts": "typescript", ".tsx": "typescript",
+    ".sh": "bash", ".bash": "bash",
+}
+
+_M = re.MULTILINE
+
+# Imports : un groupe capturant non vide par correspondance
+_IMPORT_RE: Dict[Optional[str], "re.Pattern[bytes]"] = {
+    "python": re.compile(rb"^[ \t]*(?:from[ \t]+([\w.]+)[ \t]+import\b|import[ \t]+([\w.]+))", _M),
+    "javascript": re.compile(
+        rb"""^[ \t]*(?:import\b[^'"\n]*?from[ \t]*['"]([^'"\n]+)['"]|import[ \t]*['"]([^'"\n]+)['"]"""
+        rb"""|(?:const|let|var)\b[^=\n]*=[ \t]*require\([ \t]*['"]([^'"\n]+)['"])""",
+        _M,
+    ),
+    "r": re.compile(rb"""^[ \t]*(?:library|require|requireNamespace)\([ \t]*['"]?([\w.]+)""", _M),
+    "julia": re.compile(rb"^[ \t]*(?:using|import)[ \t]+([\w.]+)", _M),
+    "bash": re.compile(rb"^[ \t]*(?:source|\.)[ \t]+([^\s;]+)", _M),
+    # Repli générique (comportement historique)
+    None: re.compile(rb"^[ \t]*(?:import|using|require|library)[ \t]+([^\s;]+)", _M),
+}
+_IMPORT_RE["typescript"] = _IMPORT_RE["javascript"]
+
+# Signatures des définitions de premier niveau (colonne 0)
+_SYMBOL_RE: Dict[str, "re.Pattern[bytes]"] = {
+    "python": re.compile(
+        rb"^(?:async[ \t]+)?def[ \t]+\w+[ \t]*\([^)]*\)(?:[ \t]*->[ \t]*[^:\n]+)?"
+        rb"|^class[ \t]+\w+(?:\([^)\n]*\))?",
+        _M,
+    ),
+    "javascript": re.compile(
+        rb"^(?:export[ \t]+)?(?:default[ \t]+)?(?:async[ \t]+)?function\b[ \t]*\*?[ \t]*\w*[ \t]*\([^)]*\)"
+        rb"|^(?:export[ \t]+)?(?:default[ \t]+)?class[ \t]+\w+(?:[ \t]+extends[ \t]+[\w.]+)?"
+        rb"|^(?:export[ \t]+)?const[ \t]+\w+[ \t]*=[ \t]*(?:async[ \t]*)?\([^)]*\)[ \t]*=>",
+        _M,
+    ),
+    "typescript": re.compile(
+        rb"^(?:export[ \t]+)?(?:default[ \t]+)?(?:async[ \t]+)?function\b[ \t]*\*?[ \t]*\w*[ \t]*(?:<[^>\n]*>)?\([^)]*\)(?:[ \t]*:[ \t]*[^{\n]+)?"
+        rb"|^(?:export[ \t]+)?(?:default[ \t]+)?(?:abstract[ \t]+)?class[ \t]+\w+(?:[ \t]+extends[ \t]+[\w.]+)?"
+        rb"|^(?:export[ \t]+)?(?:interface|type|enum)[ \t]+\w+"
+        rb"|^(?:export[ \t]+)?const[ \t]+\w+[ \t]*=[ \t]*(?:async[ \t]*)?\([^)]*\)[ \t]*(?::[^=\n]+)?=>",
+        _M,
+    ),
+    "r": re.compile(rb"^[\w.]+[ \t]*(?:<-|=)[ \t]*function[ \t]*\([^)]*\)", _M),
+    "julia": re.compile(
+        rb"^function[ \t]+[\w.!]+[ \t]*\([^)]*\)"
+        rb"|^(?:mutable[ \t]+)?struct[ \t]+\w+(?:[ \t]*<:[ \t]*\w+)?"
+        rb"|^(?:module|macro)[ \t]+\w+",
+        _M,
+    ),
+    "bash": re.compile(rb"^(?:function[ \t]+\w+|\w+[ \t]*\([ \t]*\))", _M),
+}
+
+
+def _dedupe(items: List[str]) -> List[str]:
+    return list(dict.fromkeys(item for item in items if item))
+
+
+# ----------------------------------------------------------------------
+# 1️⃣  Extracteurs
+# ----------------------------------------------------------------------
+def _extract_regex(buf, language: Optional[str]) -> Tuple[List[str], List[str]]:
+    """
+    Extraction sur un buffer bytes / mmap : la première définition délimite
+    l’en‑tête où sont cherchés les imports ; les signatures sont lues en
+    flux et la recherche s’arrête à FILE_CONTEXT_MAX_SYMBOLS.
+    """
+    symbols: List[str] = []
+    header_end = min(len(buf), FILE_CONTEXT_HEADER_BYTES)
+    symbol_re = _SYMBOL_RE.get(language)
+    if symbol_re is not None:
+        for match in symbol_re.finditer(buf):
+            if not symbols:
+                header_end = min(header_end, match.start())
+            symbols.append(" ".join(match.group(0).decode("utf-8", "replace").split()))
+            if len(symbols) >= FILE_CONTEXT_MAX_SYMBOLS:
+                break
+    import_re = _IMPORT_RE.get(language, _IMPORT_RE[None])
+    imports = [
+        next(g for g in match.groups() if g).decode("utf-8", "replace")
+        for match in import_re.finditer(buf, 0, header_end)
+    ]
+    return _dedupe(imports), _dedupe(symbols)
+
+
+def _signature(node: ast.AST) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = ", ".join(ast.unparse(base) for base in node.bases)
+        return f"class {node.name}({bases})" if bases else f"class {node.name}"
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def _extract_python_ast(source: bytes) -> Optional[Tuple[List[str], List[str]]]:
+    """Imports et signatures de premier niveau via `ast` (None si non parsable)."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None                      # fichier en cours d’édition → regex
+    imports: List[str] = []
+    symbols: List[str] = []
+    pending = list(tree.body)
+    while pending:
+        node = pending.pop(0)
+        if isinstance(node, ast.Import):
+            imports.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append("." * node.level + (node.module or ""))
+        elif isinstance(node, (ast.If, ast.Try)):
+            # Imports conditionnels (try: import x / except ImportError: …)
+            pending[:0] = [n for n in ast.iter_child_nodes(node) if isinstance(n, ast.stmt)]
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if len(symbols) < FILE_CONTEXT_MAX_SYMBOLS:
+                symbols.append(_signature(node))
+    return _dedupe(imports), symbols
+
+
+def _extract(path: Path, size: int, language: Optional[str]) -> Tuple[List[str], List[str]]:
+    if size == 0:
+        return [], []
+    with path.open("rb") as fh:
+        if size > FILE_CONTEXT_MMAP_BYTES:
+            # Gros fichier : seules les pages effectivement parcourues sont lues
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _extract_regex(mm, language)
+        data = fh.read()
+    if language == "python":
+        parsed = _extract_python_ast(data)
+        if parsed is not None:
+            return parsed
+    return _extract_regex(data, language)
+
+
+# ----------------------------------------------------------------------
+# 2️⃣  Cache (chemin, taille, mtime) → contexte
+# ----------------------------------------------------------------------
+class FileContextCache:
+    """LRU des contextes de fichiers, invalidé sur changement de taille / mtime."""
+
+    def __init__(self, max_entries: int = FILE_CONTEXT_CACHE_SIZE, stat_ttl: float = FILE_CONTEXT_STAT_TTL) -> None:
+        self.max_entries = max_entries
+        self.stat_ttl = stat_ttl
+        # clé (chemin, langage) → (taille, mtime_ns, vérifié_le, contexte)
+        self._entries: "OrderedDict[Tuple[str, Optional[str]], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_path: str, language: Optional[str] = None) -> dict:
+        path = Path(file_path)
+        language = language or LANGUAGE_BY_EXT.get(path.suffix.lower())
+        key = (str(path), language)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[2] < self.stat_ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[3]
+
+        context = {"filename": path.name, "language": language, "imports": [], "symbols": []}
+        try:
+            st = path.stat()
+        except OSError:
+            # Si le fichier n’est pas accessible, on ignore silencieusement
+            return context
+        if entry is not None and (entry[0], entry[1]) == (st.st_size, st.st_mtime_ns):
+            context = entry[3]
+            self.hits += 1
+        else:
+            try:
+                context["imports"], context["symbols"] = _extract(path, st.st_size, language)
+            except (OSError, ValueError):
+                pass
+            self.misses += 1
+        with self._lock:
+            self._entries[key] = (st.st_size, st.st_mtime_ns, now, context)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return context
+
+
+file_context_cache = FileContextCache()
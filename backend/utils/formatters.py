@@ -0,0 +1,262 @@
+# backend/utils/formatters.py
+import asyncio
+import hashlib
+import importlib.util
+import multiprocessing
+import os
+import shlex
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.tracing import span
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+FORMAT_WORKERS = int(os.getenv("FORMAT_WORKERS", str(min(2, os.cpu_count() or 1))))
+FORMAT_TIMEOUT = float(os.getenv("FORMAT_TIMEOUT", "2"))
+# Au‑delà de ce nombre de formatages en cours, le code est rendu tel quel
+FORMAT_MAX_PENDING = int(os.getenv("FORMAT_MAX_PENDING", str(max(1, FORMAT_WORKERS) * 4)))
+FORMAT_CACHE_SIZE = int(os.getenv("FORMAT_CACHE_SIZE", "512"))
+FORMAT_DISABLED = {
+    lang.strip() for lang in os.getenv("FORMAT_DISABLED", "").split(",") if lang.strip()
+}
+SQLFLUFF_DIALECT = os.getenv("SQLFLUFF_DIALECT", "ansi")
+# « spawn » : pas de fork d’un processus qui a déjà des threads (uvicorn, chroma…)
+FORMAT_MP_START = os.getenv("FORMAT_MP_START", "spawn")
+
+
+def timeout_for(language: str) -> float:
+    """Délai de formatage propre au langage (FORMAT_TIMEOUT_<LANG>) ou global."""
+    return float(os.getenv(f"FORMAT_TIMEOUT_{language.upper()}", str(FORMAT_TIMEOUT)))
+
+
+class FormatterError(Exception):
+    """Le formateur a refusé le code (erreur de syntaxe, code de sortie ≠ 0…)."""
+
+
+# ----------------------------------------------------------------------
+# 1️⃣  Fonctions exécutées dans les workers du pool
+# ----------------------------------------------------------------------
+def _warm_worker() -> None:
+    """Initialiseur des workers : charge les formateurs Python une fois pour toutes."""
+    try:
+        black_format("x = 1\n")
+    except Exception:
+        pass
+    try:
+        import sqlfluff  # noqa: F401
+    except Exception:
+        pass
+
+
+def _noop() -> None:
+    return None
+
+
+def black_format(code: str) -> str:
+    import black
+    return black.format_str(code, mode=black.Mode())
+
+
+def sqlfluff_format(code: str) -> str:
+    import sqlfluff
+    return sqlfluff.fix(code, dialect=SQLFLUFF_DIALECT)
+
+
+# ----------------------------------------------------------------------
+# 2️⃣  Pool de processus partagé (démarré avec l’API)
+# ----------------------------------------------------------------------
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=max(1, FORMAT_WORKERS),
+                    mp_context=multiprocessing.get_context(FORMAT_MP_START),
+                    initializer=_warm_worker,
+                )
+    return _pool
+
+
+def start_pool() -> None:
+    """Démarre les workers (et leur initialiseur) avant la première requête."""
+    if any(isinstance(f, PoolFormatter) and f.available() for f in FORMATTERS.values()):
+        pool = get_pool()
+        for _ in range(FORMAT_WORKERS):
+            pool.submit(_noop)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# ----------------------------------------------------------------------
+# 3️⃣  Formateurs
+# ----------------------------------------------------------------------
+class PoolFormatter:
+    """Formateur Python exécuté dans le pool de processus (Black, sqlfluff…)."""
+
+    def __init__(self, name: str, func: Callable[[str], str], module: Optional[str] = None) -> None:
+        self.name = name
+        self.func = func
+        self.module = module
+
+    def available(self) -> bool:
+        if FORMAT_WORKERS <= 0:
+            return False
+        return self.module is None or importlib.util.find_spec(self.module) is not None
+
+    def start(self, code: str, timeout: float) -> "asyncio.Future[str]":
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(get_pool(), self.func, code)
+
+
+class CommandFormatter:
+    """
+    Formateur externe lisant le code sur stdin et l’écrivant sur stdout.
+    Le premier exécutable présent dans le PATH est retenu, ce qui permet de
+    préférer une version démon (ex. `prettierd`) à l’outil classique.
+    """
+
+    def __init__(self, name: str, candidates: List[List[str]]) -> None:
+        self.name = name
+        self.candidates = candidates
+        self._argv: Optional[List[str]] = None
+        self._resolved = False
+
+    def argv(self) -> Optional[List[str]]:
+        if not self._resolved:
+            self._argv = next((c for c in self.candidates if shutil.which(c[0])), None)
+            self._resolved = True
+        return self._argv
+
+    def available(self) -> bool:
+        return self.argv() is not None
+
+    def start(self, code: str, timeout: float) -> "asyncio.Future[str]":
+        return asyncio.ensure_future(self._run(code, timeout))
+
+    async def _run(self, code: str, timeout: float) -> str:
+        proc = await asyncio.create_subprocess_exec(
+            *self.argv(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(code.encode("utf-8")), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode != 0:
+            message = err.decode("utf-8", "replace").strip().splitlines()
+            raise FormatterError(message[0] if message else f"exit {proc.returncode}")
+        return out.decode("utf-8")
+
+
+def _command(language: str, name: str, candidates: List[List[str]]) -> CommandFormatter:
+    # FORMATTER_CMD_<LANG> remplace la commande par défaut
+    override = os.getenv(f"FORMATTER_CMD_{language.upper()}")
+    return CommandFormatter(name, [shlex.split(override)] if override else candidates)
+
+
+FORMATTERS: Dict[str, object] = {
+    "python": PoolFormatter("black", black_format, module="black"),
+    "sql": PoolFormatter("sqlfluff", sqlfluff_format, module="sqlfluff"),
+    "javascript": _command("javascript", "prettier", [
+        ["prettierd", "snippet.js"],
+        ["prettier", "--stdin-filepath", "snippet.js"],
+    ]),
+    "typescript": _command("typescript", "prettier", [
+        ["prettierd", "snippet.ts"],
+        ["prettier", "--stdin-filepath", "snippet.ts"],
+    ]),
+    "bash": _command("bash", "shfmt", [["shfmt", "-i", "4"]]),
+    "r": _command("r", "styler", [[
+        "Rscript", "-e",
+        "cat(styler::style_text(readLines(file('stdin'))), sep = '\\n')",
+    ]]),
+    "latex": _command("latex", "latexindent", [["latexindent", "-g", "/dev/null"]]),
+    # Julia : JuliaFormatter a un démarrage de plusieurs secondes, activable
+    # via FORMATTER_CMD_JULIA (ex. client d’un serveur de formatage).
+}
+if os.getenv("FORMATTER_CMD_JULIA"):
+    FORMATTERS["julia"] = _command("julia", "julia", [])
+
+
+# ----------------------------------------------------------------------
+# 4️⃣  Point d’entrée : cache par contenu, délai, repli si saturé
+# ----------------------------------------------------------------------
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_pending = 0
+_stats = {"formatted": 0, "cache_hits": 0, "skipped": 0, "timeouts": 0, "errors": 0}
+
+
+def formatter_stats() -> Dict[str, int]:
+    return dict(_stats, pending=_pending)
+
+
+def _release(future: "asyncio.Future[str]") -> None:
+    global _pending
+    _pending -= 1
+    if not future.cancelled():
+        future.exception()          # résultat tardif (après délai) : consommé ici
+
+
+async def format_code(code: str, language: str) -> Tuple[str, Optional[str]]:
+    """
+    Formate `code` avec le formateur du langage, sans bloquer la boucle.
+    Retourne (code, avertissement).  Le code est rendu inchangé si aucun
+    formateur n’est disponible, si le pool est saturé ou après le délai.
+    """
+    global _pending
+    formatter = FORMATTERS.get(language)
+    if formatter is None or language in FORMAT_DISABLED or not formatter.available():
+        return code, None
+
+    key = hashlib.sha256(f"{formatter.name}\0{language}\0{code}".encode("utf-8")).hexdigest()
+    hit = _cache.get(key)
+    if hit is not None:
+        _cache.move_to_end(key)
+        _stats["cache_hits"] += 1
+        return hit, None
+
+    if _pending >= FORMAT_MAX_PENDING:
+        _stats["skipped"] += 1
+        return code, None
+
+    timeout = timeout_for(language)
+    _pending += 1
+    # La place n’est libérée qu’à la fin réelle du travail (même après un délai
+    # dépassé) : la saturation reflète l’occupation effective des workers.
+    future = formatter.start(code, timeout)
+    future.add_done_callback(_release)
+    try:
+        with span("format", formatter=formatter.name):
+            formatted = await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        return code, None
+    except Exception as exc:          # FormatterError, InvalidInput de Black…
+        _stats["errors"] += 1
+        return code, f"Formatage {formatter.name} impossible : {exc}"
+
+    _stats["formatted"] += 1
+    _cache[key] = formatted
+    while len(_cache) > FORMAT_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return formatted, None
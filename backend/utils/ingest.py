@@ -0,0 +1,335 @@
+# backend/utils/ingest.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from utils import chroma_client
+from utils.cache import CACHE_DIR
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+INGEST_MANIFEST = Path(os.getenv("INGEST_MANIFEST", str(CACHE_DIR / "ingest-manifest.sqlite3")))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "128"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_CHUNK_CHARS = int(os.getenv("INGEST_MAX_CHUNK_CHARS", "2000"))
+INGEST_MAX_FILE_BYTES = int(os.getenv("INGEST_MAX_FILE_BYTES", str(2 << 20)))
+
+LANGUAGE_BY_EXT = {
+    ".py": "python",
+    ".r": "r",
+    ".jl": "julia",
+    ".js": "javascript", ".mjs": "javascript", ".cjs": "javascript", ".jsx": "javascript",
+    ".ts": "typescript", ".tsx": "typescript",
+    ".sh": "bash", ".bash": "bash",
+    ".sql": "sql",
+    ".tex": "latex",
+    ".md": "markdown",
+}
+
+IGNORED_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+    ".mypy_cache", ".pytest_cache", ".tox", "dist", "build",
+}
+
+# Début d’une unité de premier niveau (colonne 0) selon le langage
+_BOUNDARIES = {
+    "python": re.compile(r"^(?:@|def |async def |class )"),
+    "javascript": re.compile(
+        r"^(?:export\s+)?(?:default\s+)?(?:async\s+)?"
+        r"(?:function\b|class\b|const\s+\w+\s*=\s*(?:async\s*)?\()"
+    ),
+    "typescript": re.compile(
+        r"^(?:export\s+)?(?:default\s+)?(?:async\s+)?"
+        r"(?:function\b|class\b|const\s+\w+\s*=\s*(?:async\s*)?\(|interface\b|type\s+\w+\s*=|enum\b)"
+    ),
+    "r": re.compile(r"^[\w.]+\s*(?:<-|=)\s*function\b"),
+    "julia": re.compile(r"^(?:function|macro|struct|mutable struct|module|abstract type)\b"),
+    "bash": re.compile(r"^(?:function\s+\w+|\w+\s*\(\)\s*\{?)"),
+    "latex": re.compile(r"^\\(?:part|chapter|section|subsection)\b"),
+    "markdown": re.compile(r"^#{1,3} "),
+}
+
+
+# ----------------------------------------------------------------------
+# 1️⃣  Découpage en blocs
+# ----------------------------------------------------------------------
+def _split_long(lines: List[str], start: int, max_chars: int) -> Iterator[Tuple[int, List[str]]]:
+    block: List[str] = []
+    size = 0
+    block_start = start
+    for offset, line in enumerate(lines):
+        if block and size + len(line) > max_chars:
+            yield block_start, block
+            block, size, block_start = [], 0, start + offset
+        block.append(line)
+        size += len(line)
+    if block:
+        yield block_start, block
+
+
+def chunk_source(
+    text: str, language: str, max_chars: int = INGEST_MAX_CHUNK_CHARS
+) -> List[Tuple[int, int, str]]:
+    """
+    Découpe `text` aux frontières des unités de premier niveau (fonctions,
+    classes, sections…), fusionne les petites unités voisines jusqu’à
+    `max_chars` et redécoupe les trop grandes par lignes.
+
+    Returns
+    -------
+    Liste de (ligne_début, ligne_fin, contenu), lignes numérotées à partir de 1.
+    """
+    lines = text.splitlines(keepends=True)
+    if not lines:
+        return []
+
+    # Unités : un bloc commence à chaque frontière ; pour SQL, après chaque « ; »
+    boundary = _BOUNDARIES.get(language)
+    units: List[Tuple[int, List[str]]] = []
+    current: List[str] = []
+    current_start = 0
+    for index, line in enumerate(lines):
+        starts_unit = boundary is not None and boundary.match(line)
+        # Les décorateurs / commentaires collés restent avec l’unité qui suit
+        if starts_unit and current and not (
+            language == "python" and current[-1].startswith("@")
+        ):
+            units.append((current_start, current))
+            current, current_start = [], index
+        current.append(line)
+        if language == "sql" and line.rstrip().endswith(";"):
+            units.append((current_start, current))
+            current, current_start = [], index + 1
+    if current:
+        units.append((current_start, current))
+
+    chunks: List[Tuple[int, int, str]] = []
+    pending: List[str] = []
+    pending_start = 0
+
+    def flush() -> None:
+        content = "".join(pending)
+        if content.strip():
+            chunks.append((pending_start + 1, pending_start + len(pending), content))
+
+    for unit_start, unit_lines in units:
+        for piece_start, piece in _split_long(unit_lines, unit_start, max_chars):
+            piece_size = sum(len(line) for line in piece)
+            if pending and sum(len(line) for line in pending) + piece_size > max_chars:
+                flush()
+                pending = []
+            if not pending:
+                pending_start = piece_start
+            pending.extend(piece)
+    if pending:
+        flush()
+    return chunks
+
+
+# ----------------------------------------------------------------------
+# 2️⃣  Manifeste (état de la dernière indexation, par fichier)
+# ----------------------------------------------------------------------
+class Manifest:
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " source TEXT NOT NULL, path TEXT NOT NULL, mtime REAL, size INTEGER,"
+            " hash TEXT, chunk_ids TEXT, PRIMARY KEY (source, path))"
+        )
+        self._lock = threading.Lock()
+
+    def entries(self, source: str) -> Dict[str, Tuple[float, int, str, List[str]]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, mtime, size, hash, chunk_ids FROM files WHERE source = ?",
+                (source,),
+            ).fetchall()
+        return {p: (m, s, h, json.loads(c)) for p, m, s, h, c in rows}
+
+    def put(self, source: str, path: str, mtime: float, size: int, digest: str,
+            chunk_ids: List[str]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (source, path, mtime, size, digest, json.dumps(chunk_ids)),
+            )
+
+    def remove(self, source: str, path: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM files WHERE source = ? AND path = ?", (source, path))
+
+    def commit(self) -> None:
+        with self._lock:
+            self._db.commit()
+
+    def close(self, commit: bool = True) -> None:
+        with self._lock:
+            if commit:
+                self._db.commit()
+            else:
+                self._db.rollback()
+            self._db.close()
+
+
+# ----------------------------------------------------------------------
+# 3️⃣  Pipeline d’ingestion incrémentale
+# ----------------------------------------------------------------------
+def iter_source_files(root: Path) -> Iterator[Path]:
+    """Parcourt `root` et produit les fichiers source reconnus (dossiers ignorés exclus)."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in IGNORED_DIRS and not d.startswith("."))
+        for name in sorted(filenames):
+            if Path(name).suffix.lower() in LANGUAGE_BY_EXT:
+                yield Path(dirpath) / name
+
+
+def ingest_directory(
+    root: str,
+    *,
+    source: Optional[str] = None,
+    batch_size: int = INGEST_BATCH_SIZE,
+    workers: int = INGEST_WORKERS,
+    manifest_path: Path = INGEST_MANIFEST,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Indexe (ou réindexe) les fichiers source de `root` dans la KB.
+
+    - fichiers dont (mtime, taille) n’ont pas changé : ignorés sans lecture ;
+    - fichiers modifiés : redécoupés ; seuls les blocs nouveaux (id = hash du
+      chemin relatif et du contenu) sont embeddés, les blocs disparus supprimés ;
+    - fichiers supprimés : tous leurs blocs sont retirés de la KB.
+    Les embeddings sont calculés par lots de `batch_size` sur `workers` threads.
+
+    Returns
+    -------
+    Statistiques : fichiers vus / modifiés / supprimés, blocs ajoutés / supprimés.
+    """
+    root_path = Path(root).resolve()
+    if not root_path.is_dir():
+        raise ValueError(f"Répertoire introuvable : {root}")
+    source = source or root_path.name
+    manifest = Manifest(manifest_path)
+    known = manifest.entries(source)
+
+    stats = {
+        "files_seen": 0, "files_unchanged": 0, "files_changed": 0,
+        "files_deleted": 0, "chunks_added": 0, "chunks_deleted": 0,
+    }
+    lock = threading.Lock()
+
+    def report() -> None:
+        if progress is not None:
+            progress(dict(stats))
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest")
+    futures: List[Future] = []
+    batch_docs: List[str] = []
+    batch_metas: List[Dict[str, Any]] = []
+    batch_ids: List[str] = []
+
+    def upsert(docs: List[str], metas: List[Dict[str, Any]], ids: List[str]) -> None:
+        chroma_client.add_documents(docs, metas, ids=ids)
+        with lock:
+            stats["chunks_added"] += len(ids)
+        report()
+
+    def flush() -> None:
+        nonlocal batch_docs, batch_metas, batch_ids
+        if batch_ids:
+            futures.append(pool.submit(upsert, batch_docs, batch_metas, batch_ids))
+            batch_docs, batch_metas, batch_ids = [], [], []
+            # Contre‑pression : au plus 2 lots en attente par worker
+            while len([f for f in futures if not f.done()]) > 2 * max(1, workers):
+                futures.pop(0).result()
+
+    def checkpoint() -> None:
+        # Le manifeste n’est validé qu’une fois les lots correspondants écrits
+        flush()
+        while futures:
+            futures.pop(0).result()
+        manifest.commit()
+        report()
+
+    seen: Set[str] = set()
+    ok = False
+    try:
+        for path in iter_source_files(root_path):
+            rel = path.relative_to(root_path).as_posix()
+            seen.add(rel)
+            stats["files_seen"] += 1
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            previous = known.get(rel)
+            if previous and previous[0] == st.st_mtime and previous[1] == st.st_size:
+                stats["files_unchanged"] += 1
+                continue
+            if st.st_size > INGEST_MAX_FILE_BYTES:
+                continue
+            try:
+                raw = path.read_bytes()
+            except OSError:
+                continue
+            digest = hashlib.sha256(raw).hexdigest()
+            if previous and previous[2] == digest:
+                # Contenu identique (touch, checkout) : on met juste à jour le mtime
+                manifest.put(source, rel, st.st_mtime, st.st_size, digest, previous[3])
+                stats["files_unchanged"] += 1
+                continue
+
+            language = LANGUAGE_BY_EXT[path.suffix.lower()]
+            text = raw.decode("utf-8", errors="replace")
+            chunk_ids: List[str] = []
+            old_ids = set(previous[3]) if previous else set()
+            for start, end, content in chunk_source(text, language):
+                chunk_id = chroma_client.content_id(content, f"{source}:{rel}")
+                if chunk_id in chunk_ids:
+                    continue
+                chunk_ids.append(chunk_id)
+                if chunk_id in old_ids:
+                    continue          # bloc inchangé : déjà embeddé
+                batch_docs.append(content)
+                batch_metas.append({
+                    "title": f"{rel}:{start}-{end}",
+                    "path": rel,
+                    "source": source,
+                    "language": language,
+                    "start_line": start,
+                    "end_line": end,
+                })
+                batch_ids.append(chunk_id)
+                if len(batch_ids) >= batch_size:
+                    flush()
+            stale = sorted(old_ids - set(chunk_ids))
+            if stale:
+                chroma_client.delete_documents(stale)
+                stats["chunks_deleted"] += len(stale)
+            manifest.put(source, rel, st.st_mtime, st.st_size, digest, chunk_ids)
+            stats["files_changed"] += 1
+            if stats["files_changed"] % 50 == 0:
+                checkpoint()
+        checkpoint()
+
+        # Fichiers disparus depuis la dernière indexation
+        for rel in sorted(set(known) - seen):
+            chroma_client.delete_documents(known[rel][3])
+            manifest.remove(source, rel)
+            stats["files_deleted"] += 1
+            stats["chunks_deleted"] += len(known[rel][3])
+        ok = True
+    finally:
+        pool.shutdown(wait=True)
+        manifest.close(commit=ok)
+    report()
+    return stats
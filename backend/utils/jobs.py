@@ -0,0 +1,82 @@
+# backend/utils/jobs.py
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+# ----------------------------------------------------------------------
+# Tâches de fond (ingestion, …) suivies par identifiant
+# ----------------------------------------------------------------------
+class Job:
+    def __init__(self, kind: str) -> None:
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"            # queued | running | done | failed
+        self.progress: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobRegistry:
+    """Registre borné des tâches : les plus anciennes terminées sont oubliées."""
+
+    def __init__(self, max_jobs: int = 100) -> None:
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def submit(self, kind: str, work: Callable[[Job], Awaitable[None]]) -> Job:
+        """Crée une tâche et lance `work(job)` en arrière‑plan."""
+        job = Job(kind)
+        self._jobs[job.id] = job
+        self._trim()
+        job._task = asyncio.create_task(self._run(job, work))
+        return job
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[None]]) -> None:
+        job.status = "running"
+        job.started = time.time()
+        try:
+            await work(job)
+            job.status = "done"
+        except Exception as exc:
+            job.status = "failed"
+            job.error = str(exc)
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def active(self, kind: str) -> Optional[Job]:
+        """Retourne une tâche `kind` encore en cours, s’il y en a une."""
+        for job in self._jobs.values():
+            if job.kind == kind and job.status in ("queued", "running"):
+                return job
+        return None
+
+    def _trim(self) -> None:
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            if self._jobs[job_id].status in ("done", "failed"):
+                del self._jobs[job_id]
+
+
+jobs = JobRegistry()
@@ -0,0 +1,422 @@
+# backend/utils/lexical_index.py
+import fcntl
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+LEXICAL_INDEX_PATH = Path(
+    os.getenv(
+        "LEXICAL_INDEX_PATH",
+        os.path.join(os.getenv("CHROMA_DB_PATH", os.path.expanduser("~/.chroma")), "lexical-index"),
+    )
+).expanduser()
+# Nombre de documents modifiés (journal) avant réécriture du segment mmap
+LEXICAL_COMPACT_EVERY = int(os.getenv("LEXICAL_COMPACT_EVERY", "5000"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def _parts(word: str) -> List[str]:
+    return [p.lower() for piece in word.split("_") for p in _CAMEL_RE.findall(piece)]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokens BM25 : identifiants entiers en minuscules, plus leurs composants
+    snake_case / camelCase (`parseConfig` → parseconfig, parse, config).
+    """
+    tokens: List[str] = []
+    for word in _TOKEN_RE.findall(text):
+        tokens.append(word.lower())
+        parts = _parts(word)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+# ----------------------------------------------------------------------
+# 1️⃣  Segment immuable sur disque (CSR, lu en mmap)
+# ----------------------------------------------------------------------
+class _Segment:
+    """
+    Index inversé compact : `vocab` (terme → rang), `offsets[t]:offsets[t+1]`
+    délimite dans `docs` / `tfs` les postings du terme t, `lengths[d]` est la
+    longueur du document d.  Les tableaux numpy sont ouverts en `mmap_mode='r'`.
+    """
+
+    def __init__(self, directory: Optional[Path] = None) -> None:
+        self.directory = directory
+        if directory is None:
+            self.vocab: Dict[str, int] = {}
+            self.doc_ids: List[str] = []
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.docs = np.zeros(0, dtype=np.int32)
+            self.tfs = np.zeros(0, dtype=np.float32)
+            self.lengths = np.zeros(0, dtype=np.float32)
+            return
+        meta = json.loads((directory / "meta.json").read_text())
+        self.vocab = {term: i for i, term in enumerate(meta["terms"])}
+        self.doc_ids = meta["doc_ids"]
+        self.offsets = np.load(directory / "offsets.npy", mmap_mode="r")
+        self.docs = np.load(directory / "docs.npy", mmap_mode="r")
+        self.tfs = np.load(directory / "tfs.npy", mmap_mode="r")
+        self.lengths = np.load(directory / "lengths.npy", mmap_mode="r")
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        t = self.vocab.get(term)
+        if t is None:
+            return self.docs[:0], self.tfs[:0]
+        lo, hi = int(self.offsets[t]), int(self.offsets[t + 1])
+        return self.docs[lo:hi], self.tfs[lo:hi]
+
+    @staticmethod
+    def write(directory: Path, documents: Dict[str, Tuple[Dict[str, int], int]]) -> None:
+        """Écrit un segment à partir de {doc_id: (tf par terme, longueur)}."""
+        directory.mkdir(parents=True)
+        doc_ids = list(documents)
+        by_term: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = np.zeros(len(doc_ids), dtype=np.float32)
+        for d, doc_id in enumerate(doc_ids):
+            counts, length = documents[doc_id]
+            lengths[d] = length
+            for term, tf in counts.items():
+                by_term.setdefault(term, []).append((d, tf))
+        terms = sorted(by_term)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(by_term[term])
+        docs = np.zeros(int(offsets[-1]), dtype=np.int32)
+        tfs = np.zeros(int(offsets[-1]), dtype=np.float32)
+        for i, term in enumerate(terms):
+            lo, hi = offsets[i], offsets[i + 1]
+            postings = by_term[term]
+            docs[lo:hi] = [d for d, _ in postings]
+            tfs[lo:hi] = [tf for _, tf in postings]
+        np.save(directory / "offsets.npy", offsets)
+        np.save(directory / "docs.npy", docs)
+        np.save(directory / "tfs.npy", tfs)
+        np.save(directory / "lengths.npy", lengths)
+        (directory / "meta.json").write_text(json.dumps({"terms": terms, "doc_ids": doc_ids}))
+
+    def documents(self) -> Dict[str, Tuple[Dict[str, int], int]]:
+        """Reconstruit {doc_id: (tf par terme, longueur)} (utilisé à la compaction)."""
+        out: Dict[str, Tuple[Dict[str, int], int]] = {
+            doc_id: ({}, int(self.lengths[d])) for d, doc_id in enumerate(self.doc_ids)
+        }
+        for term, t in self.vocab.items():
+            lo, hi = int(self.offsets[t]), int(self.offsets[t + 1])
+            for d, tf in zip(self.docs[lo:hi].tolist(), self.tfs[lo:hi].tolist()):
+                out[self.doc_ids[d]][0][term] = int(tf)
+        return out
+
+
+# ----------------------------------------------------------------------
+# 2️⃣  Index BM25 : segment mmap + delta mémoire journalisé
+# ----------------------------------------------------------------------
+class LexicalIndex:
+    """
+    Index BM25 synchronisé avec la collection Chroma.
+
+    Les ajouts / suppressions vont dans un delta en mémoire, journalisé en
+    append‑only (`delta.jsonl`) pour survivre à un redémarrage ; au‑delà de
+    `compact_every` opérations, segment + delta sont réécrits en un nouveau
+    segment (écriture dans un répertoire neuf puis bascule atomique de
+    `CURRENT`).
+
+    Plusieurs processus (workers uvicorn, `scripts/ingest_kb.py`) peuvent
+    partager le répertoire : un verrou fichier (`LOCK`) sérialise écritures et
+    compactions, et chaque processus rejoue la fin du journal écrite par les
+    autres (ou recharge le segment s’il a été compacté) avant d’écrire, de
+    compacter ou de chercher.
+    """
+
+    def __init__(self, path: Path, *, compact_every: int = LEXICAL_COMPACT_EVERY) -> None:
+        self.path = Path(path)
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._lock_fd: Optional[int] = None
+        self._flock_depth = 0
+
+    # -- Verrou inter‑processus (flock, réentrant ; verrou thread tenu) --
+    @contextmanager
+    def _locked(self, exclusive: bool = False):
+        if self._flock_depth == 0:
+            if self._lock_fd is None:
+                self.path.mkdir(parents=True, exist_ok=True)
+                self._lock_fd = os.open(self.path / "LOCK", os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self._flock_depth += 1
+        try:
+            yield
+        finally:
+            self._flock_depth -= 1
+            if self._flock_depth == 0:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    # -- Chargement ----------------------------------------------------
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            with self._locked():
+                self._load()
+
+    def _current(self) -> str:
+        current = self.path / "CURRENT"
+        return current.read_text().strip() if current.exists() else ""
+
+    def _load(self) -> None:
+        """(Re)charge le segment courant et rejoue tout le journal (verrous tenus)."""
+        if self._loaded:
+            self._journal.close()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._segment_name = self._current()
+        self._segment = _Segment(self.path / self._segment_name if self._segment_name else None)
+        self._base_pos = {doc_id: d for d, doc_id in enumerate(self._segment.doc_ids)}
+        self._base_live = np.ones(len(self._segment.doc_ids), dtype=bool)
+        self._base_df_cache: Dict[str, int] = {}
+        self._delta: Dict[str, Tuple[Dict[str, int], int]] = {}
+        self._delta_postings: Dict[str, Dict[str, int]] = {}
+        self._total_len = float(np.sum(self._segment.lengths))
+        self._live_base = len(self._segment.doc_ids)
+        self._ops = 0
+        self._journal_path = self.path / "delta.jsonl"
+        self._journal_offset = 0
+        self._replay()
+        self._journal = self._journal_path.open("ab")
+        self._loaded = True
+
+    def _replay(self) -> None:
+        """Applique les lignes du journal au‑delà de `_journal_offset`."""
+        try:
+            with self._journal_path.open("rb") as fh:
+                fh.seek(self._journal_offset)
+                tail = fh.read()
+        except FileNotFoundError:
+            return
+        end = tail.rfind(b"\n") + 1              # ligne finale incomplète : ignorée
+        for line in tail[:end].splitlines():
+            try:
+                op = json.loads(line)
+            except ValueError:
+                continue                           # ligne tronquée (arrêt brutal)
+            if "d" in op:
+                self._remove(op["d"])
+                self._ops += 1
+            else:
+                self._insert(op["a"], op["tf"], op["len"])
+        self._journal_offset += end
+
+    def _sync(self) -> None:
+        """Rattrape les écritures des autres processus (verrous tenus)."""
+        if self._current() != self._segment_name:
+            self._load()                           # compacté ailleurs : nouveau segment
+        elif self._journal_path.exists() and self._journal_path.stat().st_size > self._journal_offset:
+            self._replay()
+
+    def _append(self, ops: List[Dict]) -> None:
+        self._journal.write(b"".join(json.dumps(op).encode() + b"\n" for op in ops))
+        self._journal.flush()
+        self._journal_offset = self._journal.tell()
+
+    # -- Mutations internes (verrou tenu) -------------------------------
+    def _remove(self, doc_id: str) -> None:
+        entry = self._delta.pop(doc_id, None)
+        if entry is not None:
+            counts, length = entry
+            for term in counts:
+                postings = self._delta_postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._delta_postings[term]
+            self._total_len -= length
+            return
+        d = self._base_pos.get(doc_id)
+        if d is not None and self._base_live[d]:
+            self._base_live[d] = False
+            self._live_base -= 1
+            self._total_len -= float(self._segment.lengths[d])
+            self._base_df_cache.clear()
+
+    def _insert(self, doc_id: str, counts: Dict[str, int], length: int) -> None:
+        self._remove(doc_id)
+        self._delta[doc_id] = (counts, length)
+        for term, tf in counts.items():
+            self._delta_postings.setdefault(term, {})[doc_id] = tf
+        self._total_len += length
+        self._ops += 1
+
+    # -- API publique --------------------------------------------------
+    def add(self, ids: Iterable[str], documents: Iterable[str]) -> None:
+        """Indexe (ou réindexe) les documents `ids`."""
+        self._ensure_loaded()
+        with self._lock, self._locked(exclusive=True):
+            self._sync()
+            ops = []
+            for doc_id, text in zip(ids, documents):
+                tokens = tokenize(text)
+                counts = dict(Counter(tokens))
+                self._insert(doc_id, counts, len(tokens))
+                ops.append({"a": doc_id, "tf": counts, "len": len(tokens)})
+            self._append(ops)
+            if self._ops >= self.compact_every:
+                self._compact()
+
+    def delete(self, ids: Iterable[str]) -> None:
+        self._ensure_loaded()
+        with self._lock, self._locked(exclusive=True):
+            self._sync()
+            ops = []
+            for doc_id in ids:
+                self._remove(doc_id)
+                ops.append({"d": doc_id})
+                self._ops += 1
+            self._append(ops)
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return self._live_base + len(self._delta)
+
+    def _base_df(self, term: str, docs: np.ndarray) -> int:
+        if self._live_base == len(self._base_live):
+            return len(docs)
+        df = self._base_df_cache.get(term)
+        if df is None:
+            df = int(np.count_nonzero(self._base_live[docs]))
+            self._base_df_cache[term] = df
+        return df
+
+    def _query_terms(self, query: str) -> Set[str]:
+        # Un identifiant présent tel quel suffit ; ses composants (souvent très
+        # fréquents : get, config…) ne servent que s’il est inconnu.
+        terms: Set[str] = set()
+        for word in _TOKEN_RE.findall(query):
+            lower = word.lower()
+            if lower in self._segment.vocab or lower in self._delta_postings:
+                terms.add(lower)
+            else:
+                terms.add(lower)
+                terms.update(_parts(word))
+        return terms
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Retourne les `k` meilleurs (doc_id, score BM25), par score décroissant."""
+        self._ensure_loaded()
+        with self._lock:
+            with self._locked():
+                self._sync()
+            terms = self._query_terms(query)
+            n = self._live_base + len(self._delta)
+            if not terms or n == 0:
+                return []
+            avgdl = max(self._total_len / n, 1.0)
+            lengths = self._segment.lengths
+            base_docs: List[np.ndarray] = []
+            base_scores: List[np.ndarray] = []
+            delta_scores: Dict[str, float] = {}
+            for term in terms:
+                docs, tfs = self._segment.postings(term)
+                delta = self._delta_postings.get(term, {})
+                df = (self._base_df(term, docs) if len(docs) else 0) + len(delta)
+                if df == 0:
+                    continue
+                idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+                if len(docs):
+                    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[docs] / avgdl)
+                    base_docs.append(np.asarray(docs))
+                    base_scores.append(idf * tfs * (BM25_K1 + 1.0) / (tfs + norm))
+                for doc_id, tf in delta.items():
+                    length = self._delta[doc_id][1]
+                    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * length / avgdl)
+                    delta_scores[doc_id] = delta_scores.get(doc_id, 0.0) + (
+                        idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+                    )
+
+            hits: List[Tuple[str, float]] = list(delta_scores.items())
+            if base_docs:
+                docs = np.concatenate(base_docs)
+                scores = np.concatenate(base_scores)
+                if len(base_docs) > 1:
+                    order = np.argsort(docs, kind="stable")
+                    docs, scores = docs[order], scores[order]
+                    starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+                    docs, scores = docs[starts], np.add.reduceat(scores, starts)
+                live = self._base_live[docs]
+                docs, scores = docs[live], scores[live]
+                if len(docs) > k:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    docs, scores = docs[top], scores[top]
+                doc_ids = self._segment.doc_ids
+                hits.extend((doc_ids[d], float(s)) for d, s in zip(docs.tolist(), scores.tolist()))
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:k]
+
+    def compact(self) -> None:
+        """Fusionne segment + delta (journal des autres processus compris) en un nouveau segment."""
+        self._ensure_loaded()
+        with self._lock, self._locked(exclusive=True):
+            self._sync()
+            self._compact()
+
+    def _compact(self) -> None:
+        documents = {
+            doc_id: entry
+            for doc_id, entry in self._segment.documents().items()
+            if self._base_live[self._base_pos[doc_id]]
+        }
+        documents.update(self._delta)
+        previous = self._segment.directory
+        generation = int(previous.name.split("-")[1]) + 1 if previous else 1
+        target = self.path / f"segment-{generation}"
+        if target.exists():
+            shutil.rmtree(target)
+        _Segment.write(target, documents)
+        tmp = self.path / "CURRENT.tmp"
+        tmp.write_text(target.name)
+        os.replace(tmp, self.path / "CURRENT")
+
+        self._journal_path.unlink(missing_ok=True)
+        self._load()
+        if previous is not None:
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def flush(self) -> None:
+        """Compacte s’il reste des opérations journalisées, par ce processus ou un autre."""
+        if not self._loaded:
+            return
+        with self._lock, self._locked(exclusive=True):
+            self._sync()
+            if self._ops:
+                self._compact()
+
+    def clear(self) -> None:
+        with self._lock, self._locked(exclusive=True):
+            if self._loaded:
+                self._journal.close()
+            for entry in self.path.iterdir():
+                if entry.is_dir():
+                    shutil.rmtree(entry, ignore_errors=True)
+                elif entry.name != "LOCK":             # tenu par les autres processus
+                    entry.unlink(missing_ok=True)
+            self._loaded = False
+
+
+lexical_index = LexicalIndex(LEXICAL_INDEX_PATH)
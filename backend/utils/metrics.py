@@ -0,0 +1,324 @@
+# backend/utils/metrics.py
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.tracing import span
+
+# ----------------------------------------------------------------------
+# Métriques en mémoire, exposées au format texte Prometheus (/metrics)
+# ----------------------------------------------------------------------
+# Pas de dépendance à prometheus_client : compteurs, jauges et histogrammes
+# à buckets fixes, protégés par un verrou (certaines étapes tournent dans
+# des threads via asyncio.to_thread).
+
+# Durées en secondes : de 5 ms (recherche, post‑traitement) à 2 min (génération)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} : labels attendus {self.labelnames}, reçus {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._labels(k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # clé → [compteurs par bucket (non cumulés)…, somme, nombre]
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe la durée du bloc `with` (y compris en cas d’exception)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> float:
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0.0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines: List[str] = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{self._labels(key, ('le', _number(bound)))} {_number(cumulative)}"
+                )
+            lines.append(f"{self.name}_sum{self._labels(key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {_number(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        # Jauges calculées au moment de la collecte (file d’attente, caches…)
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrique « {metric.name} » déjà enregistrée")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collect: Callable[[], None]) -> None:
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception:
+                pass                  # une source indisponible ne casse pas le scrape
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Iterable[str] = (),
+              buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+# ----------------------------------------------------------------------
+# 1️⃣  Requêtes HTTP
+# ----------------------------------------------------------------------
+HTTP_REQUESTS = counter(
+    "chloe_http_requests_total", "Requêtes HTTP traitées", ("method", "endpoint", "status")
+)
+HTTP_IN_FLIGHT = gauge(
+    "chloe_http_requests_in_flight", "Requêtes HTTP en cours", ("endpoint",)
+)
+HTTP_SECONDS = histogram(
+    "chloe_http_request_duration_seconds",
+    "Durée des requêtes HTTP (jusqu’au dernier octet, flux compris)", ("method", "endpoint"),
+)
+
+# ----------------------------------------------------------------------
+# 2️⃣  Étapes du pipeline
+# ----------------------------------------------------------------------
+# stage ∈ build_prompt, ollama_generate, postprocess_code, search_kb, sandbox
+STAGE_SECONDS = histogram(
+    "chloe_stage_duration_seconds", "Durée de chaque étape du pipeline",
+    ("stage", "language", "model"),
+)
+STAGE_IN_FLIGHT = gauge("chloe_stage_in_flight", "Étapes en cours d’exécution", ("stage",))
+STAGE_ERRORS = counter("chloe_stage_errors_total", "Étapes terminées en erreur", ("stage",))
+
+OLLAMA_TTFT = histogram(
+    "chloe_ollama_time_to_first_token_seconds",
+    "Délai avant le premier token (mesuré en streaming, sinon chargement + évaluation du prompt)",
+    ("model",),
+)
+OLLAMA_TOKENS_PER_SECOND = histogram(
+    "chloe_ollama_tokens_per_second", "Débit de génération rapporté par Ollama",
+    ("model",), buckets=TOKENS_PER_SECOND_BUCKETS,
+)
+OLLAMA_TOKENS = counter(
+    "chloe_ollama_tokens_total", "Tokens traités par Ollama", ("model", "kind")
+)
+SANDBOX_RUNS = counter(
+    "chloe_sandbox_runs_total", "Exécutions sandbox par statut", ("language", "status")
+)
+
+
+@contextmanager
+def stage(name: str, language: Optional[str] = None, model: Optional[str] = None):
+    """
+    Chronomètre une étape : histogramme de durée, jauge en cours, erreurs,
+    et span de la trace de la requête courante (utils/tracing.py).
+    """
+    STAGE_IN_FLIGHT.inc(stage=name)
+    start = time.perf_counter()
+    try:
+        with span(name, language=language, model=model):
+            yield
+    except GeneratorExit:
+        raise                     # flux abandonné par le client : pas une erreur
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_IN_FLIGHT.dec(stage=name)
+        STAGE_SECONDS.observe(
+            time.perf_counter() - start, stage=name, language=language or "", model=model or ""
+        )
+
+
+def observe_generation(model: str, stats: dict, ttft: Optional[float] = None) -> None:
+    """
+    Statistiques de fin de génération d’Ollama (durées en nanosecondes) :
+    `eval_count` / `eval_duration` → tokens/s, `prompt_eval_count`, et TTFT
+    (mesuré par l’appelant en streaming, estimé sinon).
+    """
+    eval_count = stats.get("eval_count")
+    eval_duration = stats.get("eval_duration")
+    if eval_count:
+        OLLAMA_TOKENS.inc(eval_count, model=model, kind="generated")
+        if eval_duration:
+            OLLAMA_TOKENS_PER_SECOND.observe(eval_count / (eval_duration / 1e9), model=model)
+    if stats.get("prompt_eval_count"):
+        OLLAMA_TOKENS.inc(stats["prompt_eval_count"], model=model, kind="prompt")
+    if ttft is None and "prompt_eval_duration" in stats:
+        ttft = (stats.get("load_duration", 0) + stats["prompt_eval_duration"]) / 1e9
+    if ttft is not None:
+        OLLAMA_TTFT.observe(ttft, model=model)
+
+
+# ----------------------------------------------------------------------
+# 3️⃣  Middleware ASGI
+# ----------------------------------------------------------------------
+class MetricsMiddleware:
+    """
+    Compte les requêtes par route (gabarit, ex. /v1/ingest/{job_id}, pour
+    borner la cardinalité) et mesure leur durée jusqu’au dernier octet :
+    les réponses en flux (SSE, NDJSON) sont chronométrées en entier.
+    """
+
+    def __init__(self, app, exclude: Iterable[str] = ("/metrics",)) -> None:
+        self.app = app
+        self.exclude = set(exclude)
+
+    @staticmethod
+    def _endpoint(scope) -> str:
+        from starlette.routing import Match
+
+        partial = None
+        for route in getattr(scope.get("app"), "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path          # méthode non autorisée (405)
+        return partial or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        endpoint = self._endpoint(scope)
+        status = {"code": 500}
+        HTTP_IN_FLIGHT.inc(endpoint=endpoint)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+            HTTP_REQUESTS.inc(method=method, endpoint=endpoint, status=str(status["code"]))
+            HTTP_SECONDS.observe(time.perf_counter() - start, method=method, endpoint=endpoint)
@@ -1,27 +1,285 @@
 # backend/utils/ollama_client.py
+import asyncio
 import json
+import os
+import time
 import httpx
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from utils.backends import pool, Backend
+from utils.metrics import stage, observe_generation
 
 # ----------------------------------------------------------------------
 # Exceptions spécifiques
 # ----------------------------------------------------------------------
 class OllamaError(RuntimeError):
     """Exception levée lorsqu’une requête vers Ollama échoue."""
-    pass
+
+    def __init__(self, message: str, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        # Code HTTP d’Ollama s’il y en a un (5xx : compte pour l’éjection du serveur)
+        self.status_code = status_code
+
+
+# ----------------------------------------------------------------------
+# Configuration du pool de connexions (surchargeable via l’environnement)
+# ----------------------------------------------------------------------
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "16"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "30"))
+
+# Modèle servi par défaut
+DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama2:13b-chat-q4_0")
+
+# Durée pendant laquelle Ollama garde le modèle en RAM après la dernière requête
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Chargement initial d’un 13B : bien plus long qu’une génération
+OLLAMA_WARMUP_TIMEOUT = float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "300"))
+
+# ----------------------------------------------------------------------
+# Client HTTP asynchrone partagé – créé dans le lifespan de l’application
+# ----------------------------------------------------------------------
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+        keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+async def start_client() -> httpx.AsyncClient:
+    """Ouvre le client partagé (appelé au démarrage de l’application)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def close_client() -> None:
+    """Ferme le client partagé et libère les connexions du pool."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Retourne le client partagé.
+    S’il n’a pas été ouvert par le lifespan (scripts, tests), on le crée à la volée.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def _request_timeout(timeout: Optional[float]):
+    if timeout is None:
+        return httpx.USE_CLIENT_DEFAULT
+    return httpx.Timeout(timeout, connect=OLLAMA_CONNECT_TIMEOUT)
+
+
+def _http_error(response: httpx.Response, body: Optional[str] = None) -> OllamaError:
+    return OllamaError(
+        f"Ollama a renvoyé le code HTTP {response.status_code}: "
+        f"{response.text if body is None else body}",
+        status_code=response.status_code,
+    )
+
+
+@asynccontextmanager
+async def _target(model: str, path: str, endpoint: Optional[str], prefer: Optional[str] = None):
+    """
+    (URL à appeler, serveur retenu) : `endpoint` si fourni (serveur None),
+    sinon le serveur choisi par le pool, `prefer` d’abord s’il est disponible.
+    """
+    if endpoint is not None:
+        yield endpoint, None
+        return
+    async with pool.lease(model, prefer) as backend:
+        yield f"{backend.url}{path}", backend.url
+
+
+async def _on_backends(call: Callable[[Backend], Any]) -> Dict[str, Any]:
+    """
+    Exécute `call(backend)` sur chaque serveur disponible (tous si aucun ne
+    l’est) et retourne {url: résultat ou exception}.
+    """
+    backends = [b for b in pool.backends if b.available] or pool.backends
+    results = await asyncio.gather(*(call(b) for b in backends), return_exceptions=True)
+    return {b.url: r for b, r in zip(backends, results)}
+
+
+def _raise_if_all_failed(results: Dict[str, Any]) -> None:
+    errors = [r for r in results.values() if isinstance(r, BaseException)]
+    if errors and len(errors) == len(results):
+        if len(errors) == 1:
+            raise errors[0]
+        raise OllamaError(" ; ".join(f"{url} : {r}" for url, r in results.items()))
+
+
+# ----------------------------------------------------------------------
+# Préchargement du modèle
+# ----------------------------------------------------------------------
+async def warm_model(
+    model: str = DEFAULT_MODEL,
+    *,
+    timeout: float = OLLAMA_WARMUP_TIMEOUT,
+    endpoint: Optional[str] = None,
+) -> None:
+    """
+    Fait charger `model` en mémoire par Ollama (un prompt vide ne génère
+    rien) et le garde résident `OLLAMA_KEEP_ALIVE` : la première requête
+    utilisateur ne paie plus le chargement des poids.  Sans `endpoint`,
+    sur chaque serveur disponible du pool.
+
+    Raises
+    ------
+    OllamaError
+        Si Ollama est injoignable ou refuse le chargement (modèle absent…)
+        sur tous les serveurs.
+    """
+    payload = {"model": model, "prompt": "", "stream": False, "keep_alive": OLLAMA_KEEP_ALIVE}
+
+    async def warm(url: str) -> None:
+        try:
+            response = await get_client().post(
+                url, json=payload, timeout=_request_timeout(timeout)
+            )
+        except httpx.RequestError as exc:
+            raise OllamaError(f"Erreur réseau lors de l’appel à Ollama : {exc}") from exc
+        if response.status_code != 200:
+            raise _http_error(response)
+
+    if endpoint is not None:
+        return await warm(endpoint)
+
+    async def warm_backend(backend: Backend) -> None:
+        await warm(f"{backend.url}/api/generate")
+        backend.mark(model, loaded=True)
+
+    _raise_if_all_failed(await _on_backends(warm_backend))
+
+
+# ----------------------------------------------------------------------
+# Téléchargement d’un modèle (API HTTP /api/pull)
+# ----------------------------------------------------------------------
+async def pull_model(
+    model: str,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    *,
+    endpoint: Optional[str] = None,
+) -> None:
+    """
+    Télécharge `model` dans Ollama via /api/pull en streaming (sans
+    `endpoint` : sur chaque serveur disponible du pool, en parallèle).
+
+    Ollama envoie une ligne NDJSON par étape (`pulling manifest`, puis une par
+    couche avec `digest` / `total` / `completed`, `verifying…`, `success`).
+    Les octets sont cumulés sur toutes les couches (et tous les serveurs) et
+    `progress` reçoit `{status, completed_bytes, total_bytes, percent}` à
+    chaque ligne, plus `failed_backends` si certains serveurs ont échoué.
+    Pas de timeout de lecture : un pull de plusieurs Go peut durer des minutes.
+
+    Raises
+    ------
+    OllamaError
+        Si Ollama est injoignable, renvoie une erreur (modèle inconnu, disque
+        plein…) ou si le flux se termine sans `success`, sur tous les serveurs.
+    """
+    if endpoint is not None:
+        return await _pull_one(model, endpoint, progress)
+
+    states: Dict[str, Dict[str, Any]] = {}
+
+    def report(url: str, state: Dict[str, Any]) -> None:
+        states[url] = state
+        if progress is None:
+            return
+        total = sum(s["total_bytes"] for s in states.values())
+        completed = sum(s["completed_bytes"] for s in states.values())
+        pending = [s["status"] for s in states.values() if s["status"] != "success"]
+        progress({
+            "status": pending[0] if pending else "success",
+            "completed_bytes": completed,
+            "total_bytes": total,
+            "percent": round(100 * completed / total, 1) if total else 0.0,
+        })
+
+    async def pull_backend(backend: Backend) -> None:
+        await _pull_one(model, f"{backend.url}/api/pull", lambda state: report(backend.url, state))
+        backend.mark(model)
+
+    results = await _on_backends(pull_backend)
+    _raise_if_all_failed(results)
+    failed = [url for url, r in results.items() if isinstance(r, BaseException)]
+    if failed and progress is not None:
+        progress({"failed_backends": failed})
+
+
+async def _pull_one(
+    model: str, endpoint: str, progress: Optional[Callable[[Dict[str, Any]], None]]
+) -> None:
+    payload = {"model": model, "name": model, "stream": True}
+    layers: Dict[str, Dict[str, int]] = {}
+    try:
+        async with get_client().stream(
+            "POST", endpoint, json=payload,
+            timeout=httpx.Timeout(None, connect=OLLAMA_CONNECT_TIMEOUT),
+        ) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode(errors="replace")
+                raise _http_error(response, body)
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise OllamaError("Flux Ollama non‑JSON") from exc
+                if "error" in data:
+                    raise OllamaError(f"Erreur Ollama : {data['error']}")
+                if data.get("digest") and data.get("total"):
+                    layers[data["digest"]] = {
+                        "total": int(data["total"]),
+                        "completed": int(data.get("completed", 0)),
+                    }
+                if progress is not None:
+                    total = sum(layer["total"] for layer in layers.values())
+                    completed = sum(layer["completed"] for layer in layers.values())
+                    progress({
+                        "status": data.get("status", ""),
+                        "completed_bytes": completed,
+                        "total_bytes": total,
+                        "percent": round(100 * completed / total, 1) if total else 0.0,
+                    })
+                if data.get("status") == "success":
+                    return
+    except httpx.RequestError as exc:
+        raise OllamaError(f"Erreur réseau lors de l’appel à Ollama : {exc}") from exc
+    raise OllamaError(f"Téléchargement de {model} interrompu avant la fin")
 
 
 # ----------------------------------------------------------------------
 # Fonction principale – generate_code
 # ----------------------------------------------------------------------
-def generate_code(
+async def generate_code(
     prompt: str,
     *,
-    model: str = "llama2:13b-chat-q4_0",
+    model: str = DEFAULT_MODEL,
     max_tokens: int = 1024,
     temperature: float = 0.7,
-    timeout: int = 30,
-    endpoint: str = "http://ollama:11434/api/generate",
+    timeout: Optional[float] = None,
+    endpoint: Optional[str] = None,
 ) -> str:
     """
     Envoie le prompt à Ollama et renvoie le texte généré.
@@ -36,10 +294,11 @@ def generate_code(
         Nombre maximal de tokens à générer.
     temperature: float, optional
         Paramètre de température (diversité de la génération).
-    timeout: int, optional
-        Timeout en secondes pour la requête HTTP.
+    timeout: float, optional
+        Timeout en secondes pour la requête HTTP (par défaut `OLLAMA_TIMEOUT`).
     endpoint: str, optional
-        URL de l’API Ollama (dans le réseau Docker, le service s’appelle « ollama »).
+        URL complète de l’API Ollama ; par défaut, /api/generate du serveur
+        choisi par le pool (OLLAMA_HOSTS / OLLAMA_HOST, voir utils.backends).
 
     Returns
     -------
@@ -58,24 +317,42 @@ def generate_code(
         "max_tokens": max_tokens,
         "temperature": temperature,
         "stream": False,          # on veut la réponse complète en une fois
+        "keep_alive": OLLAMA_KEEP_ALIVE,
     }
+    data, _ = await _generate(payload, timeout, endpoint)
+    return _response_text(data)
 
-    try:
-        with httpx.Client(timeout=timeout) as client:
-            response = client.post(endpoint, json=payload)
-    except httpx.RequestError as exc:
-        raise OllamaError(f"Erreur réseau lors de l’appel à Ollama : {exc}") from exc
 
-    if response.status_code != 200:
-        raise OllamaError(
-            f"Ollama a renvoyé le code HTTP {response.status_code}: {response.text}"
-        )
+async def _generate(
+    payload: Dict[str, Any],
+    timeout: Optional[float],
+    endpoint: Optional[str],
+    prefer: Optional[str] = None,
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Appel non‑streaming à /api/generate ; retourne (objet JSON d’Ollama, serveur appelé)."""
+    model = payload["model"]
+    with stage("ollama_generate", model=model):
+        async with _target(model, "/api/generate", endpoint, prefer) as (url, backend):
+            try:
+                response = await get_client().post(
+                    url, json=payload, timeout=_request_timeout(timeout)
+                )
+            except httpx.RequestError as exc:
+                raise OllamaError(f"Erreur réseau lors de l’appel à Ollama : {exc}") from exc
 
-    try:
-        data = response.json()
-    except json.JSONDecodeError as exc:
-        raise OllamaError("Réponse Ollama non‑JSON") from exc
+            if response.status_code != 200:
+                raise _http_error(response)
+
+        try:
+            data = response.json()
+        except json.JSONDecodeError as exc:
+            raise OllamaError("Réponse Ollama non‑JSON") from exc
+    # eval_count / eval_duration… : débit et TTFT estimé
+    observe_generation(model, data)
+    return data, backend
 
+
+def _response_text(data: Dict[str, Any]) -> str:
     # Ollama renvoie généralement un champ `response` contenant le texte généré.
     # Certaines versions renvoient `output` – on gère les deux.
     if "response" in data:
@@ -83,4 +360,119 @@ def generate_code(
     if "output" in data:
         return data["output"]
 
-    raise OllamaError("Champ de réponse manquant dans la réponse d’Ollama")
\ No newline at end of file
+    raise OllamaError("Champ de réponse manquant dans la réponse d’Ollama")
+
+
+# ----------------------------------------------------------------------
+# Génération dans une conversation – generate_with_context
+# ----------------------------------------------------------------------
+async def generate_with_context(
+    prompt: str,
+    context: Optional[List[int]] = None,
+    *,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 1024,
+    temperature: float = 0.7,
+    timeout: Optional[float] = None,
+    endpoint: Optional[str] = None,
+    backend: Optional[str] = None,
+) -> Tuple[str, Optional[List[int]], Optional[str]]:
+    """
+    Comme `generate_code`, en poursuivant la conversation décrite par
+    `context` (tableau de tokens renvoyé par Ollama au tour précédent) :
+    seul `prompt` est à évaluer, le préfixe est repris du cache KV.
+
+    `backend` : serveur du tour précédent, qui a ce préfixe en cache KV ;
+    il est retenu tant que le pool le juge disponible (sinon un autre
+    serveur ré‑évalue le `context`, plus lentement).
+
+    Returns
+    -------
+    (str, list[int] | None, str | None)
+        Le texte généré, le nouveau `context` (None si Ollama n’en renvoie pas)
+        et le serveur qui a répondu (None avec `endpoint`).
+    """
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+    }
+    if context:
+        payload["context"] = context
+    data, used = await _generate(payload, timeout, endpoint, backend)
+    return _response_text(data), data.get("context"), used
+
+
+# ----------------------------------------------------------------------
+# Variante streaming – stream_code
+# ----------------------------------------------------------------------
+async def stream_code(
+    prompt: str,
+    *,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 1024,
+    temperature: float = 0.7,
+    timeout: Optional[float] = None,
+    endpoint: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Envoie le prompt à Ollama en mode `stream` et produit les tokens au fil de l’eau.
+
+    Ollama répond en NDJSON : un objet `{"response": "...", "done": false}` par
+    token, puis un objet final `{"done": true, ...}`.  Les paramètres sont les
+    mêmes que pour `generate_code`.
+
+    Yields
+    ------
+    str
+        Fragments de texte successifs (tokens) tels que renvoyés par Ollama.
+
+    Raises
+    ------
+    OllamaError
+        Si la requête échoue, si le code HTTP n’est pas 200,
+        ou si une ligne du flux n’est pas du JSON valide.
+    """
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": True,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+    }
+
+    start = time.perf_counter()
+    ttft: Optional[float] = None
+    try:
+        with stage("ollama_generate", model=model):
+            async with _target(model, "/api/generate", endpoint) as (url, _):
+                async with get_client().stream(
+                    "POST", url, json=payload, timeout=_request_timeout(timeout)
+                ) as response:
+                    if response.status_code != 200:
+                        body = (await response.aread()).decode(errors="replace")
+                        raise _http_error(response, body)
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        try:
+                            data = json.loads(line)
+                        except json.JSONDecodeError as exc:
+                            raise OllamaError("Flux Ollama non‑JSON") from exc
+                        if "error" in data:
+                            raise OllamaError(f"Erreur Ollama : {data['error']}")
+                        token = data.get("response", data.get("output", ""))
+                        if token:
+                            if ttft is None:
+                                ttft = time.perf_counter() - start
+                            yield token
+                        if data.get("done"):
+                            # Objet final : eval_count, eval_duration…
+                            observe_generation(model, data, ttft)
+                            break
+    except httpx.RequestError as exc:
+        raise OllamaError(f"Erreur réseau lors de l’appel à Ollama : {exc}") from exc
@@ -2,25 +2,117 @@
 import re
 import subprocess
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
+
+from utils.formatters import format_code
+from utils.metrics import stage
+from utils.scanner import Finding, scanner_for, extract_fenced_blocks
 
 # ----------------------------------------------------------------------
 # 1️⃣  Strip des fences Markdown
 # ----------------------------------------------------------------------
+_FENCE_LINE_RE = re.compile(r"^```(?:[a-zA-Z0-9]*)?\s*$")
+
+
 def strip_fences(code: str) -> str:
     """
     Supprime les fences Markdown éventuels autour du code.
     Gère ```python, ```bash, ```julia, etc.
     """
-    # Recherche du premier bloc de fence et du dernier
-    fence_pattern = r"^```(?:[a-zA-Z0-9]*)?\s*$"
     lines = code.splitlines()
-    # Retirer les fences en tête et queue
-    while lines and re.match(fence_pattern, lines[0]):
-        lines.pop(0)
-    while lines and re.match(fence_pattern, lines[-1]):
-        lines.pop(-1)
-    return "\n".join(lines).strip()
+    # Retirer les fences en tête et queue (indices, pas de pop(0) quadratique)
+    start, end = 0, len(lines)
+    while start < end and _FENCE_LINE_RE.match(lines[start]):
+        start += 1
+    while end > start and _FENCE_LINE_RE.match(lines[end - 1]):
+        end -= 1
+    return "\n".join(lines[start:end]).strip()
+
+
+_LANGUAGE_ALIASES = {
+    "py": "python", "python3": "python", "js": "javascript", "ts": "typescript",
+    "sh": "bash", "shell": "bash", "jl": "julia", "tex": "latex",
+}
+
+
+def extract_code(raw: str, language: Optional[str] = None) -> str:
+    """
+    Code utile d’une réponse du modèle.  Si la réponse mêle prose et blocs
+    ```…```, seuls les blocs sont gardés (ceux du langage demandé s’il y en
+    a) ; sinon on se contente de `strip_fences`.
+    """
+    blocks, prose = extract_fenced_blocks(raw)
+    if not blocks or not prose:
+        return strip_fences(raw)
+    tags = [_LANGUAGE_ALIASES.get((b.language or "").lower(), b.language) for b in blocks]
+    matching = [b for b, tag in zip(blocks, tags) if language and tag == language]
+    chosen = matching or [b for b, tag in zip(blocks, tags) if tag is None] or blocks
+    return "\n\n".join(b.code for b in chosen).strip()
+
+
+# Début de ligne qui peut encore devenir une fence une fois complété
+_FENCE_PREFIX_RE = re.compile(r"^(?:`{0,2}|```[a-zA-Z0-9]*\s*)$")
+
+
+class FenceStripper:
+    """
+    Version incrémentale de `strip_fences` pour le mode streaming.
+
+    `feed()` reçoit les tokens au fil de l’eau et renvoie le texte qui peut
+    déjà être affiché ; `finish()` renvoie le reliquat en fin de flux.
+    Les fences de tête sont supprimées dès qu’elles sont reconnues ; une fence
+    (ou des blancs) après du contenu est retenue jusqu’à savoir si elle est
+    finale (supprimée) ou suivie d’autre contenu (réémise telle quelle).
+    """
+
+    def __init__(self) -> None:
+        self._partial = ""            # début de ligne qui peut encore être une fence
+        self._line_open = False       # la ligne courante est déjà en cours d’émission
+        self._held = ""               # fences / blancs potentiellement finaux
+        self._started = False         # du contenu a déjà été émis
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        body = text.rstrip()
+        if not body:
+            self._held += text
+            return ""
+        out = self._held + body
+        self._held = text[len(body):]
+        return out
+
+    def feed(self, chunk: str) -> str:
+        out = []
+        for piece in chunk.splitlines(keepends=True):
+            complete = piece.endswith(("\n", "\r"))
+            if self._line_open:
+                out.append(self._emit(piece))
+                self._line_open = not complete
+                continue
+
+            self._partial += piece
+            if complete:
+                line, self._partial = self._partial, ""
+                if _FENCE_LINE_RE.match(line):
+                    if self._started:
+                        self._held += line
+                else:
+                    out.append(self._emit(line))
+            elif not _FENCE_PREFIX_RE.match(self._partial):
+                out.append(self._emit(self._partial))
+                self._partial = ""
+                self._line_open = True
+        return "".join(out)
+
+    def finish(self) -> str:
+        line, self._partial = self._partial, ""
+        if line and not _FENCE_LINE_RE.match(line):
+            return self._emit(line)
+        return ""
 
 
 # ----------------------------------------------------------------------
@@ -46,40 +138,28 @@ def syntax_ok_python(code: str) -> Tuple[bool, Optional[str]]:
 
 
 # ----------------------------------------------------------------------
-# 4️⃣  Formatage avec Black (Python) – fallback si Black absent
+# 4️⃣  Détection de code dangereux (liste blanche configurable)
 # ----------------------------------------------------------------------
-def format_python_black(code: str) -> str:
-    try:
-        import black
-        mode = black.FileMode()
-        return black.format_str(code, mode=mode)
-    except Exception:
-        # Black non installé ou erreur – on renvoie le code brut
-        return code
+# Règles compilées au démarrage dans utils.scanner (DANGEROUS_RULES_FILE
+# pour en ajouter / désactiver), appliquées en une seule passe.
+def find_dangerous_code(code: str, language: Optional[str] = None) -> List[Finding]:
+    """Toutes les occurrences dangereuses (règle, ligne, colonne) pour `language`."""
+    return scanner_for(language).scan(code)
 
 
-# ----------------------------------------------------------------------
-# 5️⃣  Détection de code dangereux (liste blanche configurable)
-# ----------------------------------------------------------------------
-DANGEROUS_PATTERNS = [
-    r"\beval\s*\(",
-    r"\bexec\s*\(",
-    r"\bos\.system\s*\(",
-    r"\bsubprocess\.Popen\s*\(",
-    r"\bsubprocess\.call\s*\(",
-    r"\bsubprocess\.run\s*\(",
-]
-
-def contains_dangerous_code(code: str) -> bool:
-    """Retourne True si l’un des patterns dangereux est trouvé."""
-    for pat in DANGEROUS_PATTERNS:
-        if re.search(pat, code):
-            return True
-    return False
+def contains_dangerous_code(code: str, language: Optional[str] = None) -> bool:
+    """Retourne True si l’une des règles dangereuses est déclenchée."""
+    return scanner_for(language).matches(code)
+
+
+def _describe(findings: List[Finding], limit: int = 5) -> str:
+    shown = ", ".join(f"{f.rule} (l.{f.line}:{f.column})" for f in findings[:limit])
+    more = f" +{len(findings) - limit}" if len(findings) > limit else ""
+    return shown + more
 
 
 # ----------------------------------------------------------------------
-# 6️⃣  Header de provenance
+# 5️⃣  Header de provenance
 # ----------------------------------------------------------------------
 def add_provenance_header(code: str) -> str:
     header = "# Generated by Chloe‑Code (LLM) – 2026-01-17\n"
@@ -87,9 +167,9 @@ def add_provenance_header(code: str) -> str:
 
 
 # ----------------------------------------------------------------------
-# 7️⃣  Fonction principale – postprocess_code
+# 6️⃣  Fonction principale – postprocess_code_async
 # ----------------------------------------------------------------------
-def postprocess_code(
+async def postprocess_code_async(
     raw_code: str,
     language: str,
     block_dangerous: bool = False,
@@ -97,29 +177,30 @@ def postprocess_code(
     """
     Applique toutes les étapes de post‑processing.
     Retourne (code_final, warning_message).  warning_message est None si tout va bien.
+
+    Le formatage (Black, prettier, shfmt, sqlfluff…) est délégué à
+    utils.formatters (pool de processus / outils externes, avec délai et
+    cache) au lieu de tourner sur la boucle.
     """
-    # 1. Strip fences
-    code = strip_fences(raw_code)
-
-    # 2. Normalisation indentation
-    code = normalize_indentation(code)
-
-    # 3. Détection de code dangereux
-    if block_dangerous and contains_dangerous_code(code):
-        return "", "Code dangereux détecté et bloqué (eval/exec/os.system/etc.)"
-
-    # 4. Formatage / validation selon le langage
-    warning = None
-    if language == "python":
-        ok, err = syntax_ok_python(code)
-        if not ok:
-            warning = f"Syntax error : {err}"
-        else:
-            code = format_python_black(code)
-    # TODO : ajouter les formatters pour R, Julia, JS/TS, Bash, LaTeX, SQL
-    # (pour le prototype on laisse le code tel quel)
-
-    # 5. Header de provenance
-    code = add_provenance_header(code)
-
-    return code, warning
\ No newline at end of file
+    with stage("postprocess_code", language=language):
+        # 1‑2. Extraction du code, normalisation indentation
+        code = normalize_indentation(extract_code(raw_code, language))
+
+        # 3. Détection de code dangereux
+        if block_dangerous:
+            findings = find_dangerous_code(code, language)
+            if findings:
+                return "", f"Code dangereux détecté et bloqué : {_describe(findings)}"
+
+        # 4. Validation puis formatage selon le langage
+        warning = None
+        if language == "python":
+            ok, err = syntax_ok_python(code)
+            if not ok:
+                warning = f"Syntax error : {err}"
+        if warning is None:
+            code, warning = await format_code(code, language)
+
+        # 5. Header de provenance
+        code = add_provenance_header(code)
+        return code, warning
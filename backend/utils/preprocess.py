@@ -1,7 +1,13 @@
 # backend/utils/preprocess.py
+import asyncio
+import os
 import re
-from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
+
+from logger_util import log_error
+from utils.file_context import file_context_cache
+from utils.metrics import stage
+from utils.tokens import count_tokens, count_tokens_batch
 
 def _clean_prompt(raw: str) -> str:
     """
@@ -19,58 +25,198 @@ def _clean_prompt(raw: str) -> str:
     return cleaned
 
 
-def _extract_file_context(file_path: Optional[str]) -> dict:
+def _extract_file_context(file_path: Optional[str], language: Optional[str] = None) -> dict:
     """
     Retourne un dictionnaire contenant des informations utiles sur le fichier actif.
-    - `filename` : nom du fichier (ex. `script.py`)
-    - `imports` : liste des imports détectés (simple regex, suffisant pour un prototype)
+    - `filename` : nom du fichier (ex. `script.py`)
+    - `imports` : imports détectés (en‑tête du fichier)
+    - `symbols` : signatures des définitions de premier niveau
+    Les résultats sont mis en cache par (chemin, taille, mtime) : voir utils.file_context.
     """
-    context = {"filename": None, "imports": []}
     if not file_path:
-        return context
-
-    path = Path(file_path)
-    context["filename"] = path.name
+        return {"filename": None, "imports": [], "symbols": []}
+    return file_context_cache.get(file_path, language)
 
-    try:
-        content = path.read_text(encoding="utf-8")
-        # Recherche très simple d'import statements (Python, R, Julia, JS/TS)
-        imports = re.findall(r"^\s*(?:import|using|require|library)\s+([^\s;]+)", content, flags=re.MULTILINE)
-        context["imports"] = list(set(imports))
-    except Exception:
-        # Si le fichier n’est pas accessible, on ignore silencieusement
-        pass
 
-    return context
+# ----------------------------------------------------------------------
+# Assemblage sous budget de tokens
+# ----------------------------------------------------------------------
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2048"))
+PROMPT_KB_K = int(os.getenv("PROMPT_KB_K", "4"))
+PROMPT_KB_MODE = os.getenv("PROMPT_KB_MODE", "hybrid")
+PROMPT_KB_MIN_SCORE = float(os.getenv("PROMPT_KB_MIN_SCORE", "0.0"))
+# En dessous, un extrait tronqué n’apporte plus rien
+_MIN_SNIPPET_TOKENS = 48
+_SNIPPETS_HEADING = "\nRelevant code from the knowledge base:\n"
 
 
-def build_prompt(user_prompt: str, file_path: Optional[str] = None, language: Optional[str] = None) -> str:
-    """
-    Construit le prompt final envoyé à Ollama.
-    - Nettoie le prompt utilisateur.
-    - Ajoute le contexte du fichier (si fourni).
-    - Enveloppe le tout dans un template explicite.
-    """
-    cleaned = _clean_prompt(user_prompt)
-    ctx = _extract_file_context(file_path)
-
+def _header(language: Optional[str]) -> str:
     # Template de base – on indique le rôle du modèle et le langage cible
     template = (
         "You are a senior software engineer specialized in {lang}. "
         "Generate clean, well‑documented code that fulfills the user's request.\n\n"
     )
-
-    # Remplace `{lang}` par le langage demandé ou par « general programming » si inconnu
+    # Remplace `{lang}` par le langage demandé ou par « general programming » si inconnu
     lang_token = language if language else "general programming"
-    prompt_header = template.format(lang=lang_token)
+    return template.format(lang=lang_token)
+
+
+def _snippet_block(snippet: dict) -> str:
+    return f"### {snippet.get('title', 'Untitled')}\n```\n{snippet['snippet'].rstrip()}\n```\n"
 
-    # Ajout du contexte du fichier (facultatif)
+
+def _truncate_to(text: str, max_tokens: int) -> Optional[str]:
+    """Plus long préfixe (en lignes) de `text` tenant dans `max_tokens`."""
+    lines = text.splitlines(keepends=True)
+    lo, hi = 0, len(lines)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens("".join(lines[:mid])) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return "".join(lines[:lo]) if lo else None
+
+
+def _pack(
+    cleaned: str,
+    language: Optional[str],
+    ctx: dict,
+    snippets: List[dict],
+    budget: int,
+) -> Tuple[str, int]:
+    """
+    Assemble en-tête, contexte fichier, extraits KB et requête dans `budget`
+    tokens.  L’en‑tête et la requête sont toujours gardés ; le reste est admis
+    par score décroissant (contexte fichier d’abord, puis extraits selon leur
+    score de recherche), le dernier extrait admis pouvant être tronqué.
+    Retourne (prompt, nombre de tokens du prompt final).
+    """
+    header = _header(language)
+    request = f"\nUser request:\n{cleaned}"
+
+    # (score, rang d’affichage, texte) – le contexte fichier passe avant les extraits
+    optional: List[Tuple[float, int, str]] = []
     if ctx["filename"]:
-        prompt_header += f"The user is editing the file **{ctx['filename']}**.\n"
+        optional.append((3.0, 0, f"The user is editing the file **{ctx['filename']}**.\n"))
     if ctx["imports"]:
         imports_str = ", ".join(ctx["imports"])
-        prompt_header += f"The current file imports: {imports_str}.\n"
+        optional.append((2.0, 1, f"The current file imports: {imports_str}.\n"))
+    if ctx.get("symbols"):
+        defs = "".join(f"- {sig}\n" for sig in ctx["symbols"])
+        optional.append((1.5, 2, f"Top-level definitions in this file:\n{defs}"))
+    for rank, snippet in enumerate(snippets):
+        optional.append((float(snippet.get("score") or 0.0), 10 + rank, _snippet_block(snippet)))
+
+    counts = count_tokens_batch([header, request, _SNIPPETS_HEADING] + [t for _, _, t in optional])
+    used = counts[0] + counts[1]
+    heading_cost = counts[2]
+    kept: List[Tuple[int, str]] = []
+    for (score, order, text), cost in sorted(
+        zip(optional, counts[3:]), key=lambda item: item[0][0], reverse=True
+    ):
+        is_snippet = order >= 10
+        extra = heading_cost if is_snippet and not any(o >= 10 for o, _ in kept) else 0
+        if used + extra + cost <= budget:
+            kept.append((order, text))
+            used += extra + cost
+        elif is_snippet and budget - used - extra >= _MIN_SNIPPET_TOKENS:
+            truncated = _truncate_to(text.rstrip("`\n"), budget - used - extra - 4)
+            if truncated:
+                text = truncated.rstrip("\n") + "\n```\n"
+                kept.append((order, text))
+                used += extra + count_tokens(text)
+
+    kept.sort()
+    parts = [header]
+    parts.extend(text for order, text in kept if order < 10)
+    snippet_texts = [text for order, text in kept if order >= 10]
+    if snippet_texts:
+        parts.append(_SNIPPETS_HEADING)
+        parts.extend(snippet_texts)
+    parts.append(request)
+    prompt = "".join(parts)
+    return prompt, count_tokens(prompt)
 
-    # Corps du prompt
-    final_prompt = f"{prompt_header}\nUser request:\n{cleaned}"
-    return final_prompt
\ No newline at end of file
+
+def build_prompt(
+    user_prompt: str,
+    file_path: Optional[str] = None,
+    language: Optional[str] = None,
+    *,
+    budget: int = PROMPT_TOKEN_BUDGET,
+) -> str:
+    """
+    Construit le prompt final envoyé à Ollama (sans recherche dans la KB).
+    - Nettoie le prompt utilisateur.
+    - Ajoute le contexte du fichier (si fourni).
+    - Enveloppe le tout dans un template explicite, borné à `budget` tokens.
+    """
+    cleaned = _clean_prompt(user_prompt)
+    ctx = _extract_file_context(file_path, language)
+    prompt, _ = _pack(cleaned, language, ctx, [], budget)
+    return prompt
+
+
+async def assemble_prompt(
+    user_prompt: str,
+    file_path: Optional[str] = None,
+    language: Optional[str] = None,
+    *,
+    use_kb: bool = False,
+    k: int = PROMPT_KB_K,
+    budget: int = PROMPT_TOKEN_BUDGET,
+) -> Tuple[str, int]:
+    """
+    Variante asynchrone de `build_prompt` : le contexte du fichier et, si
+    `use_kb`, les `k` meilleurs extraits de la KB sont obtenus en parallèle
+    (hors de la boucle), puis assemblés sous `budget` tokens.
+    Retourne (prompt, nombre de tokens).  Une KB indisponible n’empêche pas
+    la génération : le prompt est alors construit sans extraits.
+    """
+    cleaned = _clean_prompt(user_prompt)
+
+    async def snippets() -> List[dict]:
+        if not use_kb:
+            return []
+        from utils.chroma_client import search_kb
+        try:
+            results = await asyncio.to_thread(search_kb, cleaned, k, PROMPT_KB_MODE)
+        except Exception as exc:
+            log_error("prompt-kb", str(exc))
+            return []
+        return [r for r in results if (r.get("score") or 0.0) >= PROMPT_KB_MIN_SCORE]
+
+    with stage("build_prompt", language=language):
+        ctx, found = await asyncio.gather(
+            asyncio.to_thread(_extract_file_context, file_path, language),
+            snippets(),
+        )
+        return await asyncio.to_thread(_pack, cleaned, language, ctx, found, budget)
+
+
+# ----------------------------------------------------------------------
+# Sessions : tours suivants d’une conversation (voir utils.sessions)
+# ----------------------------------------------------------------------
+def followup_prompt(user_prompt: str) -> Tuple[str, int]:
+    """
+    Prompt d’un tour suivant quand le `context` Ollama est réutilisé :
+    seule la nouvelle instruction est envoyée, l’en‑tête, le contexte du
+    fichier et le code déjà produit sont dans le préfixe.
+    """
+    prompt = (
+        "\nFollow-up request (revise the code from your previous answer):\n"
+        f"{_clean_prompt(user_prompt)}"
+    )
+    return prompt, count_tokens(prompt)
+
+
+def replay_instructions(previous: List[str], user_prompt: str) -> str:
+    """
+    Instruction unique rejouant toute la conversation, pour reconstruire
+    le prompt complet quand le `context` est perdu (expiré, autre modèle).
+    """
+    if not previous:
+        return user_prompt
+    steps = [*previous, user_prompt]
+    return "\n".join(f"{i}. {step.strip()}" for i, step in enumerate(steps, 1))
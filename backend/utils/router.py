@@ -0,0 +1,220 @@
+# backend/utils/router.py
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.cache import make_key
+from utils.dispatcher import dispatcher
+from utils.metrics import counter
+from utils.ollama_client import generate_code
+from utils.postprocess import extract_code, normalize_indentation, syntax_ok_python
+from utils.tracing import span
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+def _parse_models(spec: str, default_limit: int) -> List[Tuple[str, int]]:
+    """« modèle[=max_tokens_prompt],… » → [(modèle, limite)], du plus rapide au plus lent."""
+    models = []
+    for entry in spec.split(","):
+        name, _, limit = entry.strip().partition("=")
+        if name:
+            models.append((name, int(limit) if limit else default_limit))
+    return models
+
+
+# Modèles rapides essayés avant le modèle actif (vide = routage désactivé)
+ROUTER_FAST_MAX_TOKENS = int(os.getenv("ROUTER_FAST_MAX_TOKENS", "512"))
+ROUTER_FAST_MODELS = _parse_models(os.getenv("ROUTER_FAST_MODELS", ""), ROUTER_FAST_MAX_TOKENS)
+# Langages confiés aux petits modèles (R, Julia, LaTeX : trop mal servis)
+ROUTER_FAST_LANGUAGES = [
+    lang.strip()
+    for lang in os.getenv("ROUTER_FAST_LANGUAGES", "python,javascript,typescript,bash,sql").split(",")
+    if lang.strip()
+]
+# Poids de la dernière mesure dans les moyennes mobiles exponentielles
+ROUTER_EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.2"))
+# Une requête éligible sur N essaie le petit modèle quoi qu’en disent les stats
+# (sinon un petit modèle écarté ne serait plus jamais remesuré) ; 0 = jamais
+ROUTER_EXPLORE_EVERY = int(os.getenv("ROUTER_EXPLORE_EVERY", "20"))
+
+LATENCY_CLASSES = ("fast", "balanced", "quality")
+
+ROUTER_DECISIONS = counter(
+    "chloe_router_decisions_total", "Premier modèle choisi par le routeur", ("model", "reason")
+)
+ROUTER_FALLBACKS = counter(
+    "chloe_router_fallbacks_total", "Sorties rejetées par les validateurs, relancées sur le modèle suivant",
+    ("model", "language"),
+)
+
+
+# ----------------------------------------------------------------------
+# Validation des sorties
+# ----------------------------------------------------------------------
+def validate_output(raw: str, language: str) -> Optional[str]:
+    """None si la sortie est exploitable, sinon la raison du rejet."""
+    code = normalize_indentation(extract_code(raw, language))
+    if not code.strip():
+        return "Réponse vide"
+    if language == "python":
+        ok, err = syntax_ok_python(code)
+        if not ok:
+            return f"Syntax error : {err}"
+    return None
+
+
+# ----------------------------------------------------------------------
+# Statistiques par modèle
+# ----------------------------------------------------------------------
+class ModelStats:
+    def __init__(self, alpha: float = ROUTER_EWMA_ALPHA) -> None:
+        self.alpha = alpha
+        self.latency_ms: Optional[float] = None     # EWMA de la durée d’appel (hors file)
+        self.failure_rate = 0.0                     # EWMA des rejets par les validateurs
+        self.requests = 0
+        self.failures = 0
+
+    def observe(self, latency_ms: float, ok: bool) -> None:
+        self.requests += 1
+        self.failures += 0 if ok else 1
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += self.alpha * (latency_ms - self.latency_ms)
+        self.failure_rate += self.alpha * ((0.0 if ok else 1.0) - self.failure_rate)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "failure_rate": round(self.failure_rate, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+# ----------------------------------------------------------------------
+# Routeur
+# ----------------------------------------------------------------------
+class ModelRouter:
+    """
+    Choisit le modèle de chaque génération parmi les modèles rapides
+    configurés et le modèle actif (le plus gros, toujours en dernier recours) :
+    - `quality`, langage non couvert ou prompt trop long → modèle actif ;
+    - `fast` → premier modèle rapide éligible ;
+    - `balanced` → modèle rapide si sa latence attendue, rejets compris
+      (relance sur le gros modèle, après une nouvelle attente dans la file),
+      reste inférieure à celle du modèle actif.
+    Une sortie rejetée par les validateurs est relancée sur le modèle suivant.
+    """
+
+    def __init__(
+        self,
+        fast_models: List[Tuple[str, int]] = ROUTER_FAST_MODELS,
+        languages: List[str] = ROUTER_FAST_LANGUAGES,
+        explore_every: int = ROUTER_EXPLORE_EVERY,
+    ) -> None:
+        self.fast_models = fast_models
+        self.languages = languages
+        self.explore_every = explore_every
+        self.stats: Dict[str, ModelStats] = defaultdict(ModelStats)
+        self._eligible = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.fast_models)
+
+    def plan(
+        self,
+        active: str,
+        *,
+        prompt_tokens: int,
+        language: str,
+        latency: str = "balanced",
+        queue_depth: int = 0,
+        max_concurrency: int = 1,
+    ) -> Tuple[List[str], str]:
+        """Modèles à essayer dans l’ordre (le modèle actif en dernier) et raison du choix."""
+        if not self.enabled:
+            return [active], "single"
+        if latency == "quality":
+            return [active], "quality"
+        if language not in self.languages:
+            return [active], "language"
+        fast = [m for m, limit in self.fast_models if prompt_tokens <= limit and m != active]
+        if not fast:
+            return [active], "too_long"
+        models = fast + [active]
+        if latency == "fast":
+            return models, "fast"
+
+        self._eligible += 1
+        if self.explore_every and self._eligible % self.explore_every == 0:
+            return models, "explore"
+        small, large = self.stats[fast[0]], self.stats[active]
+        if small.latency_ms is None or large.latency_ms is None:
+            return models, "cold"
+        # Un rejet coûte un appel au gros modèle, derrière la file actuelle
+        wait_ms = queue_depth / max(1, max_concurrency) * large.latency_ms
+        expected = small.latency_ms + small.failure_rate * (wait_ms + large.latency_ms)
+        if expected < large.latency_ms:
+            return models, "cheaper"
+        return [active], "slower"
+
+    def record(self, model: str, latency_ms: float, ok: bool) -> None:
+        self.stats[model].observe(latency_ms, ok)
+
+    async def _attempt(self, prompt: str, params: Dict[str, Any], language: str) -> Tuple[str, Optional[str]]:
+        start = time.perf_counter()
+        raw = await generate_code(prompt, **params)
+        error = validate_output(raw, language)
+        self.record(params["model"], (time.perf_counter() - start) * 1000, error is None)
+        return raw, error
+
+    async def generate(
+        self,
+        prompt: str,
+        params: Dict[str, Any],
+        *,
+        language: str,
+        prompt_tokens: int,
+        latency: str = "balanced",
+        priority: int = 0,
+    ) -> Tuple[str, str]:
+        """
+        Génère via le dispatcher (un créneau par tentative, appels identiques
+        fusionnés) et retourne (texte brut, modèle qui l’a produit).
+        """
+        stats = dispatcher.stats()
+        models, reason = self.plan(
+            params["model"],
+            prompt_tokens=prompt_tokens,
+            language=language,
+            latency=latency,
+            queue_depth=stats["queue_depth"],
+            max_concurrency=stats["max_concurrency"],
+        )
+        ROUTER_DECISIONS.inc(model=models[0], reason=reason)
+        for index, model in enumerate(models):
+            attempt = {**params, "model": model}
+            with span("route", model=model, reason=reason, attempt=index):
+                raw, error = await dispatcher.run(
+                    make_key(prompt, attempt),
+                    lambda attempt=attempt: self._attempt(prompt, attempt, language),
+                    priority=priority,
+                )
+            if error is None or index == len(models) - 1:
+                return raw, model
+            ROUTER_FALLBACKS.inc(model=model, language=language)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "fast_models": [{"model": m, "max_prompt_tokens": limit} for m, limit in self.fast_models],
+            "languages": list(self.languages),
+            "models": {name: s.to_dict() for name, s in self.stats.items()},
+        }
+
+
+router = ModelRouter()
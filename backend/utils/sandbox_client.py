@@ -1,16 +1,100 @@
 # backend/utils/sandbox_client.py
+import asyncio
+import json
+import os
 import subprocess
 import shlex
 import time
-from typing import Tuple
+from typing import Any, Dict, Optional, Tuple
+
+from utils.cache import sandbox_cache, make_key
+from utils.metrics import stage, SANDBOX_RUNS
 
 class SandboxError(RuntimeError):
     """Erreur lors de l’exécution dans le conteneur sandbox."""
 
 
-def run_tests_in_sandbox(code: str, language: str) -> Tuple[str, str, int]:
+# ----------------------------------------------------------------------
+# Serveur d’exécution « à chaud » du sandbox (containers/runner)
+# ----------------------------------------------------------------------
+SANDBOX_RUNNER_HOST = os.getenv("SANDBOX_RUNNER_HOST", "sandbox")
+SANDBOX_RUNNER_PORT = int(os.getenv("SANDBOX_RUNNER_PORT", "7000"))
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", "30"))
+# Repli sur `docker exec` si le serveur d’exécution est injoignable
+SANDBOX_DOCKER_FALLBACK = os.getenv("SANDBOX_DOCKER_FALLBACK", "1") == "1"
+
+# Limites du conteneur sandbox (doivent refléter deploy.resources.limits
+# du service `sandbox` dans docker-compose.yml)
+SANDBOX_CPUS = float(os.getenv("SANDBOX_CPUS", "2"))
+SANDBOX_MEMORY = os.getenv("SANDBOX_MEMORY", "4g")
+SANDBOX_MEMORY_PER_RUN = os.getenv("SANDBOX_MEMORY_PER_RUN", "512m")
+
+
+def _parse_memory(value: str) -> int:
+    """Convertit une taille docker (« 4g », « 512m », « 1024k ») en octets."""
+    value = value.strip().lower().rstrip("b")
+    units = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def batch_parallelism() -> int:
+    """
+    Nombre d’exécutions simultanées pour les lots : borné par les CPU du
+    sandbox et par la mémoire disponible par exécution.
+    `SANDBOX_BATCH_PARALLELISM` permet de forcer la valeur.
+    """
+    override = os.getenv("SANDBOX_BATCH_PARALLELISM")
+    if override:
+        return max(1, int(override))
+    by_cpu = int(SANDBOX_CPUS)
+    by_memory = _parse_memory(SANDBOX_MEMORY) // _parse_memory(SANDBOX_MEMORY_PER_RUN)
+    return max(1, min(by_cpu, by_memory))
+
+
+class _RunnerUnreachable(SandboxError):
+    """
+    Le serveur d’exécution ne répond pas : connexion impossible, ou coupée
+    sans réponse complète (serveur tué ou planté pendant l’exécution).
     """
-    Exécute `code` dans le conteneur `sandbox` via `docker exec`.
+
+
+async def _runner_request(payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """Envoie une requête JSON au serveur d’exécution et renvoie sa réponse."""
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                SANDBOX_RUNNER_HOST, SANDBOX_RUNNER_PORT, limit=8 << 20
+            ),
+            timeout=5,
+        )
+    except (OSError, asyncio.TimeoutError) as exc:
+        raise _RunnerUnreachable(f"Serveur d’exécution injoignable : {exc}") from exc
+
+    try:
+        writer.write((json.dumps(payload) + "\n").encode("utf-8"))
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), timeout)
+    except asyncio.TimeoutError as exc:
+        raise SandboxError("Timeout") from exc
+    except (OSError, ValueError) as exc:
+        raise SandboxError(f"Erreur de communication avec le sandbox : {exc}") from exc
+    finally:
+        writer.close()
+
+    if not line.strip():
+        raise _RunnerUnreachable("Le serveur d’exécution a fermé la connexion sans répondre")
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        # Ligne tronquée (serveur tué en cours d’écriture)
+        raise _RunnerUnreachable(f"Réponse invalide du serveur d’exécution : {exc}") from exc
+
+
+async def run_tests_in_sandbox(code: str, language: str) -> Tuple[str, str, int]:
+    """
+    Exécute `code` dans le sandbox via le serveur d’exécution pré‑chauffé.
 
     Returns
     -------
@@ -18,6 +102,144 @@ def run_tests_in_sandbox(code: str, language: str) -> Tuple[str, str, int]:
     log    : stdout+stderr du processus
     duration_ms : temps d’exécution
     """
+    request = {"language": language, "code": code, "timeout": SANDBOX_TIMEOUT}
+    with stage("sandbox", language=language):
+        try:
+            result = await _runner_request(request, SANDBOX_TIMEOUT + 10)
+        except _RunnerUnreachable:
+            if not SANDBOX_DOCKER_FALLBACK:
+                raise
+            result = dict(zip(
+                ("status", "log", "duration_ms"),
+                await asyncio.to_thread(_run_via_docker_exec, code, language),
+            ))
+        if "error" in result:
+            raise SandboxError(result["error"])
+    SANDBOX_RUNS.inc(language=language, status=result["status"])
+    return result["status"], result["log"], int(result["duration_ms"])
+
+
+# ----------------------------------------------------------------------
+# Cache des résultats (adressé par contenu)
+# ----------------------------------------------------------------------
+SANDBOX_INFO_TTL = float(os.getenv("SANDBOX_INFO_TTL", "300"))
+# Serveur d’exécution injoignable : nouvel essai (en tâche de fond) après ce délai
+SANDBOX_INFO_RETRY = float(os.getenv("SANDBOX_INFO_RETRY", "60"))
+# Conteneur visé par le repli `docker exec`
+SANDBOX_CONTAINER = os.getenv("SANDBOX_CONTAINER", "chloe-code-sandbox-1")
+_runner_info: Dict[str, Any] = {"value": None, "expires": 0.0, "probe": None}
+# Repli docker : langage → (identifiant du runtime ou None, expiration)
+_docker_runtimes: Dict[str, Tuple[Optional[str], float]] = {}
+
+_VERSION_COMMANDS = {
+    "python": "python3 --version",
+    "r": "Rscript --version",
+    "julia": "julia --version",
+    "javascript": "node --version",
+    "typescript": "ts-node --version",
+    "bash": "bash --version",
+    "sql": "psql --version",
+    "latex": "pdflatex --version",
+}
+
+
+async def _probe_runner() -> None:
+    try:
+        info = await _runner_request({"op": "info"}, 10)
+        ttl = SANDBOX_INFO_TTL
+    except SandboxError:
+        info, ttl = {}, SANDBOX_INFO_RETRY
+    _runner_info["value"] = info
+    _runner_info["expires"] = time.monotonic() + ttl
+
+
+def _refresh_runner_info() -> None:
+    """Relance l’interrogation du serveur d’exécution en tâche de fond si l’info a expiré."""
+    probe = _runner_info["probe"]
+    if time.monotonic() >= _runner_info["expires"] and (probe is None or probe.done()):
+        _runner_info["probe"] = asyncio.create_task(_probe_runner())
+
+
+def _docker_runtime(language: str) -> Optional[str]:
+    """Digest de l’image et version de l’interpréteur, lus via `docker` (repli)."""
+    command = _VERSION_COMMANDS.get(language)
+    if command is None:
+        return None
+    try:
+        image = subprocess.run(
+            ["docker", "inspect", "--format", "{{.Image}}", SANDBOX_CONTAINER],
+            capture_output=True, text=True, timeout=10,
+        )
+        version = subprocess.run(
+            ["docker", "exec", SANDBOX_CONTAINER, *shlex.split(command)],
+            capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    lines = (version.stdout or version.stderr).strip().splitlines()
+    if image.returncode != 0 or version.returncode != 0 or not lines:
+        return None
+    return f"{image.stdout.strip()}|{lines[0]}"
+
+
+async def runtime_version(language: str) -> Optional[str]:
+    """
+    Identifiant du runtime d’exécution (digest de l’image + version de
+    l’interpréteur), ou None s’il est inconnu (résultat alors non mis en cache).
+
+    L’info du serveur d’exécution est relue en tâche de fond, jamais sur le
+    chemin de la requête.  Sans elle (repli `docker exec`), le runtime est lu
+    via docker, une fois par `SANDBOX_INFO_TTL` et par langage.
+    """
+    _refresh_runner_info()
+    info = _runner_info["value"] or {}
+    version = info.get("runtimes", {}).get(language)
+    if version:
+        image = info.get("image") or os.getenv("SANDBOX_IMAGE_DIGEST", "")
+        return f"{image}|{version}"
+    if not SANDBOX_DOCKER_FALLBACK:
+        return None
+    now = time.monotonic()
+    cached = _docker_runtimes.get(language)
+    if cached is None or now >= cached[1]:
+        cached = (await asyncio.to_thread(_docker_runtime, language), now + SANDBOX_INFO_TTL)
+        _docker_runtimes[language] = cached
+    return cached[0]
+
+
+async def run_tests_cached(
+    code: str, language: str, *, no_cache: bool = False
+) -> Tuple[str, str, int, bool]:
+    """
+    `run_tests_in_sandbox` avec cache des résultats par hash
+    (code + langage + runtime).  Seuls les résultats déterministes
+    (« passed » / « failed ») sont conservés ; `no_cache` force l’exécution.
+
+    Returns
+    -------
+    status, log, duration_ms (durée de l’exécution d’origine), cached
+    """
+    runtime = await runtime_version(language)
+    # Runtime inconnu : pas de cache (des runtimes différents partageraient les clés)
+    key = make_key(code, language, runtime) if runtime is not None else None
+    if key is not None and not no_cache:
+        hit = await sandbox_cache.aget(key)
+        if hit is not None:
+            return hit["status"], hit["log"], hit["duration_ms"], True
+
+    status, log, duration = await run_tests_in_sandbox(code, language)
+    if key is not None and status in ("passed", "failed"):
+        await sandbox_cache.aset(
+            key, {"status": status, "log": log, "duration_ms": duration}, tag=language
+        )
+    return status, log, duration, False
+
+
+def _run_via_docker_exec(code: str, language: str) -> Tuple[str, str, int]:
+    """
+    Ancien chemin (à froid) : exécute `code` dans le conteneur `sandbox`
+    via `docker exec`.  Utilisé seulement si le serveur d’exécution est absent.
+    """
     # Crée un fichier temporaire dans le répertoire partagé /workspace
     tmp_path = f"/workspace/tmp_{int(time.time()*1000)}.{_ext_for(language)}"
     with open(tmp_path, "w", encoding="utf-8") as f:
@@ -25,7 +247,7 @@ def run_tests_in_sandbox(code: str, language: str) -> Tuple[str, str, int]:
 
     # Commande docker exec
     exec_cmd = (
-        f"docker exec -i chloe-code-sandbox-1 "
+        f"docker exec -i {SANDBOX_CONTAINER} "
         f"/bin/bash -c '{_run_cmd(language, tmp_path)}'"
     )
     start = time.time()
@@ -35,7 +257,7 @@ def run_tests_in_sandbox(code: str, language: str) -> Tuple[str, str, int]:
             shell=True,
             capture_output=True,
             text=True,
-            timeout=30,
+            timeout=SANDBOX_TIMEOUT,
         )
     except subprocess.TimeoutExpired as exc:
         raise SandboxError("Timeout") from exc
@@ -52,7 +274,7 @@ def run_tests_in_sandbox(code: str, language: str) -> Tuple[str, str, int]:
 
     # Nettoyage du fichier temporaire
     subprocess.run(
-        f"docker exec chloe-code-sandbox-1 rm -f {tmp_path}",
+        f"docker exec {SANDBOX_CONTAINER} rm -f {tmp_path}",
         shell=True,
         stdout=subprocess.DEVNULL,
         stderr=subprocess.DEVNULL,
@@ -85,4 +307,4 @@ def _run_cmd(lang: str, path: str) -> str:
         "sql": f"psql -f {path}",
         "latex": f"pdflatex -interaction=nonstopmode -halt-on-error {path}",
     }
-    return cmds.get(lang, f"cat {path}")
\ No newline at end of file
+    return cmds.get(lang, f"cat {path}")
@@ -0,0 +1,182 @@
+# backend/utils/scanner.py
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# ----------------------------------------------------------------------
+# 1️⃣  Règles de détection de code dangereux
+# ----------------------------------------------------------------------
+# id → (regex, langages concernés ou None = tous, message)
+DEFAULT_RULES: Dict[str, Tuple[str, Optional[List[str]], str]] = {
+    "eval": (r"\beval\s*\(", ["python", "javascript", "typescript", "r", "julia"], "eval()"),
+    "exec": (r"\bexec\s*\(", ["python"], "exec()"),
+    "os-system": (r"\bos\.(?:system|popen|exec[lv]p?e?)\s*\(", ["python"], "os.system / os.exec*"),
+    "subprocess": (r"\bsubprocess\.(?:Popen|call|run|check_call|check_output)\s*\(", ["python"],
+                   "subprocess"),
+    "pickle-loads": (r"\bpickle\.loads?\s*\(", ["python"], "désérialisation pickle"),
+    "js-function": (r"\bnew\s+Function\s*\(", ["javascript", "typescript"], "new Function()"),
+    "js-child-process": (r"\bchild_process\b", ["javascript", "typescript"], "child_process"),
+    "r-system": (r"\bsystem2?\s*\(", ["r"], "system()"),
+    "julia-run": (r"\brun\s*\(\s*`", ["julia"], "run(`…`)"),
+    "sh-rm-root": (r"\brm\s+-[a-zA-Z]*[rf][a-zA-Z]*\s+(?:--no-preserve-root\s+)?/(?:\s|$|\*)", ["bash"],
+                   "rm -rf /"),
+    "sh-pipe-shell": (r"\b(?:curl|wget)\b[^\n|]*\|\s*(?:sudo\s+)?(?:ba|z)?sh\b", ["bash"],
+                      "téléchargement exécuté (curl | sh)"),
+    "sql-drop": (r"(?i)\b(?:drop\s+(?:table|database|schema)|truncate\s+table)\b", ["sql"],
+                 "DROP / TRUNCATE"),
+}
+
+# Fichier JSON optionnel : {"rules": [{"id", "pattern", "languages", "message"}], "disable": [ids]}
+DANGEROUS_RULES_FILE = os.getenv("DANGEROUS_RULES_FILE")
+
+
+def _load_rules() -> Dict[str, Tuple[str, Optional[List[str]], str]]:
+    rules = dict(DEFAULT_RULES)
+    if DANGEROUS_RULES_FILE:
+        with open(DANGEROUS_RULES_FILE, encoding="utf-8") as fh:
+            config = json.load(fh)
+        for rule_id in config.get("disable", []):
+            rules.pop(rule_id, None)
+        for rule in config.get("rules", []):
+            rules[rule["id"]] = (rule["pattern"], rule.get("languages"), rule.get("message", rule["id"]))
+    for rule_id, (pattern, _, _) in rules.items():
+        try:
+            re.compile(pattern)
+        except re.error as exc:
+            raise ValueError(f"Règle « {rule_id} » invalide : {exc}") from exc
+    return rules
+
+
+# Chargées (et validées) une fois au démarrage
+RULES = _load_rules()
+
+
+class Finding(NamedTuple):
+    rule: str
+    line: int          # à partir de 1
+    column: int        # à partir de 1
+    text: str
+    message: str
+
+
+class Scanner:
+    """
+    Toutes les règles d’un langage compilées en une seule expression,
+    parcourue en une seule passe quel que soit le nombre de règles :
+
+        (?=r0|r1|…)(?:(?=(?P<r0>r0)))?(?:(?=(?P<r1>r1)))?…
+
+    La première anticipation est le filtre (une alternance, coût d’une seule
+    règle aux positions sans occurrence) ; aux positions retenues, chaque
+    règle est une anticipation facultative capturée dans son groupe nommé.
+    Les correspondances étant de largeur nulle, des règles qui se déclenchent
+    à la même position ou dont les occurrences se recouvrent sont toutes
+    signalées.
+    """
+
+    def __init__(self, rules: Dict[str, Tuple[str, Optional[List[str]], str]]) -> None:
+        self._rules: List[Tuple[str, str, str]] = []       # (groupe, règle, message)
+        bodies = []
+        for index, (rule_id, (pattern, _, message)) in enumerate(rules.items()):
+            # Les drapeaux en ligne (?i) doivent être locaux à la règle
+            flags, body = re.match(r"^(\(\?[a-zA-Z]+\))?(.*)$", pattern, re.S).groups()
+            if flags:
+                body = f"(?{flags[2:-1]}:{body})"
+            bodies.append(body)
+            self._rules.append((f"r{index}", rule_id, message))
+        if bodies:
+            hits = "".join(
+                f"(?:(?=(?P<{group}>{body})))?" for (group, _, _), body in zip(self._rules, bodies)
+            )
+            self._regex = re.compile(f"(?=(?:{'|'.join(bodies)})){hits}", re.MULTILINE)
+        else:
+            self._regex = None
+
+    def scan(self, code: str) -> List[Finding]:
+        """Toutes les occurrences de toutes les règles, avec ligne et colonne."""
+        if self._regex is None:
+            return []
+        findings: List[Finding] = []
+        line, line_start, pos = 1, 0, 0
+        for match in self._regex.finditer(code):
+            start = match.start()
+            newlines = code.count("\n", pos, start)
+            if newlines:
+                line += newlines
+                line_start = code.rfind("\n", pos, start) + 1
+            pos = start
+            for group, rule_id, message in self._rules:
+                text = match.group(group)
+                if text is not None:
+                    findings.append(Finding(rule_id, line, start - line_start + 1, text, message))
+        return findings
+
+    def matches(self, code: str) -> bool:
+        return self._regex is not None and self._regex.search(code) is not None
+
+
+@lru_cache(maxsize=None)
+def scanner_for(language: Optional[str]) -> Scanner:
+    """Scanner des règles applicables à `language` (toutes si langage inconnu)."""
+    return Scanner({
+        rule_id: rule
+        for rule_id, rule in RULES.items()
+        if language is None or rule[1] is None or language in rule[1]
+    })
+
+
+def _compile_scanners() -> None:
+    """Compile dès l’import les scanners de tous les langages cités par les règles."""
+    languages = {lang for _, langs, _ in RULES.values() for lang in langs or ()}
+    for language in [None, *sorted(languages)]:
+        try:
+            scanner_for(language)
+        except re.error as exc:
+            raise ValueError(f"Règles dangereuses ({language or 'tous langages'}) invalides : {exc}") from exc
+
+
+# Un DANGEROUS_RULES_FILE invalide fait échouer le démarrage, pas la première requête
+_compile_scanners()
+
+
+# ----------------------------------------------------------------------
+# 2️⃣  Blocs de code Markdown (une seule passe)
+# ----------------------------------------------------------------------
+_FENCE_OPEN_RE = re.compile(r"^```([a-zA-Z0-9_+#.-]*)\s*$")
+_FENCE_CLOSE_RE = re.compile(r"^```\s*$")
+
+
+class FencedBlock(NamedTuple):
+    language: Optional[str]
+    code: str
+    start_line: int    # première ligne de code (à partir de 1)
+
+
+def extract_fenced_blocks(text: str) -> Tuple[List[FencedBlock], bool]:
+    """
+    Extrait en une passe linéaire tous les blocs ```lang … ``` de `text`.
+    Retourne (blocs, prose) où `prose` indique la présence de texte non
+    blanc hors des blocs.  Un bloc non refermé court jusqu’à la fin.
+    """
+    blocks: List[FencedBlock] = []
+    prose = False
+    current: Optional[List[str]] = None
+    language: Optional[str] = None
+    start = 0
+    for number, line in enumerate(text.splitlines(), start=1):
+        if current is None:
+            opening = _FENCE_OPEN_RE.match(line)
+            if opening:
+                current, language, start = [], opening.group(1) or None, number + 1
+            elif line.strip():
+                prose = True
+        elif _FENCE_CLOSE_RE.match(line):
+            blocks.append(FencedBlock(language, "\n".join(current), start))
+            current = None
+        else:
+            current.append(line)
+    if current is not None:
+        blocks.append(FencedBlock(language, "\n".join(current), start))
+    return blocks, prose
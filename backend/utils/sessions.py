@@ -0,0 +1,232 @@
+# backend/utils/sessions.py
+import json
+import os
+import re
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.cache import CACHE_DIR
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+SESSION_MAX = int(os.getenv("SESSION_MAX", "256"))             # sessions gardées en mémoire
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))          # secondes depuis le dernier tour
+# Instructions mémorisées pour reconstruire le prompt si le context est perdu
+SESSION_MAX_INSTRUCTIONS = int(os.getenv("SESSION_MAX_INSTRUCTIONS", "8"))
+# Sessions évincées de la mémoire écrites sur disque (vide = simplement oubliées)
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", str(CACHE_DIR / "sessions"))
+_PRUNE_INTERVAL = 60.0
+# Identifiants acceptés (même motif que SessionInferRequest) : jamais un chemin
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+# ----------------------------------------------------------------------
+# Session : context Ollama + historique des instructions
+# ----------------------------------------------------------------------
+class Session:
+    def __init__(
+        self,
+        session_id: Optional[str] = None,
+        *,
+        model: str = "",
+        language: str = "python",
+        file_path: Optional[str] = None,
+    ) -> None:
+        self.id = session_id or uuid.uuid4().hex
+        self.model = model
+        self.language = language
+        self.file_path = file_path
+        # Tableau de tokens renvoyé par Ollama (array : ~4 octets par token
+        # au lieu de ~36 pour une liste d’int Python)
+        self.context = array("i")
+        self.instructions: List[str] = []
+        # Serveur Ollama du dernier tour (préfixe en cache KV), voir BackendPool.pick
+        self.backend: Optional[str] = None
+        self.turns = 0
+        self.created = time.time()
+        self.updated = self.created
+
+    def advance(
+        self,
+        model: str,
+        instruction: str,
+        context: Optional[List[int]],
+        backend: Optional[str] = None,
+    ) -> None:
+        """Enregistre un tour réussi (nouveau context, ou aucun si Ollama n’en renvoie pas)."""
+        self.model = model
+        self.context = array("i", context or [])
+        self.backend = backend
+        self.instructions = (self.instructions + [instruction])[-SESSION_MAX_INSTRUCTIONS:]
+        self.turns += 1
+        self.updated = time.time()
+
+    def expired(self, ttl: float, now: Optional[float] = None) -> bool:
+        return (now or time.time()) - self.updated > ttl
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "model": self.model,
+            "language": self.language,
+            "file_path": self.file_path,
+            "context": self.context.tolist(),
+            "instructions": self.instructions,
+            "backend": self.backend,
+            "turns": self.turns,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Session":
+        session = cls(
+            data["id"], model=data["model"], language=data["language"],
+            file_path=data.get("file_path"),
+        )
+        session.context = array("i", data.get("context") or [])
+        session.instructions = list(data.get("instructions") or [])
+        session.backend = data.get("backend")
+        session.turns = data.get("turns", 0)
+        session.created = data.get("created", session.created)
+        session.updated = data.get("updated", session.updated)
+        return session
+
+
+# ----------------------------------------------------------------------
+# Stockage : LRU + TTL en mémoire, débordement sur disque
+# ----------------------------------------------------------------------
+class SessionStore:
+    """
+    Sessions indexées par identifiant.  Au‑delà de `max_sessions`, la moins
+    récemment utilisée est écrite dans `spill_dir` (si configuré) et relue
+    au tour suivant ; une session inactive depuis `ttl` secondes est oubliée.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = SESSION_MAX,
+        ttl: float = SESSION_TTL,
+        spill_dir: Optional[str] = SESSION_SPILL_DIR,
+    ) -> None:
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._last_prune = time.time()
+        # Statistiques
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.spilled = 0
+        self.expired = 0
+
+    def _path(self, session_id: str) -> Path:
+        return self.spill_dir / f"{session_id}.json"
+
+    def _load(self, session_id: str) -> Optional[Session]:
+        if self.spill_dir is None:
+            return None
+        path = self._path(session_id)
+        try:
+            session = Session.from_dict(json.loads(path.read_text("utf-8")))
+        except (OSError, ValueError, KeyError):
+            return None
+        path.unlink(missing_ok=True)
+        return session
+
+    def _spill(self, session: Session) -> None:
+        if self.spill_dir is None:
+            return
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self._path(session.id).with_suffix(".tmp")
+            tmp.write_text(json.dumps(session.to_dict()), "utf-8")
+            os.replace(tmp, self._path(session.id))
+            # mtime = dernier tour : base de l’expiration par prune()
+            os.utime(self._path(session.id), (session.updated, session.updated))
+            self.spilled += 1
+        except OSError:
+            pass            # disque plein / en lecture seule : la session est perdue
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Session vivante (mémoire puis disque), ou None si inconnue / expirée."""
+        if not _SESSION_ID.match(session_id):
+            return None
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            hit = "memory"
+        else:
+            session = self._load(session_id)
+            hit = "disk"
+        if session is not None and session.expired(self.ttl):
+            self._sessions.pop(session_id, None)
+            self.expired += 1
+            session = None
+        if session is None:
+            self.misses += 1
+            return None
+        if hit == "memory":
+            self.memory_hits += 1
+        else:
+            self.disk_hits += 1
+            self.put(session)
+        return session
+
+    def put(self, session: Session) -> None:
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_sessions:
+            _, evicted = self._sessions.popitem(last=False)
+            if not evicted.expired(self.ttl):
+                self._spill(evicted)
+        if time.time() - self._last_prune > _PRUNE_INTERVAL:
+            self.prune()
+
+    def delete(self, session_id: str) -> bool:
+        if not _SESSION_ID.match(session_id):
+            return False
+        found = self._sessions.pop(session_id, None) is not None
+        if self.spill_dir is not None:
+            path = self._path(session_id)
+            if path.exists():
+                path.unlink(missing_ok=True)
+                found = True
+        return found
+
+    def prune(self) -> int:
+        """Supprime les sessions expirées (mémoire et disque) ; retourne leur nombre."""
+        now = self._last_prune = time.time()
+        removed = 0
+        for session_id in [s.id for s in self._sessions.values() if s.expired(self.ttl, now)]:
+            del self._sessions[session_id]
+            removed += 1
+        if self.spill_dir is not None and self.spill_dir.is_dir():
+            for path in self.spill_dir.glob("*.json"):
+                try:
+                    if now - path.stat().st_mtime > self.ttl:
+                        path.unlink()
+                        removed += 1
+                except OSError:
+                    continue
+        self.expired += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory_sessions": len(self._sessions),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "spilled": self.spilled,
+            "expired": self.expired,
+        }
+
+
+sessions = SessionStore()
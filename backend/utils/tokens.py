@@ -0,0 +1,69 @@
+# backend/utils/tokens.py
+import math
+import os
+import threading
+from typing import List, Optional
+
+from loguru import logger
+
+# ----------------------------------------------------------------------
+# Tokenizer du modèle servi par Ollama (format HF `tokenizer.json`)
+# ----------------------------------------------------------------------
+# TOKENIZER_FILE : chemin d’un tokenizer.json local (recommandé, hors‑ligne)
+# TOKENIZER_NAME : identifiant Hugging Face, téléchargé au premier appel
+TOKENIZER_FILE = os.getenv("TOKENIZER_FILE")
+TOKENIZER_NAME = os.getenv("TOKENIZER_NAME")
+# Sans l’un ou l’autre, le nombre de tokens est estimé : ~3,5 caractères par
+# token (BPE sur du code), majoré de TOKEN_ESTIMATE_MARGIN car un code dense
+# (symboles, indentation, identifiants rares) descend sous ce ratio et le
+# prompt dépasserait alors le budget.
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "3.5"))
+TOKEN_ESTIMATE_MARGIN = float(os.getenv("TOKEN_ESTIMATE_MARGIN", "1.25"))
+
+_lock = threading.Lock()
+_tokenizer = None
+_loaded = False
+
+
+def _get_tokenizer():
+    global _tokenizer, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                try:
+                    from tokenizers import Tokenizer
+                    if TOKENIZER_FILE:
+                        _tokenizer = Tokenizer.from_file(TOKENIZER_FILE)
+                    elif TOKENIZER_NAME:
+                        _tokenizer = Tokenizer.from_pretrained(TOKENIZER_NAME)
+                except Exception as exc:
+                    _tokenizer = None      # bibliothèque / fichier absent → heuristique
+                    logger.warning(f"Tokenizer indisponible ({exc}) ; tokens estimés")
+                if _tokenizer is None and not (TOKENIZER_FILE or TOKENIZER_NAME):
+                    logger.warning(
+                        "Ni TOKENIZER_FILE ni TOKENIZER_NAME : tokens estimés à "
+                        f"{CHARS_PER_TOKEN} caractères par token (marge ×{TOKEN_ESTIMATE_MARGIN})"
+                    )
+                _loaded = True
+    return _tokenizer
+
+
+def tokenizer_name() -> Optional[str]:
+    """Tokenizer réellement utilisé (None = estimation par caractères)."""
+    if _get_tokenizer() is None:
+        return None
+    return TOKENIZER_FILE or TOKENIZER_NAME
+
+
+def count_tokens(text: str) -> int:
+    """Nombre de tokens de `text` pour le modèle (ou estimation)."""
+    return count_tokens_batch([text])[0]
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Nombre de tokens de chaque texte, encodés en un seul lot."""
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return [math.ceil(len(text) * TOKEN_ESTIMATE_MARGIN / CHARS_PER_TOKEN) for text in texts]
+    encodings = tokenizer.encode_batch(texts, add_special_tokens=False)
+    return [len(encoding.ids) for encoding in encodings]
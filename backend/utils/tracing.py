@@ -0,0 +1,257 @@
+# backend/utils/tracing.py
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as _Tally, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "1000"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200"))
+TRACE_HEADER = "X-Trace-Id"
+# Profilage par échantillonnage : désactivé par défaut, demandé par l’en‑tête X-Profile: 1
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_HEADER = "X-Profile"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", "50"))
+
+# Identifiant reçu d’un client / proxy : gardé s’il est raisonnable, sinon remplacé
+_TRACE_ID_RE = re.compile(r"^[A-Za-z0-9._-]{8,64}$")
+
+
+# ----------------------------------------------------------------------
+# 1️⃣  Traces et spans
+# ----------------------------------------------------------------------
+class Trace:
+    def __init__(self, name: str, trace_id: Optional[str] = None) -> None:
+        self.trace_id = trace_id if trace_id and _TRACE_ID_RE.match(trace_id) else uuid.uuid4().hex
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped_spans = 0
+        self.profile: Optional[Dict[str, Any]] = None
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._t0) * 1000, 3)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "spans": len(self.spans),
+            "profiled": self.profile is not None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.summary(), spans=list(self.spans),
+                    dropped_spans=self.dropped_spans, profile=self.profile)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_parent: ContextVar[Optional[int]] = ContextVar("trace_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.trace_id if trace is not None else None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Span chronométré rattaché à la trace courante (aucun coût hors trace).
+    Le contexte est copié par asyncio.to_thread et les tâches : les étapes
+    exécutées dans des threads ou en parallèle s’y rattachent aussi.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield None
+        return
+    if len(trace.spans) >= TRACE_MAX_SPANS:
+        trace.dropped_spans += 1
+        yield None
+        return
+    record: Dict[str, Any] = {
+        "id": len(trace.spans),
+        "parent": _parent.get(),
+        "name": name,
+        "start_ms": trace.elapsed_ms(),
+        "duration_ms": None,
+    }
+    record.update((k, v) for k, v in attrs.items() if v is not None)
+    trace.spans.append(record)
+    # set() plutôt que reset(token) : un générateur (flux Ollama) peut être
+    # repris dans une autre tâche, donc un autre contexte.
+    previous = _parent.get()
+    _parent.set(record["id"])
+    try:
+        yield record
+    except GeneratorExit:
+        raise
+    except BaseException as exc:
+        record["error"] = type(exc).__name__
+        raise
+    finally:
+        _parent.set(previous)
+        record["duration_ms"] = round(trace.elapsed_ms() - record["start_ms"], 3)
+
+
+class TraceBuffer:
+    """Anneau des dernières traces terminées, adressable par identifiant."""
+
+    def __init__(self, max_entries: int = TRACE_BUFFER_SIZE) -> None:
+        self.max_entries = max_entries
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            self._traces.move_to_end(trace.trace_id)
+            while len(self._traces) > self.max_entries:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def recent(self, limit: int = 50, min_ms: float = 0.0, name: Optional[str] = None) -> List[Trace]:
+        """Traces les plus récentes d’abord, filtrées par durée minimale et par nom."""
+        with self._lock:
+            traces = list(reversed(self._traces.values()))
+        return [
+            t for t in traces
+            if (t.duration_ms or 0.0) >= min_ms and (name is None or name in t.name)
+        ][:limit]
+
+    def __len__(self) -> int:
+        return len(self._traces)
+
+
+traces = TraceBuffer()
+
+
+# ----------------------------------------------------------------------
+# 2️⃣  Profileur par échantillonnage (opt‑in, une requête à la fois)
+# ----------------------------------------------------------------------
+# Feuilles « au repos » : boucle en attente d’E/S, threads du pool inactifs
+_IDLE_FILES = ("selectors.py", "threading.py", "queue.py", "queues.py", "connection.py", "thread.py")
+
+
+class SamplingProfiler:
+    """
+    Relève périodiquement les piles Python de tous les threads actifs
+    (boucle asyncio et workers de asyncio.to_thread) et les agrège au format
+    « folded » (frame;frame;frame N) exploitable par flamegraph / speedscope.
+    Les autres requêtes servies par la même boucle pendant la mesure
+    apparaissent aussi : c’est une vue du processus, pas d’une coroutine.
+    """
+
+    _busy = threading.Lock()
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS) -> None:
+        self.interval = interval_ms / 1000
+        self.samples = 0
+        self._stacks: "_Tally[str]" = _Tally()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Démarre l’échantillonnage ; False si un autre profilage est en cours."""
+        if not self._busy.acquire(blocking=False):
+            return False
+        self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._busy.release()
+        top = self._stacks.most_common(PROFILE_MAX_STACKS)
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "folded": "\n".join(f"{stack} {count}" for stack, count in top),
+            "omitted_stacks": max(0, len(self._stacks) - len(top)),
+        }
+
+
+# ----------------------------------------------------------------------
+# 3️⃣  Middleware ASGI
+# ----------------------------------------------------------------------
+class TracingMiddleware:
+    """
+    Ouvre une trace par requête HTTP (identifiant repris de X-Trace-Id s’il
+    est fourni), renvoie l’identifiant dans l’en‑tête de réponse et range la
+    trace terminée — flux compris — dans l’anneau `traces`.
+    """
+
+    def __init__(self, app, exclude: tuple = ("/metrics", "/debug/traces")) -> None:
+        self.app = app
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        if not TRACING_ENABLED or scope["type"] != "http" or scope["path"].startswith(self.exclude):
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        trace = Trace(f"{scope['method']} {scope['path']}", headers.get(TRACE_HEADER.lower()))
+        profiler = None
+        if PROFILING_ENABLED and headers.get(PROFILE_HEADER.lower()) in ("1", "true"):
+            profiler = SamplingProfiler()
+            if not profiler.start():
+                profiler = None
+                trace.profile = {"skipped": "un autre profilage est en cours"}
+        token = _current.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (TRACE_HEADER.lower().encode("latin-1"), trace.trace_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            trace.duration_ms = trace.elapsed_ms()
+            if profiler is not None:
+                trace.profile = profiler.stop()
+            traces.add(trace)
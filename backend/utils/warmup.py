@@ -0,0 +1,112 @@
+# backend/utils/warmup.py
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+# Dépendances qui doivent être prêtes pour que /readyz réponde 200
+READY_REQUIRED = [
+    name.strip()
+    for name in os.getenv("READY_REQUIRED", "chroma,embedder,ollama").split(",")
+    if name.strip()
+]
+# Nouvelle tentative après un échec (ex. Ollama encore en démarrage), délai doublé à chaque fois
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "2"))
+WARMUP_MAX_INTERVAL = float(os.getenv("WARMUP_MAX_INTERVAL", "60"))
+# false : aucun préchauffage (tests) ; les dépendances restent « disabled », /readyz → 503
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+# ----------------------------------------------------------------------
+# État de préchauffage des dépendances
+# ----------------------------------------------------------------------
+class Dependency:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.state = "pending"          # pending | ready | failed (en attente de réessai) | disabled
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.duration_ms: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "attempts": self.attempts,
+            "error": self.error,
+            "duration_ms": self.duration_ms,
+        }
+
+
+class Readiness:
+    """
+    Préchauffe les dépendances (modèle d’embedding, Chroma, Ollama…) en tâches
+    de fond, chacune réessayée avec un délai croissant jusqu’au succès, et
+    expose leur état pour /readyz.  /healthz reste une simple sonde de vie.
+    """
+
+    def __init__(self, required: List[str] = READY_REQUIRED, enabled: bool = WARMUP_ENABLED) -> None:
+        self.required = required
+        self.enabled = enabled
+        self.dependencies: Dict[str, Dependency] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    async def _run(self, dep: Dependency, warm: Callable[[], Awaitable[Any]], on_error) -> None:
+        delay = WARMUP_RETRY_INTERVAL
+        while True:
+            dep.attempts += 1
+            start = time.perf_counter()
+            try:
+                await warm()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                dep.state, dep.error = "failed", f"{type(exc).__name__}: {exc}"
+                if on_error is not None:
+                    on_error(dep.name, dep.error)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, WARMUP_MAX_INTERVAL)
+                continue
+            dep.state, dep.error = "ready", None
+            dep.duration_ms = int((time.perf_counter() - start) * 1000)
+            return
+
+    def start(
+        self,
+        warmers: Dict[str, Callable[[], Awaitable[Any]]],
+        on_error: Optional[Callable[[str, str], None]] = None,
+    ) -> None:
+        """Lance une tâche de préchauffage par dépendance (sans attendre)."""
+        for name, warm in warmers.items():
+            dep = self.dependencies[name] = Dependency(name)
+            if not self.enabled:
+                dep.state = "disabled"
+                continue
+            self._tasks.append(asyncio.create_task(self._run(dep, warm, on_error)))
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin des préchauffages (tests, scripts) ; True si tout est prêt."""
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        return self.ready
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+    @property
+    def ready(self) -> bool:
+        return all(
+            self.dependencies[name].state == "ready"
+            for name in self.required
+            if name in self.dependencies
+        )
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dep.to_dict() for name, dep in self.dependencies.items()}
+
+
+readiness = Readiness()
@@ -0,0 +1,132 @@
+# benchmarks/fake_ollama.py
+"""
+Serveur Ollama factice pour les benchmarks : même API HTTP (/api/generate,
+avec ou sans streaming NDJSON, /api/pull, /api/tags, /api/ps), mais la « génération » est
+simulée avec un délai avant le premier token et un débit configurables.
+
+    python benchmarks/fake_ollama.py --port 11434 --ttft-ms 50 --tokens-per-s 200
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+def _completion(tokens: int, seed: int) -> List[str]:
+    """Code Python valide entouré de fences, découpé en `tokens` fragments."""
+    body = "".join(f"    total += {seed} * {i}\n" for i in range(max(1, tokens // 8)))
+    text = f"```python\ndef generated_{seed}(n):\n    total = 0\n{body}    return total\n```"
+    size = max(1, len(text) // max(1, tokens))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def create_app(
+    *,
+    ttft_ms: float = 50.0,
+    tokens_per_s: float = 200.0,
+    output_tokens: int = 64,
+    parallel: int = 4,
+    model: str = "llama2:13b-chat-q4_0",
+) -> Starlette:
+    # Comme OLLAMA_NUM_PARALLEL : au‑delà, les requêtes attendent leur tour
+    slots = asyncio.Semaphore(max(1, parallel))
+    stats = {"requests": 0}
+
+    async def generate(request: Request):
+        payload = await request.json()
+        stats["requests"] += 1
+        pieces = _completion(output_tokens, stats["requests"])
+        prompt_tokens = len(payload.get("prompt", "")) // 4
+
+        def final(start: float, first: float) -> dict:
+            now = time.perf_counter()
+            return {
+                "model": payload.get("model", model), "done": True,
+                "total_duration": int((now - start) * 1e9),
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int((first - start) * 1e9),
+                "eval_count": len(pieces),
+                "eval_duration": int((now - first) * 1e9),
+            }
+
+        if not payload.get("stream", True):
+            async with slots:
+                start = time.perf_counter()
+                await asyncio.sleep(ttft_ms / 1000)
+                first = time.perf_counter()
+                await asyncio.sleep(len(pieces) / tokens_per_s)
+                return JSONResponse(dict(final(start, first), response="".join(pieces)))
+
+        async def lines():
+            async with slots:
+                start = time.perf_counter()
+                await asyncio.sleep(ttft_ms / 1000)
+                first = time.perf_counter()
+                for index, piece in enumerate(pieces):
+                    if index:
+                        await asyncio.sleep(1 / tokens_per_s)
+                    yield json.dumps({"model": model, "response": piece, "done": False}) + "\n"
+                yield json.dumps(dict(final(start, first), response="")) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def pull(request: Request):
+        payload = await request.json()
+        name = payload.get("model") or payload.get("name", model)
+        layers = [("sha256:aaaa", 4 << 20), ("sha256:bbbb", 1 << 20)]
+
+        async def lines():
+            yield json.dumps({"status": "pulling manifest"}) + "\n"
+            for digest, total in layers:
+                for completed in (0, total // 2, total):
+                    await asyncio.sleep(0.01)
+                    yield json.dumps({
+                        "status": f"pulling {digest[7:]}", "digest": digest,
+                        "total": total, "completed": completed,
+                    }) + "\n"
+            yield json.dumps({"status": "success"}) + "\n"
+
+        stats.setdefault("pulled", []).append(name)
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def tags(request: Request):
+        return JSONResponse({"models": [{"name": model, "model": model}]})
+
+    async def ps(request: Request):
+        return JSONResponse({"models": [{"name": model, "model": model}]})
+
+    app = Starlette(routes=[
+        Route("/api/generate", generate, methods=["POST"]),
+        Route("/api/pull", pull, methods=["POST"]),
+        Route("/api/tags", tags, methods=["GET"]),
+        Route("/api/ps", ps, methods=["GET"]),
+    ])
+    app.state.stats = stats
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-s", type=float, default=200.0)
+    parser.add_argument("--output-tokens", type=int, default=64)
+    parser.add_argument("--parallel", type=int, default=4)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(
+            ttft_ms=args.ttft_ms, tokens_per_s=args.tokens_per_s,
+            output_tokens=args.output_tokens, parallel=args.parallel,
+        ),
+        host=args.host, port=args.port, log_level="warning",
+    )
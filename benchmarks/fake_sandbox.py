@@ -0,0 +1,53 @@
+# benchmarks/fake_sandbox.py
+"""
+Serveur d’exécution factice (même protocole que containers/runner) : une
+ligne JSON par requête, une ligne JSON par réponse.  L’exécution est
+simulée par un délai ; `parallel` borne les exécutions simultanées comme
+le feraient les CPU du conteneur sandbox.
+
+    python benchmarks/fake_sandbox.py --port 7000 --exec-ms 20
+"""
+import argparse
+import asyncio
+import json
+
+
+async def serve(host: str, port: int, exec_ms: float = 20.0, parallel: int = 2) -> asyncio.AbstractServer:
+    slots = asyncio.Semaphore(max(1, parallel))
+
+    async def handle(request: dict) -> dict:
+        if request.get("op") == "health":
+            return {"ok": True, "pools": {}}
+        if request.get("op") == "info":
+            return {"image": "fake-sandbox", "runtimes": {"python": "Python (fake)"}}
+        async with slots:
+            await asyncio.sleep(exec_ms / 1000)
+        code = request.get("code", "")
+        status = "failed" if "raise" in code else "passed"
+        return {"status": status, "log": "", "duration_ms": int(exec_ms)}
+
+    async def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            line = await reader.readline()
+            if line:
+                writer.write((json.dumps(await handle(json.loads(line))) + "\n").encode("utf-8"))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(on_client, host, port, limit=8 << 20)
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = await serve(args.host, args.port, args.exec_ms, args.parallel)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument("--exec-ms", type=float, default=20.0)
+    parser.add_argument("--parallel", type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,301 @@
+# benchmarks/run_bench.py
+"""
+Benchmark hors‑ligne de l’API : démarre un Ollama factice, un serveur
+d’exécution factice et l’API (processus séparés, ports libres), puis envoie
+des requêtes à concurrence fixe et rapporte débit et percentiles.
+
+    python benchmarks/run_bench.py --concurrency 8 --requests 200
+    python benchmarks/run_bench.py --scenarios infer,search --check   # échoue si régression
+
+Les seuils de non‑régression sont dans benchmarks/thresholds.json ; ils
+valent pour les paramètres par défaut des serveurs factices.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+HERE = Path(__file__).resolve().parent
+THRESHOLDS_FILE = HERE / "thresholds.json"
+SCENARIOS = ("infer", "infer-stream", "search", "run-tests")
+
+
+# ----------------------------------------------------------------------
+# 1️⃣  Processus : serveurs factices et API
+# ----------------------------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_tcp(port: int, proc: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{proc.args[1]} s’est arrêté (code {proc.returncode})")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{proc.args[1]} ne répond pas sur le port {port}")
+
+
+class Stack:
+    """Ollama factice + sandbox factice + API, arrêtés à la sortie du `with`."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.procs: List[subprocess.Popen] = []
+        self.workdir = tempfile.TemporaryDirectory(prefix="chloe-bench-")
+        self.api_port = _free_port()
+
+    def _spawn(self, script: str, *argv: str, env: Optional[dict] = None) -> subprocess.Popen:
+        proc = subprocess.Popen(
+            [sys.executable, str(HERE / script), *argv],
+            env=env, stdout=subprocess.DEVNULL, stderr=None if self.args.verbose else subprocess.DEVNULL,
+        )
+        self.procs.append(proc)
+        return proc
+
+    def __enter__(self) -> "Stack":
+        a = self.args
+        ollama_port, sandbox_port = _free_port(), _free_port()
+        try:
+            ollama = self._spawn(
+                "fake_ollama.py", "--port", str(ollama_port), "--ttft-ms", str(a.ttft_ms),
+                "--tokens-per-s", str(a.tokens_per_s), "--output-tokens", str(a.output_tokens),
+                "--parallel", str(a.ollama_parallel),
+            )
+            sandbox = self._spawn(
+                "fake_sandbox.py", "--port", str(sandbox_port), "--exec-ms", str(a.sandbox_ms),
+                "--parallel", str(a.sandbox_parallel),
+            )
+            root = Path(self.workdir.name)
+            env = dict(
+                os.environ,
+                OLLAMA_HOST=f"http://127.0.0.1:{ollama_port}",
+                SANDBOX_RUNNER_HOST="127.0.0.1",
+                SANDBOX_RUNNER_PORT=str(sandbox_port),
+                SANDBOX_DOCKER_FALLBACK="0",
+                CACHE_DIR=str(root / "cache"),
+                CHROMA_DB_PATH=str(root / "chroma"),
+                LOG_ROOT=str(root),
+                ANONYMIZED_TELEMETRY="False",      # Chroma : pas d’appel réseau
+            )
+            env.update(item.split("=", 1) for item in a.app_env)
+            api = self._spawn(
+                "serve_app.py", "--port", str(self.api_port), "--documents", str(a.documents), env=env,
+            )
+            _wait_tcp(ollama_port, ollama, 15)
+            _wait_tcp(sandbox_port, sandbox, 15)
+            _wait_tcp(self.api_port, api, 120)
+        except BaseException:
+            self.__exit__()
+            raise
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for proc in self.procs:
+            proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        self.workdir.cleanup()
+
+
+# ----------------------------------------------------------------------
+# 2️⃣  Scénarios : une requête → (latence s, TTFT s ou None)
+# ----------------------------------------------------------------------
+def _check(response: httpx.Response) -> None:
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+
+def make_scenario(name: str, args: argparse.Namespace) -> Callable[[httpx.AsyncClient, int], Awaitable[Optional[float]]]:
+    run_id = int(time.time())
+
+    async def infer(client: httpx.AsyncClient, i: int) -> Optional[float]:
+        _check(await client.post("/v1/infer", json={
+            "prompt": f"bench {run_id}-{i}: write a function that sums a list",
+            "language": "python", "no_cache": True,
+        }))
+        return None
+
+    async def infer_stream(client: httpx.AsyncClient, i: int) -> Optional[float]:
+        start = time.perf_counter()
+        ttft = None
+        payload = {"prompt": f"bench stream {run_id}-{i}", "language": "python", "no_cache": True}
+        async with client.stream("POST", "/v1/infer/stream", json=payload) as response:
+            _check(response)
+            async for line in response.aiter_lines():
+                if line.startswith("event: token") and ttft is None:
+                    ttft = time.perf_counter() - start
+                elif line.startswith("event: error"):
+                    raise RuntimeError("évènement error dans le flux")
+        return ttft
+
+    async def search(client: httpx.AsyncClient, i: int) -> Optional[float]:
+        topic = ("parse json", "retry http", "merge_sort", "csv stream", "token cache")[i % 5]
+        _check(await client.get("/v1/search", params={"q": topic, "k": 5, "mode": args.search_mode}))
+        return None
+
+    async def run_tests(client: httpx.AsyncClient, i: int) -> Optional[float]:
+        _check(await client.post("/v1/run-tests", json={
+            "code": f"assert {i} + 1 == {i + 1}  # {run_id}", "language": "python", "no_cache": True,
+        }))
+        return None
+
+    return {"infer": infer, "infer-stream": infer_stream, "search": search, "run-tests": run_tests}[name]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Percentile « nearest rank » (q dans [0, 100])."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+async def run_scenario(base_url: str, name: str, args: argparse.Namespace) -> Dict[str, object]:
+    scenario = make_scenario(name, args)
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors: List[str] = []
+    counter = iter(range(args.requests))
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        for i in range(min(args.warmup, args.requests)):
+            try:
+                await scenario(client, -1 - i)
+            except Exception:
+                pass
+
+        async def worker() -> None:
+            for i in counter:              # itérateur partagé : boucle fermée
+                start = time.perf_counter()
+                try:
+                    ttft = await scenario(client, i)
+                except Exception as exc:
+                    errors.append(str(exc))
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if ttft is not None:
+                    ttfts.append(ttft)
+
+        wall = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - wall
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 1) if value is not None else None
+
+    result: Dict[str, object] = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": len(errors),
+        "error_rate": round(len(errors) / args.requests, 4) if args.requests else 0.0,
+        "rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(max(latencies) if latencies else None),
+    }
+    if ttfts:
+        result["ttft_p50_ms"] = ms(percentile(ttfts, 50))
+        result["ttft_p95_ms"] = ms(percentile(ttfts, 95))
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+# ----------------------------------------------------------------------
+# 3️⃣  Seuils de non‑régression
+# ----------------------------------------------------------------------
+def check_thresholds(results: Dict[str, dict], thresholds: Dict[str, dict]) -> List[str]:
+    """
+    Seuils par scénario : `max_<métrique>` (ex. max_p95_ms, max_error_rate)
+    ou `min_<métrique>` (ex. min_rps).  Retourne les violations.
+    """
+    failures = []
+    for name, result in results.items():
+        for key, bound in thresholds.get(name, {}).items():
+            kind, _, metric = key.partition("_")
+            value = result.get(metric)
+            if kind not in ("max", "min") or value is None:
+                continue
+            if (kind == "max" and value > bound) or (kind == "min" and value < bound):
+                failures.append(f"{name}: {metric}={value} ({kind} {bound})")
+    return failures
+
+
+def _print_table(results: Dict[str, dict]) -> None:
+    columns = ("rps", "p50_ms", "p95_ms", "p99_ms", "ttft_p50_ms", "error_rate")
+    print(f"{'scénario':<14}" + "".join(f"{c:>13}" for c in columns))
+    for name, result in results.items():
+        cells = "".join(f"{'-' if result.get(c) is None else result[c]:>13}" for c in columns)
+        print(f"{name:<14}{cells}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"liste parmi {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requêtes par scénario")
+    parser.add_argument("--warmup", type=int, default=2, help="requêtes non mesurées par scénario")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--search-mode", default="lexical", choices=("vector", "lexical", "hybrid", "auto"),
+                        help="vector / hybrid nécessitent sentence-transformers")
+    parser.add_argument("--documents", type=int, default=2000, help="taille du corpus synthétique")
+    parser.add_argument("--ttft-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-s", type=float, default=200.0)
+    parser.add_argument("--output-tokens", type=int, default=64)
+    parser.add_argument("--ollama-parallel", type=int, default=4)
+    parser.add_argument("--sandbox-ms", type=float, default=20.0)
+    parser.add_argument("--sandbox-parallel", type=int, default=2)
+    parser.add_argument("--app-env", action="append", default=[], metavar="VAR=VALEUR",
+                        help="variable d’environnement de l’API (ex. OLLAMA_MAX_CONCURRENCY=4)")
+    parser.add_argument("--thresholds", type=Path, default=THRESHOLDS_FILE)
+    parser.add_argument("--check", action="store_true", help="code de sortie 1 si un seuil est dépassé")
+    parser.add_argument("--json", type=Path, help="écrit les résultats dans ce fichier")
+    parser.add_argument("--verbose", action="store_true", help="affiche les logs des serveurs")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"scénarios inconnus : {', '.join(sorted(unknown))}")
+
+    with Stack(args) as stack:
+        base_url = f"http://127.0.0.1:{stack.api_port}"
+        results = {name: asyncio.run(run_scenario(base_url, name, args)) for name in names}
+
+    _print_table(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    if not args.check:
+        return 0
+    thresholds = json.loads(args.thresholds.read_text())
+    failures = check_thresholds(results, thresholds.get("scenarios", {}))
+    for failure in failures:
+        print(f"RÉGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
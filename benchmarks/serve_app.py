@@ -0,0 +1,59 @@
+# benchmarks/serve_app.py
+"""
+Lance l’API (backend/main.py) pour les benchmarks, après avoir amorcé la KB
+avec un corpus synthétique : documents dans Chroma (vecteurs aléatoires,
+sans modèle d’embedding) et dans l’index BM25, de sorte que la recherche
+lexicale fonctionne sans GPU ni réseau.
+
+Configuration par l’environnement (OLLAMA_HOST, SANDBOX_RUNNER_*, CACHE_DIR,
+CHROMA_DB_PATH…), positionné par run_bench.py.
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+TOPICS = ["parse", "json", "http", "retry", "cache", "sort", "merge", "stream", "csv", "token"]
+EMBEDDING_DIM = 384          # dimension de all-MiniLM-L6-v2
+
+
+def seed_kb(documents: int) -> None:
+    from utils.chroma_client import _get_collection, content_id
+    from utils.lexical_index import lexical_index
+
+    collection = _get_collection()
+    if documents <= 0 or collection.count() >= documents:
+        return
+    rng = random.Random(0)
+    docs, ids, metas, vectors = [], [], [], []
+    for i in range(documents):
+        a, b = rng.sample(TOPICS, 2)
+        doc = f"def {a}_{b}_{i}(data):\n    \"\"\"{a} then {b} helper number {i}.\"\"\"\n    return {a}({b}(data))\n"
+        docs.append(doc)
+        ids.append(content_id(doc, "bench"))
+        metas.append({"source": "bench", "path": f"bench/{a}_{b}.py"})
+        vectors.append([rng.uniform(-1, 1) for _ in range(EMBEDDING_DIM)])
+    for start in range(0, documents, 500):
+        end = start + 500
+        collection.upsert(
+            ids=ids[start:end], documents=docs[start:end],
+            metadatas=metas[start:end], embeddings=vectors[start:end],
+        )
+    lexical_index.add(ids, docs)
+    lexical_index.flush()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--documents", type=int, default=2000)
+    args = parser.parse_args()
+    seed_kb(args.documents)
+
+    from main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,395 @@
+# containers/runner/runner_server.py
+"""
+Serveur d’exécution « à chaud » du sandbox.
+
+Remplace le `docker exec … bash -c 'python3 …'` par requête : des processus
+pré‑démarrés par langage attendent le code et l’exécutent immédiatement.
+
+- Python : pool de fork‑servers (`zygote.py`), chaque snippet tourne dans un
+  enfant forké ; un zygote est recyclé après `RUNNER_MAX_RUNS` exécutions.
+- Autres langages : pool d’interpréteurs déjà lancés qui lisent le programme
+  sur stdin (un processus par exécution, remplacé en tâche de fond) ; un
+  interpréteur en attente depuis plus de `RUNNER_SPARE_MAX_AGE` s est recyclé.
+
+Protocole TCP : une ligne JSON par requête, une ligne JSON par réponse.
+    {"language": "python", "code": "...", "timeout": 30}
+        → {"status": "passed|failed|error", "log": "...", "duration_ms": 12}
+        → {"error": "Timeout"}
+    {"op": "health"} → {"ok": true, "pools": {...}}
+    {"op": "info"}   → {"image": "<digest>", "runtimes": {"python": "Python 3.10.12", ...}}
+"""
+import asyncio
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+# ----------------------------------------------------------------------
+# Configuration (variables d’environnement du conteneur sandbox)
+# ----------------------------------------------------------------------
+HOST = os.getenv("RUNNER_HOST", "0.0.0.0")
+PORT = int(os.getenv("RUNNER_PORT", "7000"))
+POOL_SIZE = int(os.getenv("RUNNER_POOL_SIZE", "2"))
+MAX_RUNS = int(os.getenv("RUNNER_MAX_RUNS", "100"))
+SPARE_MAX_AGE = float(os.getenv("RUNNER_SPARE_MAX_AGE", "600"))
+HEALTH_INTERVAL = float(os.getenv("RUNNER_HEALTH_INTERVAL", "10"))
+DEFAULT_TIMEOUT = float(os.getenv("RUNNER_TIMEOUT", "30"))
+MAX_OUTPUT = int(os.getenv("RUNNER_MAX_OUTPUT", str(1 << 20)))
+WARM_LANGUAGES = [
+    lang.strip()
+    for lang in os.getenv(
+        "RUNNER_LANGUAGES", "python,r,julia,javascript,typescript,bash"
+    ).split(",")
+    if lang.strip()
+]
+
+ZYGOTE = Path(__file__).with_name("zygote.py")
+
+# Commandes lisant le programme sur stdin (lancées dans un répertoire temporaire)
+STDIN_COMMANDS: Dict[str, List[str]] = {
+    "r": ["Rscript", "-e", "source(file('stdin'))"],
+    "julia": ["julia", "-e", "include_string(Main, read(stdin, String))"],
+    "javascript": ["node", "-"],
+    "typescript": ["ts-node"],
+    "bash": ["bash", "-s"],
+    "sql": ["psql", "-f", "-"],
+    "latex": ["pdflatex", "-interaction=nonstopmode", "-halt-on-error"],
+}
+
+
+# Commandes de version : identifient le runtime dans la clé du cache de résultats
+VERSION_COMMANDS: Dict[str, List[str]] = {
+    "python": [sys.executable, "--version"],
+    "r": ["Rscript", "--version"],
+    "julia": ["julia", "--version"],
+    "javascript": ["node", "--version"],
+    "typescript": ["ts-node", "--version"],
+    "bash": ["bash", "--version"],
+    "sql": ["psql", "--version"],
+    "latex": ["pdflatex", "--version"],
+}
+
+
+async def _runtime_version(argv: List[str]) -> str:
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        output, _ = await asyncio.wait_for(proc.communicate(), 30)
+    except (OSError, asyncio.TimeoutError):
+        return "absent"
+    lines = output.decode("utf-8", errors="replace").strip().splitlines()
+    return lines[0].strip() if lines else "inconnu"
+
+
+def pool_size_for(language: str) -> int:
+    """Taille du pool pour `language` (RUNNER_POOL_SIZE_<LANG> prioritaire)."""
+    override = os.getenv(f"RUNNER_POOL_SIZE_{language.upper()}")
+    if override is not None:
+        return int(override)
+    return POOL_SIZE if language in WARM_LANGUAGES else 0
+
+
+def _status(returncode: int) -> str:
+    if returncode == 0:
+        return "passed"
+    if returncode > 0:
+        return "failed"
+    return "error"
+
+
+def _kill_group(proc: asyncio.subprocess.Process) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+# ----------------------------------------------------------------------
+# Pool de fork‑servers Python
+# ----------------------------------------------------------------------
+class Zygote:
+    def __init__(self, proc: asyncio.subprocess.Process) -> None:
+        self.proc = proc
+        self.runs = 0
+
+    @classmethod
+    async def spawn(cls) -> "Zygote":
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, str(ZYGOTE),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            start_new_session=True,
+            limit=4 * MAX_OUTPUT,
+        )
+        return cls(proc)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def request(self, payload: dict, timeout: float) -> dict:
+        self.proc.stdin.write((json.dumps(payload) + "\n").encode())
+        await self.proc.stdin.drain()
+        line = await asyncio.wait_for(self.proc.stdout.readline(), timeout)
+        if not line:
+            raise RuntimeError("zygote terminé")
+        return json.loads(line)
+
+    async def close(self) -> None:
+        if self.alive:
+            _kill_group(self.proc)
+        await self.proc.wait()
+
+
+class ForkServerPool:
+    def __init__(self, size: int, max_runs: int) -> None:
+        self.size = max(1, size)
+        self.max_runs = max_runs
+        self._idle: "asyncio.Queue[Zygote]" = asyncio.Queue()
+        self.recycled = 0
+
+    async def start(self) -> None:
+        for _ in range(self.size):
+            self._idle.put_nowait(await Zygote.spawn())
+
+    async def run(self, code: str, timeout: float) -> dict:
+        zygote = await self._idle.get()
+        try:
+            zygote.runs += 1
+            return await zygote.request(
+                {"op": "run", "code": code, "timeout": timeout, "max_output": MAX_OUTPUT},
+                timeout + 5,
+            )
+        except (asyncio.TimeoutError, RuntimeError, ValueError):
+            await zygote.close()
+            return {"error": "Runner Python indisponible"}
+        finally:
+            if not zygote.alive or zygote.runs >= self.max_runs:
+                await zygote.close()
+                zygote = await Zygote.spawn()
+                self.recycled += 1
+            self._idle.put_nowait(zygote)
+
+    async def health_check(self) -> None:
+        for _ in range(self._idle.qsize()):
+            zygote = self._idle.get_nowait()
+            try:
+                await zygote.request({"op": "ping"}, 5)
+            except Exception:
+                await zygote.close()
+                zygote = await Zygote.spawn()
+                self.recycled += 1
+            self._idle.put_nowait(zygote)
+
+    def stats(self) -> dict:
+        return {"kind": "fork-server", "size": self.size, "idle": self._idle.qsize(),
+                "recycled": self.recycled}
+
+    async def close(self) -> None:
+        while not self._idle.empty():
+            await self._idle.get_nowait().close()
+
+
+# ----------------------------------------------------------------------
+# Pool d’interpréteurs pré‑lancés (lecture du programme sur stdin)
+# ----------------------------------------------------------------------
+class Spare:
+    def __init__(self, proc: asyncio.subprocess.Process, workdir: str) -> None:
+        self.proc = proc
+        self.workdir = workdir
+        self.born = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def discard(self) -> None:
+        if self.alive:
+            _kill_group(self.proc)
+        await self.proc.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class SparePool:
+    def __init__(self, language: str, argv: List[str], size: int, max_age: float) -> None:
+        self.language = language
+        self.argv = argv
+        self.size = size
+        self.max_age = max_age
+        self._spares: Deque[Spare] = deque()
+        self._spawning = 0
+        self.cold_starts = 0
+        self.recycled = 0
+
+    async def _spawn(self) -> Spare:
+        workdir = tempfile.mkdtemp(prefix=f"run-{self.language}-")
+        proc = await asyncio.create_subprocess_exec(
+            *self.argv,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            cwd=workdir,
+            start_new_session=True,
+        )
+        return Spare(proc, workdir)
+
+    async def _refill(self) -> None:
+        while len(self._spares) + self._spawning < self.size:
+            self._spawning += 1
+            try:
+                self._spares.append(await self._spawn())
+            except OSError:
+                break             # interpréteur absent de l’image : pas de pool
+            finally:
+                self._spawning -= 1
+
+    async def start(self) -> None:
+        await self._refill()
+
+    async def _take(self) -> Spare:
+        while self._spares:
+            spare = self._spares.popleft()
+            if spare.alive:
+                return spare
+            await spare.discard()
+        self.cold_starts += 1
+        return await self._spawn()
+
+    async def run(self, code: str, timeout: float) -> dict:
+        try:
+            spare = await self._take()
+        except OSError as exc:
+            return {"error": f"Interpréteur indisponible : {exc}"}
+        asyncio.ensure_future(self._refill())
+
+        start = time.monotonic()
+        try:
+            output, _ = await asyncio.wait_for(
+                spare.proc.communicate(code.encode("utf-8")), timeout
+            )
+        except asyncio.TimeoutError:
+            await spare.discard()
+            return {"error": "Timeout"}
+        duration = int((time.monotonic() - start) * 1000)
+        returncode = spare.proc.returncode
+        await spare.discard()
+
+        log = output[:MAX_OUTPUT].decode("utf-8", errors="replace")
+        if len(output) > MAX_OUTPUT:
+            log += f"\n[… sortie tronquée à {MAX_OUTPUT} octets]"
+        return {"status": _status(returncode), "log": log, "duration_ms": duration}
+
+    async def health_check(self) -> None:
+        now = time.monotonic()
+        keep: Deque[Spare] = deque()
+        while self._spares:
+            spare = self._spares.popleft()
+            if spare.alive and now - spare.born < self.max_age:
+                keep.append(spare)
+            else:
+                self.recycled += 1
+                await spare.discard()
+        self._spares = keep
+        await self._refill()
+
+    def stats(self) -> dict:
+        return {"kind": "spare", "size": self.size, "idle": len(self._spares),
+                "cold_starts": self.cold_starts, "recycled": self.recycled}
+
+    async def close(self) -> None:
+        while self._spares:
+            await self._spares.popleft().discard()
+
+
+# ----------------------------------------------------------------------
+# Serveur TCP
+# ----------------------------------------------------------------------
+class RunnerServer:
+    def __init__(self) -> None:
+        self.pools: Dict[str, object] = {}
+        self.runtimes: Dict[str, str] = {}
+        self._health_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self.pools["python"] = ForkServerPool(pool_size_for("python"), MAX_RUNS)
+        for language, argv in STDIN_COMMANDS.items():
+            self.pools[language] = SparePool(
+                language, argv, pool_size_for(language), SPARE_MAX_AGE
+            )
+        await asyncio.gather(*(pool.start() for pool in self.pools.values()))
+        versions = await asyncio.gather(
+            *(_runtime_version(argv) for argv in VERSION_COMMANDS.values())
+        )
+        self.runtimes = dict(zip(VERSION_COMMANDS, versions))
+        self._health_task = asyncio.ensure_future(self._health_loop())
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(HEALTH_INTERVAL)
+            for pool in self.pools.values():
+                try:
+                    await pool.health_check()
+                except Exception as exc:          # ne jamais tuer la boucle
+                    print(f"[runner] health check: {exc}", file=sys.stderr)
+
+    async def handle(self, request: dict) -> dict:
+        if request.get("op") == "health":
+            return {"ok": True, "pools": {k: p.stats() for k, p in self.pools.items()}}
+        if request.get("op") == "info":
+            return {
+                "image": os.getenv("SANDBOX_IMAGE_DIGEST", ""),
+                "runtimes": self.runtimes,
+            }
+        pool = self.pools.get(request.get("language"))
+        if pool is None:
+            return {"error": f"Langage non supporté : {request.get('language')}"}
+        timeout = float(request.get("timeout", DEFAULT_TIMEOUT))
+        return await pool.run(request.get("code", ""), timeout)
+
+    async def on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle(json.loads(line))
+                except (ValueError, KeyError) as exc:
+                    response = {"error": f"Requête invalide : {exc}"}
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+        for pool in self.pools.values():
+            await pool.close()
+
+
+async def main() -> None:
+    runner = RunnerServer()
+    await runner.start()
+    server = await asyncio.start_server(
+        runner.on_client, HOST, PORT, limit=4 * MAX_OUTPUT + (1 << 16)
+    )
+    print(f"[runner] prêt sur {HOST}:{PORT}", file=sys.stderr, flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await runner.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+# containers/runner/zygote.py
+"""
+Fork‑server Python du sandbox.
+
+Processus long‑vivant : l’interpréteur et les modules courants sont chargés une
+seule fois, puis chaque snippet est exécuté dans un enfant obtenu par `fork()`
+(isolé : son propre groupe de processus, son propre répertoire temporaire).
+
+Protocole (une ligne JSON par message sur stdin / stdout) :
+    {"op": "ping"}                         → {"ok": true, "runs": 3}
+    {"op": "run", "code": "...", "timeout": 30, "max_output": 1048576}
+        → {"status": "passed|failed|error", "log": "...", "duration_ms": 12}
+        → {"error": "Timeout"}
+"""
+import json
+import os
+import select
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+# Pré‑chargement des modules usuels : le coût d’import est payé une fois
+import collections, datetime, functools, itertools, math, random, re, string, typing  # noqa: E401,F401
+import unittest  # noqa: F401
+
+PROTOCOL = sys.stdout
+RUNS = 0
+
+
+def _child(code: str, log_fd: int, workdir: str) -> None:
+    """Exécuté dans l’enfant : ne retourne jamais."""
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)          # le snippet ne doit pas lire le protocole
+    os.close(devnull)
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(log_fd)
+    os.chdir(workdir)
+    sys.stdin = os.fdopen(0, "r", closefd=False)
+    sys.stdout = os.fdopen(1, "w", buffering=1, closefd=False)
+    sys.stderr = os.fdopen(2, "w", buffering=1, closefd=False)
+    exit_code = 0
+    try:
+        exec(compile(code, "<sandbox>", "exec"), {"__name__": "__main__"})
+    except SystemExit as exc:
+        if exc.code is None:
+            exit_code = 0
+        elif isinstance(exc.code, int):
+            exit_code = exc.code
+        else:
+            print(exc.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    os._exit(exit_code)
+
+
+def run(code: str, timeout: float, max_output: int) -> dict:
+    global RUNS
+    RUNS += 1
+    workdir = tempfile.mkdtemp(prefix="run-")
+    read_fd, write_fd = os.pipe()
+    PROTOCOL.flush()
+    start = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        _child(code, write_fd, workdir)
+    os.close(write_fd)
+
+    chunks, size, timed_out = [], 0, False
+    deadline = start + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            ready, _, _ = select.select([read_fd], [], [], remaining)
+            if not ready:
+                continue
+            data = os.read(read_fd, 65536)
+            if not data:
+                break
+            if size < max_output:
+                chunks.append(data[: max_output - size])
+            size += len(data)
+    finally:
+        os.close(read_fd)
+
+    if timed_out:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    _, wait_status = os.waitpid(pid, 0)
+    duration = int((time.monotonic() - start) * 1000)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if timed_out:
+        return {"error": "Timeout"}
+
+    returncode = os.waitstatus_to_exitcode(wait_status)
+    log = b"".join(chunks).decode("utf-8", errors="replace")
+    if size > max_output:
+        log += f"\n[… sortie tronquée à {max_output} octets]"
+    if returncode == 0:
+        status = "passed"
+    elif returncode > 0:
+        status = "failed"
+    else:
+        status = "error"
+    return {"status": status, "log": log, "duration_ms": duration}
+
+
+def main() -> None:
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if request.get("op") == "ping":
+            response = {"ok": True, "runs": RUNS}
+        else:
+            response = run(
+                request["code"],
+                float(request.get("timeout", 30)),
+                int(request.get("max_output", 1 << 20)),
+            )
+        PROTOCOL.write(json.dumps(response) + "\n")
+        PROTOCOL.flush()
+
+
+if __name__ == "__main__":
+    main()
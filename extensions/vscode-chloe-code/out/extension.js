@@ -65,7 +65,7 @@ function activate(context) {
         const endpoint = config.get('endpoint') ?? 'http://localhost:8000/v1';
         try {
             await axios_1.default.post(`${endpoint}/update-model`);
-            vscode.window.showInformationMessage('Modèle mis à jour.');
+            vscode.window.showInformationMessage('Mise à jour du modèle lancée en arrière‑plan.');
         }
         catch (err) {
             vscode.window.showErrorMessage(`Erreur de mise à jour du modèle : ${err.message}`);
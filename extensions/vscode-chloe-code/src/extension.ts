@@ -26,7 +26,7 @@ export function activate(context: vscode.ExtensionContext) {
         const endpoint = config.get<string>('endpoint') ?? 'http://localhost:8000/v1';
         try {
             await axios.post(`${endpoint}/update-model`);
-            vscode.window.showInformationMessage('Modèle mis à jour.');
+            vscode.window.showInformationMessage('Mise à jour du modèle lancée en arrière‑plan.');
         } catch (err:any) {
             vscode.window.showErrorMessage(`Erreur de mise à jour du modèle : ${err.message}`);
         }
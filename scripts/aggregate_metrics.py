@@ -1,45 +1,310 @@
 # scripts/aggregate_metrics.py
-import json, csv
+"""
+Agrégation incrémentale des logs JSONL de l’API (logs/app.log et fichiers
+tournés / compressés par Loguru) en rollups horaires et journaliers.
+
+    python scripts/aggregate_metrics.py --log-dir logs --out-dir metrics
+
+Chaque fichier est lu en flux ; la position atteinte est enregistrée dans un
+fichier d’état, si bien qu’une nouvelle exécution ne traite que les lignes
+ajoutées depuis.  Les latences sont résumées par des histogrammes à
+buckets logarithmiques (erreur relative ≤ 1 %), fusionnables entre heures.
+"""
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from datetime import datetime
+from typing import Dict, IO, Iterator, Optional, Tuple
 
-LOG_FILE = Path("logs/app.log")
+LOG_DIR = Path(os.getenv("LOG_ROOT", ".")) / "logs"
 OUT_DIR = Path("metrics")
-OUT_DIR.mkdir(exist_ok=True)
-
-def aggregate():
-    stats = {
-        "date": datetime.utcnow().strftime("%Y-%m-%d"),
-        "total_requests": 0,
-        "avg_latency_ms": 0,
-        "errors": 0,
-        "tests_total": 0,
-        "tests_passed": 0,
-    }
-    latencies = []
-
-    with LOG_FILE.open() as f:
-        for line in f:
-            entry = json.loads(line)
-            if entry["event"] == "request":
-                stats["total_requests"] += 1
-            if entry["event"] == "response":
-                latencies.append(entry["latency_ms"])
-            if entry["level"] == "ERROR":
-                stats["errors"] += 1
-            if entry["event"] == "run-tests":
-                stats["tests_total"] += 1
-                if entry.get("status") == "passed":
-                    stats["tests_passed"] += 1
-
-    if latencies:
-        stats["avg_latency_ms"] = sum(latencies) / len(latencies)
-
-    csv_path = OUT_DIR / f"{stats['date']}.csv"
-    with csv_path.open("w", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=stats.keys())
+# Longueur maximale lue pour identifier un fichier
+_IDENTITY_BYTES = 64 * 1024
+
+
+# ----------------------------------------------------------------------
+# 1️⃣  Histogramme logarithmique fusionnable
+# ----------------------------------------------------------------------
+class LogHistogram:
+    """
+    Buckets géométriques de raison (1 + 2α) : toute valeur est restituée
+    à α près (erreur relative).  Deux histogrammes se fusionnent en sommant
+    leurs compteurs, ce qui permet des rollups heure → jour exacts.
+    """
+
+    def __init__(self, alpha: float = 0.01, counts: Optional[Dict[int, float]] = None,
+                 zeros: float = 0.0) -> None:
+        self.alpha = alpha
+        self._gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self._gamma)
+        self.counts: Dict[int, float] = counts or {}
+        self.zeros = zeros
+        self.total = zeros + sum(self.counts.values())
+        self.sum = 0.0
+
+    def add(self, value: float, weight: float = 1.0) -> None:
+        self.total += weight
+        self.sum += value * weight
+        if value <= 0:
+            self.zeros += weight
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.counts[index] = self.counts.get(index, 0.0) + weight
+
+    def merge(self, other: "LogHistogram") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0.0) + count
+        self.zeros += other.zeros
+        self.total += other.total
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.total <= 0:
+            return None
+        rank = q * self.total
+        seen = self.zeros
+        if seen >= rank and self.zeros:
+            return 0.0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                # Milieu (relatif) du bucket ]γ^(i-1), γ^i]
+                return 2 * self._gamma ** index / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.counts) / (self._gamma + 1)
+
+    def to_json(self) -> dict:
+        return {"counts": {str(k): v for k, v in self.counts.items()}, "zeros": self.zeros,
+                "sum": self.sum}
+
+    @classmethod
+    def from_json(cls, data: dict, alpha: float = 0.01) -> "LogHistogram":
+        hist = cls(alpha, {int(k): v for k, v in data["counts"].items()}, data["zeros"])
+        hist.sum = data["sum"]
+        return hist
+
+
+# ----------------------------------------------------------------------
+# 2️⃣  Rollups (période, endpoint)
+# ----------------------------------------------------------------------
+class Rollup:
+    FIELDS = ("requests", "responses", "errors", "cache_lookups", "cache_hits",
+              "tests_total", "tests_passed")
+
+    def __init__(self, data: Optional[dict] = None) -> None:
+        data = data or {}
+        for field in self.FIELDS:
+            setattr(self, field, data.get(field, 0.0))
+        self.latency = LogHistogram.from_json(data["latency"]) if "latency" in data else LogHistogram()
+
+    def merge(self, other: "Rollup") -> None:
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.latency.merge(other.latency)
+
+    def to_json(self) -> dict:
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data["latency"] = self.latency.to_json()
+        return data
+
+    def row(self) -> dict:
+        def ratio(num: float, den: float) -> Optional[float]:
+            return round(num / den, 4) if den else None
+
+        def q(value: float) -> Optional[float]:
+            result = self.latency.quantile(value)
+            return round(result, 1) if result is not None else None
+
+        return {
+            "requests": round(self.requests),
+            "errors": round(self.errors),
+            "error_rate": ratio(self.errors, self.requests or self.responses),
+            "latency_mean_ms": ratio(self.latency.sum, self.latency.total),
+            "latency_p50_ms": q(0.50),
+            "latency_p95_ms": q(0.95),
+            "latency_p99_ms": q(0.99),
+            "cache_hit_rate": ratio(self.cache_hits, self.cache_lookups),
+            "sandbox_pass_rate": ratio(self.tests_passed, self.tests_total),
+            "sandbox_tests": round(self.tests_total),
+        }
+
+
+def _observe(rollup: Rollup, message: str, extra: dict) -> None:
+    """Ajoute une entrée de log (pondérée par 1 / taux d’échantillonnage)."""
+    rate = extra.get("sample_rate") or 1.0
+    weight = 1.0 / rate if rate > 0 else 1.0
+    if message == "request":
+        rollup.requests += weight
+    elif message == "error":
+        rollup.errors += 1
+    elif message == "response":
+        rollup.responses += weight
+        latency = extra.get("latency_ms")
+        if isinstance(latency, (int, float)):
+            rollup.latency.add(float(latency), weight)
+        response = extra.get("response")
+        if not isinstance(response, dict):
+            return
+        if isinstance(response.get("cached"), bool):
+            rollup.cache_lookups += weight
+            rollup.cache_hits += weight if response["cached"] else 0.0
+        status = response.get("status")
+        if status in ("passed", "failed", "error"):
+            rollup.tests_total += weight
+            rollup.tests_passed += weight if status == "passed" else 0.0
+        elif "passed" in response and "failed" in response:
+            # Lot /v1/run-tests/batch : compteurs par statut
+            counts = {k: response.get(k) or 0 for k in ("passed", "failed", "error", "unfinished")}
+            rollup.tests_total += weight * sum(counts.values())
+            rollup.tests_passed += weight * counts["passed"]
+
+
+# ----------------------------------------------------------------------
+# 3️⃣  Lecture en flux des fichiers de log, avec points de reprise
+# ----------------------------------------------------------------------
+def _open(path: Path) -> IO[bytes]:
+    return gzip.open(path, "rb") if path.suffix == ".gz" else path.open("rb")
+
+
+def _identity(path: Path) -> Optional[str]:
+    """
+    Hash de la première ligne (horodatée, donc unique) : le fichier courant et
+    sa version tournée / compressée ont la même identité, ce qui évite de
+    recompter après rotation les lignes déjà lues.
+    """
+    try:
+        with _open(path) as fh:
+            head = fh.readline(_IDENTITY_BYTES)
+    except (OSError, EOFError):
+        return None
+    if not head.endswith(b"\n"):
+        return None
+    return hashlib.sha1(head).hexdigest()
+
+
+def _log_files(log_dir: Path) -> Iterator[Path]:
+    """Fichiers tournés (les plus anciens d’abord) puis le fichier courant."""
+    current = log_dir / "app.log"
+    rotated = sorted(p for p in log_dir.glob("app*.log*") if p != current)
+    yield from rotated
+    if current.exists():
+        yield current
+
+
+def _read_from(path: Path, offset: int) -> Iterator[Tuple[int, bytes]]:
+    """Lignes complètes après `offset` (octets non compressés) et nouvelle position."""
+    with _open(path) as fh:
+        fh.seek(offset)           # gzip : avance en décompressant, mémoire constante
+        position = offset
+        for line in fh:
+            if not line.endswith(b"\n"):
+                break             # ligne en cours d’écriture : reprise au prochain passage
+            position += len(line)
+            yield position, line
+
+
+class Aggregator:
+    def __init__(self, state_path: Path) -> None:
+        self.state_path = state_path
+        state = json.loads(state_path.read_text()) if state_path.exists() else {}
+        self.files: Dict[str, dict] = state.get("files", {})
+        self.hourly: Dict[str, Dict[str, Rollup]] = {
+            hour: {ep: Rollup(data) for ep, data in endpoints.items()}
+            for hour, endpoints in state.get("hourly", {}).items()
+        }
+
+    def process(self, log_dir: Path) -> int:
+        lines = 0
+        for path in _log_files(log_dir):
+            identity = _identity(path)
+            if identity is None:
+                continue
+            entry = self.files.setdefault(identity, {"offset": 0, "complete": False})
+            if entry["complete"]:
+                continue
+            for position, raw in _read_from(path, entry["offset"]):
+                self._ingest(raw)
+                entry["offset"] = position
+                lines += 1
+            entry["name"] = path.name
+            # Un fichier tourné ne grandit plus
+            entry["complete"] = path.name != "app.log"
+        return lines
+
+    def _ingest(self, raw: bytes) -> None:
+        try:
+            record = json.loads(raw)["record"]
+            extra = record["extra"]
+            endpoint = extra["endpoint"]
+            timestamp = record["time"]["timestamp"]
+        except (ValueError, KeyError, TypeError):
+            return
+        hour = datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H")
+        rollup = self.hourly.setdefault(hour, {}).setdefault(endpoint, Rollup())
+        _observe(rollup, record["message"], extra)
+
+    def prune(self, keep_days: int) -> None:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=keep_days)).strftime("%Y-%m-%dT%H")
+        for hour in [h for h in self.hourly if h < cutoff]:
+            del self.hourly[hour]
+
+    def daily(self) -> Dict[str, Dict[str, Rollup]]:
+        days: Dict[str, Dict[str, Rollup]] = {}
+        for hour, endpoints in self.hourly.items():
+            for endpoint, rollup in endpoints.items():
+                for key in (endpoint, "*"):
+                    days.setdefault(hour[:10], {}).setdefault(key, Rollup()).merge(rollup)
+        return days
+
+    def save(self) -> None:
+        state = {
+            "files": self.files,
+            "hourly": {
+                hour: {ep: rollup.to_json() for ep, rollup in endpoints.items()}
+                for hour, endpoints in self.hourly.items()
+            },
+        }
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.state_path)
+
+
+def _write_csv(path: Path, period_name: str, periods: Dict[str, Dict[str, Rollup]]) -> None:
+    rows = [
+        {period_name: period, "endpoint": endpoint, **rollup.row()}
+        for period in sorted(periods)
+        for endpoint, rollup in sorted(periods[period].items())
+    ]
+    if not rows:
+        return
+    with path.open("w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(rows[0]))
         writer.writeheader()
-        writer.writerow(stats)
+        writer.writerows(rows)
+
+
+def aggregate(log_dir: Path = LOG_DIR, out_dir: Path = OUT_DIR,
+              state_path: Optional[Path] = None, keep_days: int = 30) -> int:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    aggregator = Aggregator(state_path or out_dir / ".aggregate-state.json")
+    lines = aggregator.process(log_dir)
+    aggregator.prune(keep_days)
+    _write_csv(out_dir / "hourly.csv", "hour", aggregator.hourly)
+    _write_csv(out_dir / "daily.csv", "day", aggregator.daily())
+    aggregator.save()
+    return lines
+
 
 if __name__ == "__main__":
-    aggregate()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--log-dir", type=Path, default=LOG_DIR)
+    parser.add_argument("--out-dir", type=Path, default=OUT_DIR)
+    parser.add_argument("--state", type=Path, default=None)
+    parser.add_argument("--keep-days", type=int, default=30)
+    args = parser.parse_args()
+    processed = aggregate(args.log_dir, args.out_dir, args.state, args.keep_days)
+    print(f"{processed} nouvelles lignes agrégées → {args.out_dir}")
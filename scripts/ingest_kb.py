@@ -0,0 +1,53 @@
+# scripts/ingest_kb.py
+"""
+Indexation incrémentale d’un répertoire de code dans la KB Chroma.
+
+    python scripts/ingest_kb.py /chemin/du/repo --source mon-repo
+
+Seuls les fichiers modifiés depuis le dernier passage sont réembeddés ;
+les blocs des fichiers supprimés sont retirés de la KB.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from utils.ingest import (  # noqa: E402
+    ingest_directory, INGEST_BATCH_SIZE, INGEST_WORKERS, INGEST_MANIFEST,
+)
+from utils.lexical_index import lexical_index  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root", help="Répertoire à indexer")
+    parser.add_argument("--source", help="Nom de la source (défaut : nom du répertoire)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--manifest", type=Path, default=INGEST_MANIFEST)
+    args = parser.parse_args()
+
+    def progress(stats):
+        print(
+            f"\r{stats['files_seen']} fichiers, {stats['chunks_added']} blocs ajoutés",
+            end="", file=sys.stderr, flush=True,
+        )
+
+    stats = ingest_directory(
+        args.root,
+        source=args.source,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        manifest_path=args.manifest,
+        progress=progress,
+    )
+    # Journal BM25 fusionné au segment : l’API le relit à sa prochaine recherche
+    lexical_index.flush()
+    print(file=sys.stderr)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
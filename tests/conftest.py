@@ -2,12 +2,21 @@
 import sys
 import os
 import site
+import tempfile
 import pytest
 from fastapi.testclient import TestClient
 
+# Caches persistants isolés pour la session de tests
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="chloe-cache-"))
+os.environ.setdefault("CHROMA_DB_PATH", tempfile.mkdtemp(prefix="chloe-chroma-"))
+# Pas de préchauffage en fond (réessais vers un Ollama absent, logs partagés)
+os.environ.setdefault("WARMUP_ENABLED", "false")
+
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 from main import app   # import absolu du FastAPI app
 
 @pytest.fixture(scope="session")
 def client():
-    return TestClient(app)
\ No newline at end of file
+    # Le context manager déclenche le lifespan (client Ollama partagé, etc.)
+    with TestClient(app) as c:
+        yield c
\ No newline at end of file
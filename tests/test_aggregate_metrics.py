@@ -0,0 +1,88 @@
+# tests/test_aggregate_metrics.py
+import csv
+import gzip
+import importlib.util
+import json
+import random
+from pathlib import Path
+
+_spec = importlib.util.spec_from_file_location(
+    "aggregate_metrics", Path(__file__).resolve().parent.parent / "scripts" / "aggregate_metrics.py"
+)
+aggregate_metrics = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(aggregate_metrics)
+
+T0 = 1_760_000_000.0          # horodatage fixe (UTC)
+KEEP = 100_000                # pas d’élagage des heures anciennes
+
+
+def _line(message, endpoint, t, **extra):
+    record = {"message": message, "time": {"timestamp": t}, "extra": {"endpoint": endpoint, **extra}}
+    return json.dumps({"text": message, "record": record}) + "\n"
+
+
+def _rows(path):
+    with path.open() as fh:
+        return list(csv.DictReader(fh))
+
+
+def test_histogram_quantiles_are_within_relative_error():
+    hist = aggregate_metrics.LogHistogram()
+    values = [random.uniform(1, 5000) for _ in range(20000)]
+    for v in values:
+        hist.add(v)
+    values.sort()
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(hist.quantile(q) - exact) / exact < 0.03
+
+    other = aggregate_metrics.LogHistogram.from_json(hist.to_json())
+    other.merge(hist)
+    assert other.total == 2 * hist.total
+    assert abs(other.quantile(0.5) - hist.quantile(0.5)) < 1e-9
+
+
+def test_incremental_runs_and_rotation(tmp_path):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    out = tmp_path / "metrics"
+    lines = [
+        _line("request", "infer", T0),
+        _line("response", "infer", T0 + 1, latency_ms=100, response={"cached": False}),
+        _line("response", "infer", T0 + 2, latency_ms=300, response={"cached": True}),
+        _line("response", "run-tests", T0 + 3, latency_ms=50, response={"status": "passed"}),
+        _line("response", "run-tests", T0 + 4, latency_ms=70, response={"status": "failed"}),
+        _line("error", "infer", T0 + 5, error="boom"),
+    ]
+    current = logs / "app.log"
+    current.write_text("".join(lines[:3]) + lines[3][:10])     # dernière ligne incomplète
+    assert aggregate_metrics.aggregate(logs, out, keep_days=KEEP) == 3
+
+    # Rotation : le début est compressé, le reste arrive dans un nouveau app.log
+    with gzip.open(logs / "app.2025-10-09_00-00-00.log.gz", "wt") as fh:
+        fh.write("".join(lines[:4]))
+    current.write_text("".join(lines[4:]))
+    assert aggregate_metrics.aggregate(logs, out, keep_days=KEEP) == 3         # ligne 4 + nouveau fichier
+    assert aggregate_metrics.aggregate(logs, out, keep_days=KEEP) == 0
+
+    daily = {row["endpoint"]: row for row in _rows(out / "daily.csv")}
+    assert daily["infer"]["requests"] == "1" and daily["infer"]["errors"] == "1"
+    assert float(daily["infer"]["cache_hit_rate"]) == 0.5
+    assert float(daily["run-tests"]["sandbox_pass_rate"]) == 0.5
+    assert 97 <= float(daily["infer"]["latency_p50_ms"]) <= 103
+    assert 295 <= float(daily["infer"]["latency_p99_ms"]) <= 305
+    assert daily["*"]["sandbox_tests"] == "2"
+    assert _rows(out / "hourly.csv")[0]["hour"].startswith("2025-10-09T")
+
+
+def test_sampled_logs_are_reweighted(tmp_path):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    (logs / "app.log").write_text("".join(
+        _line("response", "search", T0 + i, latency_ms=10, sample_rate=0.25, response={})
+        for i in range(4)
+    ))
+    aggregate_metrics.aggregate(logs, tmp_path / "m", keep_days=KEEP)
+    hist_total = aggregate_metrics.Aggregator(tmp_path / "m" / ".aggregate-state.json").daily()
+    (day,) = hist_total
+    assert hist_total[day]["search"].responses == 16
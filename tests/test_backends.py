@@ -0,0 +1,141 @@
+# tests/test_backends.py
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+import uvicorn
+
+from utils import backends, ollama_client
+from utils.backends import Backend, BackendPool
+from utils.ollama_client import OllamaError
+
+BENCH_DIR = Path(__file__).resolve().parent.parent / "benchmarks"
+_spec = importlib.util.spec_from_file_location("bench_fake_ollama", BENCH_DIR / "fake_ollama.py")
+fake_ollama = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(fake_ollama)
+
+MODEL = "llama2:13b-chat-q4_0"
+
+
+async def _serve(app):
+    """Serveur Ollama factice sur un port libre, dans la boucle courante."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+def test_pick_prefers_least_outstanding_and_loaded_model():
+    pool = BackendPool(["http://a", "http://b", "http://c"])
+    a, b, c = pool.backends
+    for backend in pool.backends:
+        backend.installed, backend.loaded = {MODEL}, {MODEL}
+    a.outstanding, b.outstanding, c.outstanding = 3, 1, 2
+    assert pool.pick(MODEL) is b
+    # Modèle à charger sur b : pénalité de OLLAMA_COLD_PENALTY requêtes
+    b.loaded = set()
+    assert pool.pick(MODEL) is c
+    # Serveur sans le modèle jamais choisi, serveur éjecté écarté
+    c.installed = {"other"}
+    c.ejected_until = float("inf")
+    assert pool.pick(MODEL) in (a, b)
+    assert pool.pick("other") is c        # seul à l’avoir, même éjecté
+
+
+def test_pick_keeps_preferred_backend_while_available():
+    pool = BackendPool(["http://a", "http://b"])
+    a, b = pool.backends
+    a.installed, b.installed = {MODEL}, {MODEL}
+    a.outstanding = 5
+    assert pool.pick(MODEL, prefer="http://a") is a
+    assert pool.pick("other", prefer="http://a") is b        # préféré sans le modèle
+    a.ejected_until = backends.time.monotonic() + 30
+    assert pool.pick(MODEL, prefer="http://a") is b
+    a.ejected_until, a.installed = 0.0, set()
+    assert pool.pick(MODEL, prefer="http://a") is b
+
+
+def test_passive_ejection_after_consecutive_errors(monkeypatch):
+    monkeypatch.setattr(backends, "OLLAMA_EJECT_AFTER", 2)
+    pool = BackendPool(["http://a", "http://b"])
+    a, b = pool.backends
+
+    async def fail_on(expected):
+        with pytest.raises(OllamaError):
+            async with pool.lease(MODEL) as backend:
+                assert backend is expected
+                raise OllamaError("boom", status_code=503)
+
+    async def scenario():
+        a.outstanding = -5          # force le choix de a
+        await fail_on(a)
+        await fail_on(a)
+        assert a.ejected and not b.ejected
+        async with pool.lease(MODEL) as backend:
+            assert backend is b
+        # 404 : modèle absent de ce serveur, pas une panne
+        b.installed = {MODEL}
+        with pytest.raises(OllamaError):
+            async with pool.lease(MODEL):
+                raise OllamaError("model not found", status_code=404)
+        assert not b.ejected and MODEL not in b.installed
+
+    asyncio.run(scenario())
+
+
+def test_pool_against_local_servers(monkeypatch):
+    async def scenario():
+        apps = [
+            fake_ollama.create_app(ttft_ms=20, tokens_per_s=5000, model=MODEL),
+            fake_ollama.create_app(ttft_ms=20, tokens_per_s=5000, model=MODEL),
+            fake_ollama.create_app(ttft_ms=1, tokens_per_s=5000, model="codellama:7b"),
+        ]
+        servers = [await _serve(app) for app in apps]
+        pool = BackendPool([url for _, _, url in servers])
+        monkeypatch.setattr(ollama_client, "pool", pool)
+        monkeypatch.setattr(ollama_client, "_client", None)
+        try:
+            await pool.check_all(ollama_client.get_client())
+            assert [b.installed for b in pool.backends] == [{MODEL}, {MODEL}, {"codellama:7b"}]
+
+            await asyncio.gather(*(ollama_client.generate_code(f"p{i}", model=MODEL) for i in range(12)))
+            counts = [app.state.stats["requests"] for app in apps]
+            # Réparti entre les deux serveurs qui ont le modèle, aucun sur le troisième
+            assert counts[2] == 0 and counts[0] >= 4 and counts[1] >= 4
+
+            # Arrêt d’un serveur : erreurs, éjection, puis tout part sur l’autre
+            server, task, _ = servers[0]
+            server.should_exit = True
+            await task
+            for i in range(6):
+                try:
+                    await ollama_client.generate_code(f"q{i}", model=MODEL)
+                except OllamaError:
+                    pass
+            assert pool.backends[0].ejected
+            before = apps[1].state.stats["requests"]
+            await asyncio.gather(*(ollama_client.generate_code(f"r{i}", model=MODEL) for i in range(4)))
+            assert apps[1].state.stats["requests"] == before + 4
+
+            # Vérification active : serveur arrêté → non sain
+            for _ in range(backends.OLLAMA_UNHEALTHY_AFTER):
+                await pool.check_all(ollama_client.get_client())
+            assert [b.healthy for b in pool.backends] == [False, True, True]
+        finally:
+            for server, task, _ in servers:
+                server.should_exit = True
+            await asyncio.gather(*(task for _, task, _ in servers))
+            await ollama_client.close_client()
+
+    asyncio.run(scenario())
+
+
+def test_backend_state_shape():
+    backend = Backend("http://a")
+    assert backend.to_dict()["installed"] is None
+    backend.installed = set()
+    backend.mark(MODEL, loaded=True)
+    assert backend.to_dict()["installed"] == [MODEL] and backend.is_loaded(MODEL)
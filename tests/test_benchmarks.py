@@ -0,0 +1,68 @@
+# tests/test_benchmarks.py
+import asyncio
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+BENCH_DIR = Path(__file__).resolve().parent.parent / "benchmarks"
+
+
+def _load(name):
+    spec = importlib.util.spec_from_file_location(f"bench_{name}", BENCH_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+fake_ollama = _load("fake_ollama")
+fake_sandbox = _load("fake_sandbox")
+run_bench = _load("run_bench")
+
+
+def test_fake_ollama_streams_and_reports_stats():
+    app = fake_ollama.create_app(ttft_ms=1, tokens_per_s=10_000, output_tokens=16)
+    with TestClient(app) as client:
+        full = client.post("/api/generate", json={"prompt": "x", "stream": False}).json()
+        assert full["done"] and full["response"].startswith("```python")
+        assert full["eval_count"] > 0 and full["eval_duration"] > 0
+
+        r = client.post("/api/generate", json={"prompt": "x", "stream": True})
+        lines = [json.loads(line) for line in r.text.splitlines()]
+        assert lines[-1]["done"] and not any(line["done"] for line in lines[:-1])
+        text = "".join(line["response"] for line in lines)
+        compile(text.strip("`").removeprefix("python\n"), "<generated>", "exec")
+
+
+def test_fake_sandbox_speaks_runner_protocol():
+    async def scenario():
+        server = await fake_sandbox.serve("127.0.0.1", 0, exec_ms=1)
+        port = server.sockets[0].getsockname()[1]
+        replies = []
+        for request in ({"op": "info"}, {"language": "python", "code": "raise SystemExit(1)"}):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write((json.dumps(request) + "\n").encode())
+            replies.append(json.loads(await reader.readline()))
+            writer.close()
+        server.close()
+        return replies
+
+    info, run = asyncio.run(scenario())
+    assert "python" in info["runtimes"]
+    assert run["status"] == "failed"
+
+
+def test_percentiles_and_thresholds():
+    values = [i / 1000 for i in range(1, 101)]
+    assert run_bench.percentile(values, 50) == 0.05
+    assert run_bench.percentile(values, 99) == 0.099
+    assert run_bench.percentile([], 95) is None
+
+    results = {"infer": {"p95_ms": 900.0, "rps": 1.0, "error_rate": 0.0}}
+    thresholds = {"infer": {"max_p95_ms": 1000, "min_rps": 2, "max_error_rate": 0}}
+    assert run_bench.check_thresholds(results, thresholds) == ["infer: rps=1.0 (min 2)"]
+
+    shipped = json.loads((BENCH_DIR / "thresholds.json").read_text())
+    assert set(shipped["scenarios"]) == set(run_bench.SCENARIOS)
@@ -0,0 +1,119 @@
+# tests/test_cache.py
+import asyncio
+import threading
+
+from utils.cache import TwoTierCache, make_key
+
+
+def test_make_key_is_stable():
+    assert make_key("p", {"b": 1, "a": 2}) == make_key("p", {"a": 2, "b": 1})
+    assert make_key("p", 1) != make_key("p", 2)
+
+
+def test_memory_then_disk_tier(tmp_path):
+    cache = TwoTierCache("t", tmp_path / "c.sqlite3", max_entries=1)
+    cache.set("a", {"code": "x"})
+    cache.set("b", {"code": "y"})          # évince "a" du niveau mémoire
+    assert cache.get("b") == {"code": "y"}
+    assert cache.get("a") == {"code": "x"}  # relu depuis SQLite
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1 and stats["disk_hits"] == 1
+    assert cache.get("missing") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_persistence_and_ttl(tmp_path):
+    path = tmp_path / "c.sqlite3"
+    cache = TwoTierCache("t", path)
+    cache.set("k", [1, 2])
+    cache.close()
+    assert TwoTierCache("t", path).get("k") == [1, 2]
+    assert TwoTierCache("t", path, ttl=-1).get("k") is None
+
+
+def test_invalidate_by_tag(tmp_path):
+    cache = TwoTierCache("t", tmp_path / "c.sqlite3")
+    cache.set("a", 1, tag="m1")
+    cache.set("b", 2, tag="m2")
+    cache.invalidate(tag="m1")
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    cache.invalidate()
+    assert cache.get("b") is None
+
+
+def test_async_api_reads_and_writes_sqlite_off_the_loop(tmp_path, monkeypatch):
+    cache = TwoTierCache("t", tmp_path / "c.sqlite3", max_entries=1)
+    loop_thread = threading.get_ident()
+    disk_threads = []
+    for name in ("_disk_get", "_disk_set"):
+        original = getattr(cache, name)
+
+        def spy(*args, _original=original):
+            disk_threads.append(threading.get_ident())
+            return _original(*args)
+
+        monkeypatch.setattr(cache, name, spy)
+
+    async def scenario():
+        await cache.aset("a", {"code": "x"})
+        await cache.aset("b", {"code": "y"})        # évince "a" du niveau mémoire
+        return await cache.aget("b"), await cache.aget("a"), await cache.aget("missing")
+
+    assert asyncio.run(scenario()) == ({"code": "y"}, {"code": "x"}, None)
+    assert len(disk_threads) == 4 and loop_thread not in disk_threads
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["disk_hits"] == 1
+
+
+def test_value_computed_across_invalidate_is_not_cached(tmp_path):
+    cache = TwoTierCache("t", tmp_path / "c.sqlite3")
+    token = cache.generation                       # début de la génération
+    cache.invalidate(tag="m")                      # modèle re‑téléchargé entre‑temps
+    asyncio.run(cache.aset("k", "stale", tag="m", generation=token))
+    cache.set("k2", "stale", tag="m", generation=token)
+    assert cache.get("k") is None and cache.get("k2") is None
+    asyncio.run(cache.aset("k", "fresh", tag="m", generation=cache.generation))
+    assert cache.get("k") == "fresh"
+
+
+def test_infer_does_not_cache_output_generated_across_invalidation(client, monkeypatch):
+    import httpx
+    import main
+    from utils import ollama_client
+
+    calls = []
+
+    def handler(request):
+        if b"generation across invalidation" not in request.content:
+            return httpx.Response(200, json={"response": "", "done": True})
+        calls.append(request)
+        if len(calls) == 1:
+            # Re‑téléchargement du modèle pendant la génération
+            main.completion_cache.invalidate(tag=main.GENERATION_PARAMS["model"])
+        return httpx.Response(200, json={"response": "```python\nx = 1\n```", "done": True})
+
+    monkeypatch.setattr(ollama_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    payload = {"prompt": "generation across invalidation", "language": "python", "latency": "quality"}
+    assert client.post("/v1/infer", json=payload).status_code == 200
+    assert client.post("/v1/infer", json=payload).status_code == 200
+    assert len(calls) == 2                         # 2e appel : pas servi par le cache
+
+
+def test_disk_read_racing_invalidate_does_not_resurrect_entry(tmp_path, monkeypatch):
+    from utils import cache as cache_module
+
+    cache = TwoTierCache("t", tmp_path / "c.sqlite3", max_entries=1)
+    cache.set("a", 1, tag="m")
+    cache.set("b", 2)                              # « a » n’est plus que sur disque
+    loads = cache_module.json.loads
+
+    def racing_loads(raw):
+        cache.invalidate(tag="m")                  # entre la lecture SQLite et la remontée
+        return loads(raw)
+
+    monkeypatch.setattr(cache_module.json, "loads", racing_loads)
+    assert asyncio.run(cache.aget("a")) == 1       # lecture déjà faite : valeur rendue
+    monkeypatch.setattr(cache_module.json, "loads", loads)
+    assert cache.get("a") is None                  # mais pas remise en mémoire
+    asyncio.run(cache.ainvalidate())
+    assert cache.get("b") is None
@@ -0,0 +1,69 @@
+# tests/test_chroma_client.py
+import numpy as np
+
+from utils import chroma_client
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        return np.array([[float(len(t)), 1.0, 0.0] for t in texts])
+
+
+def test_query_embeddings_are_batched_and_memoised(monkeypatch):
+    fake = FakeEmbedder()
+    monkeypatch.setattr(chroma_client, "_embedder", fake)
+    monkeypatch.setattr(
+        chroma_client, "_query_cache", chroma_client._QueryEmbeddingCache(16)
+    )
+
+    first = chroma_client.embed_queries(["foo  bar", "baz", "foo bar"])
+    assert fake.batches == [["baz", "foo bar"]]          # un seul lot, dédoublonné
+    assert first[0] == first[2]
+
+    chroma_client.embed_queries([" foo bar ", "baz"])
+    assert len(fake.batches) == 1                        # servi par le LRU
+
+
+def test_search_uses_resident_embedder(monkeypatch):
+    fake = FakeEmbedder()
+    monkeypatch.setattr(chroma_client, "_embedder", fake)
+    chroma_client.add_documents(["def add(a, b): return a + b"], [{"title": "add"}])
+    results = chroma_client.search_kb("def add(a, b): return a + b", k=1)
+    assert results[0]["title"] == "add"
+    assert chroma_client._get_collection() is chroma_client._get_collection()
+
+
+def test_search_batch_single_embedding_pass(monkeypatch):
+    fake = FakeEmbedder()
+    monkeypatch.setattr(chroma_client, "_embedder", fake)
+    monkeypatch.setattr(
+        chroma_client, "_query_cache", chroma_client._QueryEmbeddingCache(16)
+    )
+    chroma_client.add_documents(["x = 1", "yy = 22", "zzz = 333"])
+    fake.batches.clear()
+
+    results = chroma_client.search_kb_batch([("x = 1", 1), ("zzz = 333", 3)])
+    assert len(fake.batches) == 1
+    assert [len(r) for r in results] == [1, 3]
+    assert results[0][0]["snippet"] == "x = 1"
+
+
+def test_lexical_and_hybrid_modes(monkeypatch):
+    fake = FakeEmbedder()
+    monkeypatch.setattr(chroma_client, "_embedder", fake)
+    chroma_client.add_documents(
+        ["def frobnicate_widget(x): return x", "def other(): pass"],
+        [{"title": "frob"}, {"title": "other"}],
+    )
+    fake.batches.clear()
+
+    results = chroma_client.search_kb("frobnicate_widget", k=1, mode="auto")
+    assert results[0]["title"] == "frob" and results[0]["score"] == 1.0
+    assert fake.batches == []                     # chemin lexical : pas d’embedding
+
+    hybrid = chroma_client.search_kb("frobnicate widget", k=2, mode="hybrid")
+    assert hybrid[0]["title"] == "frob"
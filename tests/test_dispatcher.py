@@ -0,0 +1,78 @@
+# tests/test_dispatcher.py
+import asyncio
+
+import pytest
+
+from utils.dispatcher import OllamaDispatcher, QueueFullError
+
+
+def test_identical_requests_are_coalesced():
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "code"
+
+    async def scenario():
+        d = OllamaDispatcher(max_concurrency=4)
+        results = await asyncio.gather(*(d.run("same", upstream) for _ in range(5)))
+        return d, results
+
+    d, results = asyncio.run(scenario())
+    assert results == ["code"] * 5
+    assert len(calls) == 1
+    assert d.stats()["coalesced"] == 4
+
+
+def test_concurrency_bound_and_priority_order():
+    order = []
+
+    async def scenario():
+        d = OllamaDispatcher(max_concurrency=1)
+        running = 0
+        peak = 0
+
+        async def job(name, priority):
+            async def upstream():
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                order.append(name)
+                running -= 1
+                return name
+            return await d.run(name, upstream, priority=priority)
+
+        first = asyncio.create_task(job("first", 0))
+        await asyncio.sleep(0.001)
+        batch = asyncio.create_task(job("batch", 10))
+        await asyncio.sleep(0.001)
+        interactive = asyncio.create_task(job("interactive", 0))
+        await asyncio.sleep(0.001)
+        assert d.stats()["queue_depth"] == 2
+        await asyncio.gather(first, batch, interactive)
+        return peak
+
+    assert asyncio.run(scenario()) == 1
+    assert order == ["first", "interactive", "batch"]
+
+
+def test_queue_full_is_rejected():
+    async def scenario():
+        d = OllamaDispatcher(max_concurrency=1, max_queue=1)
+        gate = asyncio.Event()
+
+        async def upstream():
+            await gate.wait()
+            return "ok"
+
+        t1 = asyncio.create_task(d.run("a", upstream))
+        t2 = asyncio.create_task(d.run("b", upstream))
+        await asyncio.sleep(0.01)
+        with pytest.raises(QueueFullError):
+            await d.run("c", upstream)
+        gate.set()
+        return await asyncio.gather(t1, t2)
+
+    assert asyncio.run(scenario()) == ["ok", "ok"]
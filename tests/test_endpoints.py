@@ -19,4 +19,61 @@ def test_infer_success(client):
 def test_search_empty(client):
     r = client.get("/v1/search", params={"q": "nothing", "k": 3})
     assert r.status_code == 200
-    assert "results" in r.json()
\ No newline at end of file
+    assert "results" in r.json()
+
+def _fake_sandbox(monkeypatch):
+    import asyncio
+    from utils import sandbox_client
+
+    running = {"now": 0, "peak": 0}
+
+    async def fake_run(code, language):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return ("passed" if code.startswith("ok") else "failed"), code, 10
+
+    async def fake_version(language):
+        return "test"
+
+    monkeypatch.setattr(sandbox_client, "run_tests_in_sandbox", fake_run)
+    monkeypatch.setattr(sandbox_client, "runtime_version", fake_version)
+    return running
+
+def test_run_tests_batch_streams_ndjson(client, monkeypatch):
+    import json
+
+    running = _fake_sandbox(monkeypatch)
+    monkeypatch.setenv("SANDBOX_BATCH_PARALLELISM", "2")
+    items = [
+        {"code": f"{'ok' if i % 2 else 'ko'}-batch-{i}", "language": "python"}
+        for i in range(6)
+    ]
+    r = client.post("/v1/run-tests/batch", json={"items": items})
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == list(range(6))
+    assert all(line["result"]["status"] == ("passed" if line["index"] % 2 else "failed")
+               for line in lines)
+    assert running["peak"] == 2
+
+def test_run_tests_batch_uses_cache(client, monkeypatch):
+    import json
+
+    _fake_sandbox(monkeypatch)
+    items = [
+        {"code": f"{'ok' if i % 2 else 'ko'}-cache-{i}", "language": "python"}
+        for i in range(4)
+    ]
+    r = client.post("/v1/run-tests/batch", json={"items": items})
+    assert not any(json.loads(line)["result"]["cached"] for line in r.text.splitlines())
+
+    # Deuxième passage : tout vient du cache, durée d’origine conservée
+    r = client.post("/v1/run-tests/batch", json={"items": items})
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert all(line["result"]["cached"] for line in lines)
+    assert all(line["result"]["duration_ms"] == 10 for line in lines)
+    # no_cache force une nouvelle exécution
+    r = client.post("/v1/run-tests", json=dict(items[0], no_cache=True))
+    assert r.json()["cached"] is False
@@ -0,0 +1,75 @@
+# tests/test_file_context.py
+import os
+
+from utils import file_context
+from utils.file_context import FileContextCache
+
+
+def test_python_ast_extraction(tmp_path):
+    source = tmp_path / "mod.py"
+    source.write_text(
+        "import os, sys\n"
+        "from .utils import helper\n"
+        "try:\n    import numpy as np\nexcept ImportError:\n    np = None\n\n"
+        "class Model(Base):\n    def method(self): pass\n\n"
+        "async def fetch(url: str, *, retries=3) -> bytes:\n    import json\n"
+    )
+    ctx = FileContextCache().get(str(source))
+    assert ctx["imports"] == ["os", "sys", ".utils", "numpy"]
+    assert ctx["symbols"] == [
+        "class Model(Base)",
+        "async def fetch(url: str, *, retries=3) -> bytes",
+    ]
+
+
+def test_regex_extractors_and_broken_python(tmp_path):
+    ts = tmp_path / "app.ts"
+    ts.write_text(
+        "import { x } from './x';\nconst fs = require('fs');\n\n"
+        "export interface Opts { a: number }\n"
+        "export async function run(opts: Opts): Promise<void> {\n}\n"
+        "import late from 'late';\n"
+    )
+    ctx = FileContextCache().get(str(ts))
+    assert ctx["imports"] == ["./x", "fs"]            # arrêt à la première définition
+    assert ctx["symbols"][0] == "export interface Opts"
+    assert ctx["symbols"][1].startswith("export async function run(opts: Opts)")
+
+    broken = tmp_path / "wip.py"
+    broken.write_text("import os\ndef half(a, b):\n    return (\n")
+    ctx = FileContextCache().get(str(broken))
+    assert ctx["imports"] == ["os"] and ctx["symbols"] == ["def half(a, b)"]
+
+
+def test_large_file_uses_mmap_and_stops_at_symbol_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_context, "FILE_CONTEXT_MMAP_BYTES", 1024)
+    monkeypatch.setattr(file_context, "FILE_CONTEXT_MAX_SYMBOLS", 5)
+    big = tmp_path / "gen.py"
+    big.write_text("import os\n" + "".join(f"def f{i}(x):\n    return x\n" for i in range(5000)))
+    ctx = FileContextCache().get(str(big))
+    assert ctx["imports"] == ["os"]
+    assert ctx["symbols"] == [f"def f{i}(x)" for i in range(5)]
+
+
+def test_cache_skips_disk_until_file_changes(tmp_path, monkeypatch):
+    source = tmp_path / "a.r"
+    source.write_text("library(dplyr)\nf <- function(x) x\n")
+    cache = FileContextCache(stat_ttl=60)
+    first = cache.get(str(source))
+    assert first["imports"] == ["dplyr"] and first["symbols"] == ["f <- function(x)"]
+
+    def no_disk(*args, **kwargs):
+        raise AssertionError("disk access")
+
+    monkeypatch.setattr(file_context, "_extract", no_disk)
+    assert cache.get(str(source)) is first                 # ni stat ni lecture
+
+    cache.stat_ttl = 0                                      # stat, mais pas de relecture
+    assert cache.get(str(source)) is first
+    monkeypatch.undo()
+
+    source.write_text("library(ggplot2)\n")
+    st = source.stat()
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.get(str(source))["imports"] == ["ggplot2"]
+    assert cache.hits == 2 and cache.misses == 2
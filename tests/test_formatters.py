@@ -0,0 +1,76 @@
+# tests/test_formatters.py
+import asyncio
+import sys
+
+import pytest
+
+from utils import formatters
+from utils.formatters import CommandFormatter, PoolFormatter, format_code
+
+
+def _py(script):
+    return [sys.executable, "-c", script]
+
+
+UPPER = _py("import sys; sys.stdout.write(sys.stdin.read().upper())")
+SLOW = _py("import sys, time; time.sleep(5); sys.stdout.write(sys.stdin.read())")
+REJECT = _py("import sys; sys.stderr.write('bad input at 1:1\\n'); sys.exit(2)")
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(formatters, "_cache", formatters.OrderedDict())
+    monkeypatch.setattr(formatters, "_stats", dict.fromkeys(formatters._stats, 0))
+    monkeypatch.setattr(formatters, "_pending", 0)
+
+
+def _register(monkeypatch, formatter, language="bash"):
+    monkeypatch.setitem(formatters.FORMATTERS, language, formatter)
+
+
+def test_command_formatter_and_cache(monkeypatch):
+    _register(monkeypatch, CommandFormatter("upper", [["no-such-binary"], UPPER]))
+
+    async def scenario():
+        first = await format_code("echo hi\n", "bash")
+        second = await format_code("echo hi\n", "bash")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second == ("ECHO HI\n", None)
+    assert formatters.formatter_stats()["cache_hits"] == 1
+
+
+def test_timeout_and_error_fall_back_to_raw_code(monkeypatch):
+    monkeypatch.setenv("FORMAT_TIMEOUT_BASH", "0.3")
+    _register(monkeypatch, CommandFormatter("slow", [SLOW]))
+    assert asyncio.run(format_code("x\n", "bash")) == ("x\n", None)
+    assert formatters.formatter_stats()["timeouts"] == 1
+
+    _register(monkeypatch, CommandFormatter("reject", [REJECT]))
+    code, warning = asyncio.run(format_code("x\n", "bash"))
+    assert code == "x\n" and "bad input at 1:1" in warning
+
+
+def test_saturated_pool_returns_unformatted(monkeypatch):
+    monkeypatch.setenv("FORMAT_TIMEOUT_BASH", "5")
+    monkeypatch.setattr(formatters, "FORMAT_MAX_PENDING", 1)
+    _register(monkeypatch, CommandFormatter("slow", [SLOW]))
+
+    async def scenario():
+        first = asyncio.create_task(format_code("a\n", "bash"))
+        await asyncio.sleep(0.05)
+        skipped = await format_code("b\n", "bash")
+        first.cancel()
+        return skipped
+
+    assert asyncio.run(scenario()) == ("b\n", None)
+    assert formatters.formatter_stats()["skipped"] == 1
+
+
+def test_pool_formatter_runs_out_of_process(monkeypatch):
+    _register(monkeypatch, PoolFormatter("upper", str.upper), language="sql")
+    try:
+        assert asyncio.run(format_code("select 1;", "sql")) == ("SELECT 1;", None)
+    finally:
+        formatters.shutdown_pool()
@@ -0,0 +1,128 @@
+# tests/test_ingest.py
+import os
+import time
+
+import numpy as np
+import pytest
+
+from utils import chroma_client
+from utils.ingest import chunk_source, ingest_directory
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def encode(self, texts, **kwargs):
+        self.texts.extend(texts)
+        return np.array([[float(len(t)), 1.0, 0.0] for t in texts])
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    embedder = FakeEmbedder()
+    monkeypatch.setattr(chroma_client, "_embedder", embedder)
+    return embedder
+
+
+def _touch_later(path):
+    st = path.stat()
+    os.utime(path, (st.st_atime, st.st_mtime + 5))
+
+
+def _kb_ids(source):
+    got = chroma_client._get_collection().get(where={"source": source})
+    return set(got["ids"])
+
+
+def test_chunk_source_splits_on_top_level_units():
+    text = "import os\n\n@decorator\ndef a():\n    return 1\n\nclass B:\n    pass\n"
+    chunks = chunk_source(text, "python", max_chars=40)
+    starts = [start for start, _, _ in chunks]
+    assert starts == [1, 3, 7]                 # le décorateur reste avec sa fonction
+    assert chunks[1][2].startswith("@decorator\ndef a()")
+
+
+def test_incremental_reindex(tmp_path, fake):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "a.py").write_text("def a():\n    return 1\n")
+    (repo / "b.sh").write_text("greet() {\n  echo hi\n}\n")
+    (repo / "notes.bin").write_text("ignored")
+    manifest = tmp_path / "manifest.sqlite3"
+    run = lambda: ingest_directory(str(repo), source="t-inc", manifest_path=manifest,
+                                   batch_size=1, workers=2)
+
+    stats = run()
+    assert stats["files_seen"] == 2 and stats["files_changed"] == 2
+    assert stats["chunks_added"] == 2
+    initial = _kb_ids("t-inc")
+    assert len(initial) == 2
+
+    # Aucun changement : rien n’est relu ni réembeddé
+    embedded = len(fake.texts)
+    stats = run()
+    assert stats["files_unchanged"] == 2 and stats["chunks_added"] == 0
+    assert len(fake.texts) == embedded
+
+    # Seul le fichier modifié est retraité
+    (repo / "a.py").write_text("def a():\n    return 2\n")
+    _touch_later(repo / "a.py")
+    stats = run()
+    assert stats["files_changed"] == 1
+    assert stats["chunks_added"] == 1 and stats["chunks_deleted"] == 1
+    assert fake.texts[-1] == "def a():\n    return 2\n"
+    assert len(_kb_ids("t-inc") & initial) == 1
+
+    # Fichier supprimé → ses blocs disparaissent de la KB
+    (repo / "b.sh").unlink()
+    stats = run()
+    assert stats["files_deleted"] == 1 and stats["chunks_deleted"] == 1
+    assert len(_kb_ids("t-inc")) == 1
+
+
+def test_touched_but_identical_file_is_not_reembedded(tmp_path, fake):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "m.sql").write_text("SELECT 1;\nSELECT 2;\n")
+    manifest = tmp_path / "manifest.sqlite3"
+    ingest_directory(str(repo), source="t-touch", manifest_path=manifest)
+    embedded = len(fake.texts)
+
+    _touch_later(repo / "m.sql")
+    stats = ingest_directory(str(repo), source="t-touch", manifest_path=manifest)
+    assert stats["files_unchanged"] == 1 and stats["chunks_added"] == 0
+    assert len(fake.texts) == embedded
+
+
+def test_ingest_endpoint_runs_as_job(client, tmp_path, fake, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "INGEST_ALLOWED_ROOTS", [tmp_path.resolve()])
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "x.py").write_text("def x():\n    pass\n")
+    resp = client.post("/v1/ingest", json={"path": str(repo), "source": "t-api"})
+    assert resp.status_code == 202
+    job_id = resp.json()["job_id"]
+
+    for _ in range(100):
+        status = client.get(f"/v1/ingest/{job_id}").json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(0.05)
+    assert status["status"] == "done", status
+    assert status["progress"]["chunks_added"] == 1
+    assert client.get("/v1/ingest/unknown").status_code == 404
+
+
+def test_ingest_endpoint_rejects_paths_outside_roots(client, tmp_path, monkeypatch):
+    import main
+    allowed, other = tmp_path / "allowed", tmp_path / "other"
+    allowed.mkdir()
+    other.mkdir()
+    monkeypatch.setattr(main, "INGEST_ALLOWED_ROOTS", [])
+    assert client.post("/v1/ingest", json={"path": str(allowed)}).status_code == 403
+
+    monkeypatch.setattr(main, "INGEST_ALLOWED_ROOTS", [allowed.resolve()])
+    assert client.post("/v1/ingest", json={"path": str(other)}).status_code == 403
+    assert client.post("/v1/ingest", json={"path": str(allowed / "..")}).status_code == 403
@@ -0,0 +1,60 @@
+# tests/test_lexical_index.py
+from utils.lexical_index import LexicalIndex, tokenize
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("parseConfig(load_file)") == [
+        "parseconfig", "parse", "config", "load_file", "load", "file",
+    ]
+
+
+def test_bm25_ranks_identifier_matches(tmp_path):
+    index = LexicalIndex(tmp_path / "idx")
+    index.add(
+        ["a", "b", "c"],
+        [
+            "def parse_config(path): return load(path)",
+            "def render(template): return template",
+            "raise ConfigError('E1234 invalid config')",
+        ],
+    )
+    assert index.search("parse_config", 2)[0][0] == "a"
+    assert index.search("E1234", 5) == [("c", index.search("E1234", 5)[0][1])]
+    assert index.search("nothing_matches", 5) == []
+
+
+def test_journal_and_compaction_survive_reload(tmp_path):
+    path = tmp_path / "idx"
+    index = LexicalIndex(path, compact_every=2)
+    index.add(["a", "b"], ["alpha beta", "beta gamma"])     # → compaction
+    index.add(["c"], ["gamma delta"])                       # reste dans le journal
+    index.delete(["a"])
+
+    reloaded = LexicalIndex(path)
+    assert len(reloaded) == 2
+    assert reloaded.search("alpha", 5) == []
+    assert [doc for doc, _ in reloaded.search("gamma", 5)] in (["b", "c"], ["c", "b"])
+
+    reloaded.add(["b"], ["epsilon"])                        # réindexation d’un doc du segment
+    reloaded.compact()
+    again = LexicalIndex(path)
+    assert [doc for doc, _ in again.search("gamma", 5)] == ["c"]
+    assert again.search("epsilon", 5)[0][0] == "b"
+    assert len(list(path.glob("segment-*"))) == 1
+
+
+def test_instances_sharing_directory_see_each_other(tmp_path):
+    path = tmp_path / "idx"
+    api = LexicalIndex(path)
+    api.add(["a"], ["alpha"])
+    cli = LexicalIndex(path)                                # autre processus (ingest_kb.py)
+    cli.add(["b"], ["beta"])
+    assert api.search("beta", 5)[0][0] == "b"               # fin de journal rejouée
+
+    api.flush()                                             # ne perd pas l’ajout de `cli`
+    cli.add(["c"], ["gamma"])                               # segment rechargé avant d’écrire
+    cli.flush()
+    fresh = LexicalIndex(path)
+    assert len(fresh) == 3
+    assert {doc for q in ("alpha", "beta", "gamma") for doc, _ in fresh.search(q, 5)} == {"a", "b", "c"}
+    assert api.search("gamma", 5)[0][0] == "c"
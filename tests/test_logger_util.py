@@ -0,0 +1,51 @@
+# tests/test_logger_util.py
+import pytest
+from loguru import logger
+
+import logger_util
+from logger_util import cap_payload, log_error, log_request, log_response
+
+
+_ENDPOINTS = ("search", "infer")
+
+
+@pytest.fixture
+def records():
+    # Seuls les journaux des endpoints testés : d’autres tâches (lifespan de la
+    # session de tests) peuvent écrire dans le même logger en parallèle
+    captured = []
+    sink = logger.add(
+        lambda message: captured.append(message.record),
+        level="INFO",
+        filter=lambda record: record["extra"].get("endpoint") in _ENDPOINTS,
+    )
+    yield captured
+    logger.remove(sink)
+
+
+def test_cap_payload_truncates_with_length_and_hash(monkeypatch):
+    monkeypatch.setattr(logger_util, "LOG_MAX_FIELD_CHARS", 8)
+    monkeypatch.setattr(logger_util, "LOG_MAX_ITEMS", 2)
+    capped = cap_payload({"code": "x" * 100, "ok": "short", "items": [1, 2, 3]})
+    assert capped["code"]["preview"] == "x" * 8
+    assert capped["code"]["length"] == 100 and len(capped["code"]["sha256"]) == 16
+    assert capped["ok"] == "short"
+    assert "items" not in capped and capped["_omitted"] == 1
+    assert cap_payload([1, 2, 3]) == [1, 2, {"_omitted": 1}]
+
+
+def test_sampling_drops_success_logs_but_keeps_errors_and_slow(monkeypatch, records):
+    monkeypatch.setattr(logger_util, "LOG_SAMPLE_RATES", {"search": 0.0})
+    log_request("search", {"q": "x"})
+    log_response("search", {"results": []}, 12)
+    log_response("search", {"results": []}, logger_util.LOG_ALWAYS_SLOW_MS + 1)
+    log_error("search", "boom")
+    assert [(r["message"], r["extra"]["endpoint"]) for r in records] == [
+        ("response", "search"), ("error", "search"),
+    ]
+
+    records.clear()
+    log_request("infer", {"prompt": "y"})
+    log_response("infer", {"code": "z"}, 5)
+    assert [r["message"] for r in records] == ["request", "response"]
+    assert records[0]["extra"]["sample_rate"] == 1.0
@@ -0,0 +1,61 @@
+# tests/test_metrics.py
+import pytest
+
+from utils.metrics import Counter, Histogram, Registry, stage, observe_generation, \
+    STAGE_SECONDS, STAGE_ERRORS, OLLAMA_TOKENS, OLLAMA_TOKENS_PER_SECOND, OLLAMA_TTFT
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    hist = registry.register(Histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1)))
+    for value in (0.05, 0.5, 0.7, 3):
+        hist.observe(value, stage="a")
+    text = registry.render()
+    assert "# TYPE t_seconds histogram" in text
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 't_seconds_bucket{stage="a",le="1"} 3' in text
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 4' in text
+    assert 't_seconds_count{stage="a"} 4' in text
+    assert 't_seconds_sum{stage="a"} 4.25' in text
+
+
+def test_labels_are_checked_and_escaped():
+    registry = Registry()
+    counter = registry.register(Counter("t_total", "test", ("endpoint",)))
+    with pytest.raises(ValueError):
+        counter.inc(model="x")
+    counter.inc(endpoint='a"b')
+    assert 't_total{endpoint="a\\"b"} 1' in registry.render()
+
+
+def test_stage_counts_errors():
+    before = STAGE_ERRORS.value(stage="unit-test")
+    with pytest.raises(RuntimeError):
+        with stage("unit-test", language="python"):
+            raise RuntimeError("boom")
+    assert STAGE_ERRORS.value(stage="unit-test") == before + 1
+    assert STAGE_SECONDS.count(stage="unit-test", language="python", model="") == 1
+
+
+def test_observe_generation_uses_ollama_stats():
+    observe_generation("unit-model", {
+        "eval_count": 50, "eval_duration": 2_000_000_000,
+        "prompt_eval_count": 20, "prompt_eval_duration": 300_000_000, "load_duration": 0,
+    })
+    assert OLLAMA_TOKENS.value(model="unit-model", kind="generated") == 50
+    assert OLLAMA_TOKENS_PER_SECOND.count(model="unit-model") == 1
+    assert OLLAMA_TTFT.count(model="unit-model") == 1
+
+
+def test_metrics_endpoint(client):
+    client.get("/healthz")
+    client.get("/v1/ingest/does-not-exist")
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    assert 'chloe_http_requests_total{method="GET",endpoint="/healthz",status="200"}' in text
+    # Gabarit de route, pas l’identifiant : cardinalité bornée
+    assert 'endpoint="/v1/ingest/{job_id}",status="404"' in text
+    assert 'chloe_ollama_dispatcher{stat="queue_depth"}' in text
+    assert "/metrics" not in text.split("chloe_http_requests_total", 1)[1].split("# HELP", 1)[0]
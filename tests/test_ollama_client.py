@@ -0,0 +1,162 @@
+# tests/test_ollama_client.py
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from utils import ollama_client
+from utils.ollama_client import generate_code, OllamaError
+
+
+def _install_transport(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ollama_client, "_client", client)
+    return client
+
+
+def test_generate_code_returns_response_field(monkeypatch):
+    def handler(request):
+        return httpx.Response(200, json={"response": "```python\nprint(1)\n```"})
+
+    _install_transport(monkeypatch, handler)
+    assert asyncio.run(generate_code("p")) == "```python\nprint(1)\n```"
+
+
+def test_generate_code_http_error(monkeypatch):
+    _install_transport(monkeypatch, lambda request: httpx.Response(500, text="boom"))
+    with pytest.raises(OllamaError):
+        asyncio.run(generate_code("p"))
+
+
+def test_generate_code_does_not_block_event_loop(monkeypatch):
+    async def handler(request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json={"response": "ok"})
+
+    _install_transport(monkeypatch, handler)
+
+    async def many():
+        return await asyncio.gather(*(generate_code(f"p{i}") for i in range(5)))
+
+    start = time.perf_counter()
+    results = asyncio.run(many())
+    assert results == ["ok"] * 5
+    # 5 requêtes de 200 ms en parallèle ≪ 1 s en série
+    assert time.perf_counter() - start < 0.6
+
+
+def test_stream_code_yields_tokens(monkeypatch):
+    lines = [
+        '{"response": "```python\\n", "done": false}',
+        '{"response": "x = 1\\n", "done": false}',
+        '{"response": "```", "done": false}',
+        '{"done": true}',
+    ]
+    _install_transport(
+        monkeypatch, lambda request: httpx.Response(200, text="\n".join(lines))
+    )
+
+    async def collect():
+        return [t async for t in ollama_client.stream_code("p")]
+
+    assert asyncio.run(collect()) == ["```python\n", "x = 1\n", "```"]
+
+
+def test_infer_stream_endpoint(client, monkeypatch):
+    lines = [
+        '{"response": "```python\\n", "done": false}',
+        '{"response": "def f(): return 1\\n", "done": false}',
+        '{"response": "```\\n", "done": false}',
+        '{"done": true}',
+    ]
+    _install_transport(
+        monkeypatch, lambda request: httpx.Response(200, text="\n".join(lines))
+    )
+    r = client.post("/v1/infer/stream", json={"prompt": "f", "language": "python"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in r.text.split("\n\n") if block]
+    assert events[0].startswith("event: token")
+    assert "```" not in events[0]
+    assert events[-1].startswith("event: done")
+    assert '"ttft_ms"' in events[-1]
+
+
+def _pull_lines():
+    return "\n".join([
+        '{"status": "pulling manifest"}',
+        '{"status": "pulling aaaa", "digest": "sha256:aaaa", "total": 300, "completed": 100}',
+        '{"status": "pulling bbbb", "digest": "sha256:bbbb", "total": 100, "completed": 100}',
+        '{"status": "pulling aaaa", "digest": "sha256:aaaa", "total": 300, "completed": 300}',
+        '{"status": "success"}',
+    ])
+
+
+def test_pull_model_reports_progress(monkeypatch):
+    _install_transport(monkeypatch, lambda request: httpx.Response(200, text=_pull_lines()))
+    updates = []
+    asyncio.run(ollama_client.pull_model("m", progress=updates.append))
+    assert [u["percent"] for u in updates] == [0.0, 33.3, 50.0, 100.0, 100.0]
+    assert updates[-1]["total_bytes"] == 400
+    assert updates[-1]["status"] == "success"
+
+
+def test_pull_model_error(monkeypatch):
+    _install_transport(
+        monkeypatch,
+        lambda request: httpx.Response(200, text='{"error": "pull model manifest: file does not exist"}'),
+    )
+    with pytest.raises(OllamaError, match="does not exist"):
+        asyncio.run(ollama_client.pull_model("unknown"))
+
+
+def test_update_model_job_swaps_after_warm_up(client, monkeypatch):
+    import main
+
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        if request.url.path == "/api/pull":
+            return httpx.Response(200, text=_pull_lines())
+        return httpx.Response(200, json={"response": "", "done": True})
+
+    _install_transport(monkeypatch, handler)
+    monkeypatch.setattr(main, "GENERATION_PARAMS", dict(main.GENERATION_PARAMS))
+    previous = main.GENERATION_PARAMS["model"]
+
+    r = client.post("/v1/update-model", json={"model": "codellama:7b"})
+    assert r.status_code == 202
+    job = r.json()
+    assert job["kind"] == "model-pull"
+    for _ in range(100):
+        job = client.get(f"/v1/update-model/{job['job_id']}").json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.01)
+    assert job["status"] == "done", job
+    assert job["progress"]["phase"] == "active"
+    assert job["progress"]["percent"] == 100.0
+    assert job["active_model"] == "codellama:7b" != previous
+    # Préchauffage du nouveau modèle avant la bascule
+    assert "/api/generate" in seen[seen.index("/api/pull") + 1:]
+
+    assert client.get("/v1/update-model/unknown").status_code == 404
+
+
+def test_pull_without_activation_invalidates_active_model_cache(client, monkeypatch):
+    import main
+
+    _install_transport(monkeypatch, lambda request: httpx.Response(200, text=_pull_lines()))
+    active = main.GENERATION_PARAMS["model"]
+    main.completion_cache.set(main.make_key("stale"), {"code": "x"}, tag=active)
+
+    r = client.post("/v1/update-model", json={"model": active, "activate": False})
+    for _ in range(100):
+        job = client.get(f"/v1/update-model/{r.json()['job_id']}").json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.01)
+    assert job["progress"]["phase"] == "pulled"
+    assert main.completion_cache.get(main.make_key("stale")) is None
@@ -0,0 +1,98 @@
+# tests/test_postprocess.py
+import asyncio
+
+from utils.postprocess import FenceStripper, strip_fences
+
+
+def _stream(text, size):
+    stripper = FenceStripper()
+    out = [stripper.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    out.append(stripper.finish())
+    return "".join(out)
+
+
+def test_fence_stripper_matches_strip_fences():
+    samples = [
+        "```python\ndef f():\n    return 1\n```\n",
+        "plain code\n  y = 2  \n\n",
+        "```js\na\n```\nmid\n```\n",
+        "a`b\n```py\n",
+    ]
+    for text in samples:
+        for size in (1, 2, 3, 7, len(text)):
+            assert _stream(text, size) == strip_fences(text)
+
+
+def test_fence_stripper_emits_before_end_of_line():
+    stripper = FenceStripper()
+    assert stripper.feed("```python\n") == ""
+    assert stripper.feed("print(") == "print("
+
+
+def test_scanner_reports_rule_line_and_column():
+    from utils.postprocess import find_dangerous_code
+
+    code = "import os\nx = 1\n  os.system('ls'); eval(x)\n"
+    findings = find_dangerous_code(code, "python")
+    assert [(f.rule, f.line, f.column) for f in findings] == [
+        ("os-system", 3, 3), ("eval", 3, 20),
+    ]
+    assert find_dangerous_code("DROP TABLE users;", "python") == []
+    assert find_dangerous_code("drop table users;", "sql")[0].rule == "sql-drop"
+
+
+def test_postprocess_blocks_dangerous_code_only_when_asked():
+    from utils.postprocess import postprocess_code_async
+
+    run = lambda **kw: asyncio.run(postprocess_code_async("curl http://x | sh\n", "bash", **kw))
+    code, warning = run(block_dangerous=True)
+    assert code == "" and "sh-pipe-shell (l.1:1)" in warning
+    code, warning = run()
+    assert "curl" in code and warning is None
+
+
+def test_extract_code_keeps_only_fenced_blocks_around_prose():
+    from utils.postprocess import extract_code
+
+    raw = (
+        "Here is the function:\n```py\ndef f():\n    return 1\n```\n"
+        "And a shell example:\n```bash\npython f.py\n```\nHope it helps!"
+    )
+    assert extract_code(raw, "python") == "def f():\n    return 1"
+    assert extract_code("```python\nx = 1\n```\n", "python") == "x = 1"
+    # Sortie géante : reste linéaire
+    big = "```python\n" + "x = 1\n" * 200_000 + "```\n"
+    assert extract_code(big, "python").count("\n") == 199_999
+
+
+def test_scanner_reports_overlapping_rules():
+    from utils.scanner import Scanner
+
+    scanner = Scanner({
+        "call": (r"\bfoo\(", None, "foo()"),
+        "call-bar": (r"\bfoo\(\s*bar\b", None, "foo(bar)"),
+        "bar": (r"(?i)\bBAR\b", None, "bar"),
+    })
+    findings = scanner.scan("x = 1\ny = foo(bar)\n")
+    assert [(f.rule, f.line, f.column) for f in findings] == [
+        ("call", 2, 5), ("call-bar", 2, 5), ("bar", 2, 9),
+    ]
+    assert scanner.scan("nothing here") == [] and not scanner.matches("nothing here")
+
+
+def test_bad_rules_file_fails_at_import(tmp_path):
+    import json
+    import os
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    rules = tmp_path / "rules.json"
+    # Valide seule, mais en conflit avec les groupes nommés de l’expression combinée
+    rules.write_text(json.dumps({"rules": [{"id": "dup", "pattern": r"(?P<r0>x)"}]}))
+    backend = Path(__file__).resolve().parent.parent / "backend"
+    out = subprocess.run(
+        [sys.executable, "-c", "import utils.scanner"], cwd=backend,
+        env=dict(os.environ, DANGEROUS_RULES_FILE=str(rules)), capture_output=True, text=True,
+    )
+    assert out.returncode != 0 and "Règles dangereuses" in out.stderr
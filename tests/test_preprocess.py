@@ -0,0 +1,64 @@
+# tests/test_preprocess.py
+import asyncio
+
+from utils import chroma_client, preprocess, tokens
+from utils.tokens import count_tokens
+
+
+def _snippet(title, score, lines=3):
+    body = "\n".join(f"value_{title}_{i} = {i}" for i in range(lines))
+    return {"title": title, "snippet": body, "url": None, "score": score}
+
+
+def test_build_prompt_keeps_legacy_layout(tmp_path):
+    source = tmp_path / "script.py"
+    source.write_text("import os\n")
+    prompt = preprocess.build_prompt("write  a\tfunction", str(source), "python")
+    assert prompt.startswith("You are a senior software engineer specialized in python.")
+    assert "The user is editing the file **script.py**.\nThe current file imports: os.\n" in prompt
+    assert prompt.endswith("\nUser request:\nwrite a function")
+
+
+def test_pack_drops_lowest_scoring_snippets_first():
+    ctx = {"filename": "a.py", "imports": ["os"]}
+    snippets = [_snippet("low", 0.1), _snippet("high", 0.9), _snippet("mid", 0.5)]
+    full, full_tokens = preprocess._pack("do it", "python", ctx, snippets, 10_000)
+    assert full_tokens == count_tokens(full)
+    assert full.index("### low") < full.index("### mid")   # ordre de recherche conservé
+
+    # Marge : les comptes par morceau ne s’additionnent pas exactement
+    budget = full_tokens - count_tokens(preprocess._snippet_block(snippets[0])) + 8
+    packed, tokens = preprocess._pack("do it", "python", ctx, snippets, budget)
+    assert tokens <= budget
+    assert "### high" in packed and "### mid" in packed and "### low" not in packed
+    assert "**a.py**" in packed and packed.endswith("User request:\ndo it")
+
+
+def test_pack_truncates_last_snippet_and_never_drops_request():
+    big = _snippet("big", 0.8, lines=400)
+    packed, tokens = preprocess._pack("do it", None, {"filename": None, "imports": []}, [big], 300)
+    assert tokens <= 300
+    assert "### big" in packed and "value_big_399" not in packed
+    tiny, _ = preprocess._pack("do it", None, {"filename": None, "imports": []}, [big], 5)
+    assert "### big" not in tiny and tiny.endswith("User request:\ndo it")
+
+
+def test_assemble_prompt_uses_kb_and_survives_failures(monkeypatch):
+    monkeypatch.setattr(chroma_client, "search_kb", lambda q, k, mode: [_snippet("kb", 0.7)])
+    prompt, tokens = asyncio.run(preprocess.assemble_prompt("sum a list", use_kb=True))
+    assert "### kb" in prompt and tokens == count_tokens(prompt)
+
+    def broken(q, k, mode):
+        raise RuntimeError("no embedder")
+
+    monkeypatch.setattr(chroma_client, "search_kb", broken)
+    prompt, _ = asyncio.run(preprocess.assemble_prompt("sum a list", use_kb=True))
+    assert "knowledge base" not in prompt
+
+
+def test_token_estimate_applies_safety_margin(monkeypatch):
+    monkeypatch.setattr(tokens, "_loaded", True)
+    monkeypatch.setattr(tokens, "_tokenizer", None)
+    monkeypatch.setattr(tokens, "CHARS_PER_TOKEN", 3.5)
+    monkeypatch.setattr(tokens, "TOKEN_ESTIMATE_MARGIN", 1.25)
+    assert count_tokens("x" * 35) == 13       # 10 tokens estimés, majorés de 25 %
@@ -0,0 +1,66 @@
+# tests/test_router.py
+import asyncio
+import json
+
+import httpx
+
+from utils import ollama_client
+from utils.router import ModelRouter, validate_output
+
+FAST = [("tiny-coder", 256)]
+ACTIVE = "llama2:13b-chat-q4_0"
+PARAMS = {"model": ACTIVE, "max_tokens": 64, "temperature": 0.0}
+
+
+def _plan(router, **kwargs):
+    defaults = {"prompt_tokens": 100, "language": "python", "latency": "balanced"}
+    return router.plan(ACTIVE, **dict(defaults, **kwargs))
+
+
+def test_plan_rules():
+    router = ModelRouter(FAST, ["python"], explore_every=0)
+    assert ModelRouter([], ["python"]).plan(ACTIVE, prompt_tokens=10, language="python") == ([ACTIVE], "single")
+    assert _plan(router, latency="quality") == ([ACTIVE], "quality")
+    assert _plan(router, language="julia") == ([ACTIVE], "language")
+    assert _plan(router, prompt_tokens=1000) == ([ACTIVE], "too_long")
+    assert _plan(router, latency="fast") == (["tiny-coder", ACTIVE], "fast")
+    # Sans mesures : on essaie le petit modèle
+    assert _plan(router) == (["tiny-coder", ACTIVE], "cold")
+
+
+def test_plan_uses_latency_stats_and_queue_depth():
+    router = ModelRouter(FAST, ["python"], explore_every=0)
+    router.record(ACTIVE, 2000, True)
+    router.record("tiny-coder", 300, True)
+    assert _plan(router)[1] == "cheaper"
+    # Petit modèle souvent rejeté + file longue : la relance coûterait trop cher
+    for _ in range(10):
+        router.record("tiny-coder", 300, False)
+    assert _plan(router, queue_depth=8, max_concurrency=2) == ([ACTIVE], "slower")
+
+
+def test_validate_output():
+    assert validate_output("```python\ndef f():\n    return 1\n```", "python") is None
+    assert validate_output("```python\ndef f(:\n```", "python").startswith("Syntax error")
+    assert validate_output("", "bash") == "Réponse vide"
+
+
+def test_generate_falls_back_on_invalid_output(monkeypatch):
+    calls = []
+
+    def handler(request):
+        model = json.loads(request.content)["model"]
+        calls.append(model)
+        text = "```python\ndef f(:\n```" if model == "tiny-coder" else "```python\nx = 1\n```"
+        return httpx.Response(200, json={"response": text})
+
+    monkeypatch.setattr(ollama_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    router = ModelRouter(FAST, ["python"], explore_every=0)
+    raw, model = asyncio.run(
+        router.generate("fallback prompt", PARAMS, language="python", prompt_tokens=20, latency="fast")
+    )
+    assert model == ACTIVE and "x = 1" in raw
+    assert calls == ["tiny-coder", ACTIVE]
+    stats = router.snapshot()["models"]
+    assert stats["tiny-coder"]["failures"] == 1
+    assert stats[ACTIVE]["failures"] == 0
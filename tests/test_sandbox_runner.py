@@ -0,0 +1,136 @@
+# tests/test_sandbox_runner.py
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from utils import sandbox_client
+from utils.sandbox_client import run_tests_in_sandbox, SandboxError
+
+RUNNER = Path(__file__).resolve().parents[1] / "containers" / "runner" / "runner_server.py"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def runner():
+    port = _free_port()
+    env = dict(
+        os.environ,
+        RUNNER_HOST="127.0.0.1",
+        RUNNER_PORT=str(port),
+        RUNNER_POOL_SIZE="1",
+        RUNNER_LANGUAGES="python,bash",
+        RUNNER_MAX_RUNS="2",
+    )
+    proc = subprocess.Popen([sys.executable, str(RUNNER)], env=env)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    yield port
+    proc.terminate()
+    proc.wait(timeout=5)
+
+
+@pytest.fixture
+def use_runner(runner, monkeypatch):
+    monkeypatch.setattr(sandbox_client, "SANDBOX_RUNNER_HOST", "127.0.0.1")
+    monkeypatch.setattr(sandbox_client, "SANDBOX_RUNNER_PORT", runner)
+    monkeypatch.setattr(sandbox_client, "SANDBOX_DOCKER_FALLBACK", False)
+
+
+def test_python_runs_in_forked_child(use_runner):
+    for _ in range(3):                          # au‑delà de RUNNER_MAX_RUNS : recyclage
+        status, log, _ = asyncio.run(run_tests_in_sandbox("print('hi')", "python"))
+        assert (status, log) == ("passed", "hi\n")
+    status, log, _ = asyncio.run(run_tests_in_sandbox("raise ValueError('x')", "python"))
+    assert status == "failed"
+    assert "ValueError" in log
+
+
+def test_bash_uses_spare_interpreter(use_runner):
+    status, log, _ = asyncio.run(run_tests_in_sandbox("echo ok; exit 3", "bash"))
+    assert (status, log) == ("failed", "ok\n")
+
+
+def test_timeout_raises(use_runner, monkeypatch):
+    monkeypatch.setattr(sandbox_client, "SANDBOX_TIMEOUT", 0.5)
+    with pytest.raises(SandboxError, match="Timeout"):
+        asyncio.run(run_tests_in_sandbox("import time; time.sleep(5)", "python"))
+
+
+def test_health(runner):
+    with socket.create_connection(("127.0.0.1", runner)) as s:
+        s.sendall(b'{"op": "health"}\n')
+        health = json.loads(s.makefile().readline())
+    assert health["ok"]
+    assert health["pools"]["python"]["kind"] == "fork-server"
+
+
+@pytest.mark.parametrize("reply", [b"", b'{"status": "pass'])
+def test_crashed_runner_falls_back_or_raises_sandbox_error(monkeypatch, reply):
+    async def scenario():
+        async def crashing(reader, writer):
+            await reader.readline()
+            writer.write(reply)                 # réponse vide ou tronquée, puis fermeture
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(crashing, "127.0.0.1", 0)
+        monkeypatch.setattr(sandbox_client, "SANDBOX_RUNNER_HOST", "127.0.0.1")
+        monkeypatch.setattr(sandbox_client, "SANDBOX_RUNNER_PORT", server.sockets[0].getsockname()[1])
+        try:
+            monkeypatch.setattr(sandbox_client, "SANDBOX_DOCKER_FALLBACK", False)
+            with pytest.raises(SandboxError):
+                await run_tests_in_sandbox("print(1)", "python")
+            monkeypatch.setattr(sandbox_client, "SANDBOX_DOCKER_FALLBACK", True)
+            monkeypatch.setattr(sandbox_client, "_run_via_docker_exec", lambda code, lang: ("passed", "1\n", 5))
+            return await run_tests_in_sandbox("print(1)", "python")
+        finally:
+            server.close()
+
+    assert asyncio.run(scenario()) == ("passed", "1\n", 5)
+
+
+def test_unknown_runtime_is_probed_in_background_and_not_cached(monkeypatch):
+    probes, runs = [], []
+
+    async def slow_info(payload, timeout):
+        probes.append(payload)
+        await asyncio.sleep(5)                  # serveur d’exécution qui ne répond pas
+        raise SandboxError("injoignable")
+
+    async def fake_run(code, language):
+        runs.append(code)
+        return "passed", "1\n", 5
+
+    async def scenario():
+        started = time.monotonic()
+        first = await sandbox_client.run_tests_cached("print(1)", "python")
+        second = await sandbox_client.run_tests_cached("print(1)", "python")
+        return time.monotonic() - started, first, second
+
+    monkeypatch.setattr(sandbox_client, "_runner_request", slow_info)
+    monkeypatch.setattr(sandbox_client, "run_tests_in_sandbox", fake_run)
+    monkeypatch.setattr(sandbox_client, "SANDBOX_DOCKER_FALLBACK", False)
+    monkeypatch.setattr(sandbox_client, "_runner_info", {"value": None, "expires": 0.0, "probe": None})
+    elapsed, first, second = asyncio.run(scenario())
+
+    assert elapsed < 1                          # la sonde ne bloque pas la requête
+    assert probes == [{"op": "info"}]           # une seule sonde en vol
+    assert first == second == ("passed", "1\n", 5, False)
+    assert len(runs) == 2                       # runtime inconnu : aucun résultat en cache
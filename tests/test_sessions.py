@@ -0,0 +1,120 @@
+# tests/test_sessions.py
+import json
+import time
+
+import httpx
+
+from utils import ollama_client
+from utils.backends import BackendPool
+from utils.sessions import Session, SessionStore
+
+
+def _session(session_id, context=(1, 2, 3)):
+    session = Session(session_id, model="m", language="python")
+    session.advance("m", "write f", list(context))
+    return session
+
+
+def test_store_spills_lru_to_disk(tmp_path):
+    store = SessionStore(max_sessions=2, ttl=60, spill_dir=str(tmp_path))
+    for name in ("a", "b", "c"):
+        store.put(_session(name))
+    # « a », la moins récemment utilisée, est passée sur disque
+    assert (tmp_path / "a.json").exists()
+    restored = store.get("a")
+    assert restored.context.tolist() == [1, 2, 3]
+    assert restored.instructions == ["write f"]
+    assert store.stats()["disk_hits"] == 1
+    assert store.get("../etc/passwd") is None
+
+
+def test_store_expires_sessions(tmp_path):
+    store = SessionStore(max_sessions=1, ttl=60, spill_dir=None)
+    session = _session("old")
+    session.updated -= 120
+    store.put(session)
+    assert store.get("old") is None
+    assert store.delete("old") is False
+
+
+def test_session_turns_reuse_context(client, monkeypatch, tmp_path):
+    import main
+
+    sent = []
+
+    def handler(request):
+        payload = json.loads(request.content)
+        sent.append(payload)
+        context = payload.get("context", []) + [len(sent)] * 3
+        return httpx.Response(
+            200, json={"response": "```python\nx = 1\n```", "context": context, "done": True}
+        )
+
+    monkeypatch.setattr(ollama_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main, "sessions", SessionStore(spill_dir=str(tmp_path)))
+
+    first = client.post("/v1/sessions/infer", json={"prompt": "write a parser", "language": "python"}).json()
+    assert first["turn"] == 1 and first["rebuilt"] == "new" and not first["context_reused"]
+
+    second = client.post(
+        "/v1/sessions/infer",
+        json={"prompt": "now add type hints", "language": "python", "session_id": first["session_id"]},
+    ).json()
+    assert second["turn"] == 2 and second["context_reused"] and second["rebuilt"] is None
+    assert sent[1]["context"] == [1, 1, 1]
+    assert "now add type hints" in sent[1]["prompt"]
+    assert "You are a senior software engineer" not in sent[1]["prompt"]
+    assert second["prompt_tokens"] < first["prompt_tokens"]
+
+    # Modèle actif changé : prompt complet reconstruit avec les instructions rejouées
+    monkeypatch.setattr(main, "GENERATION_PARAMS", dict(main.GENERATION_PARAMS, model="other"))
+    third = client.post(
+        "/v1/sessions/infer",
+        json={"prompt": "handle errors", "language": "python", "session_id": first["session_id"]},
+    ).json()
+    assert third["rebuilt"] == "model_changed"
+    assert "context" not in sent[2]
+    assert "1. write a parser" in sent[2]["prompt"] and "3. handle errors" in sent[2]["prompt"]
+
+    # Ni cache ni routage dans une session : ces champs sont refusés
+    for field in ({"no_cache": True}, {"latency": "fast"}):
+        assert client.post("/v1/sessions/infer", json={"prompt": "x", **field}).status_code == 422
+
+    assert client.delete(f"/v1/sessions/{first['session_id']}").status_code == 204
+    assert client.delete(f"/v1/sessions/{first['session_id']}").status_code == 404
+    # Session inconnue : nouvelle session sous le même identifiant
+    again = client.post(
+        "/v1/sessions/infer",
+        json={"prompt": "x", "language": "python", "session_id": first["session_id"]},
+    ).json()
+    assert again["rebuilt"] == "expired" and again["session_id"] == first["session_id"]
+
+
+def test_session_follow_ups_stay_on_their_backend(client, monkeypatch, tmp_path):
+    import main
+
+    hosts = []
+
+    def handler(request):
+        hosts.append(request.url.host)
+        return httpx.Response(200, json={"response": "```python\nx = 1\n```", "context": [1], "done": True})
+
+    pool = BackendPool(["http://a:11434", "http://b:11434"])
+    monkeypatch.setattr(ollama_client, "pool", pool)
+    monkeypatch.setattr(ollama_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main, "sessions", SessionStore(spill_dir=str(tmp_path)))
+
+    body = {"prompt": "write a parser", "language": "python", "session_id": "affinity"}
+    client.post("/v1/sessions/infer", json=body)
+    owner = next(b for b in pool.backends if b.url.endswith(f"//{hosts[0]}:11434"))
+    other = next(b for b in pool.backends if b is not owner)
+    assert main.sessions.get("affinity").backend == owner.url
+
+    owner.outstanding = 5                   # plus chargé, mais détient le préfixe
+    client.post("/v1/sessions/infer", json=dict(body, prompt="add type hints"))
+    assert hosts[1] == hosts[0]
+
+    owner.ejected_until = time.monotonic() + 30
+    resp = client.post("/v1/sessions/infer", json=dict(body, prompt="handle errors")).json()
+    assert hosts[2] != hosts[0] and resp["context_reused"]
+    assert main.sessions.get("affinity").backend == other.url
@@ -0,0 +1,76 @@
+# tests/test_tracing.py
+import asyncio
+
+from utils import sandbox_client, tracing
+from utils.tracing import Trace, TraceBuffer, span, _current
+
+
+def test_span_is_noop_without_trace():
+    with span("orphan") as record:
+        assert record is None
+
+
+def test_spans_nest_and_follow_threads():
+    trace = Trace("unit", trace_id="not valid!")
+    assert trace.trace_id != "not valid!"
+    token = _current.set(trace)
+
+    def in_thread():
+        with span("worker"):
+            pass
+
+    async def main():
+        with span("outer", language="python"):
+            await asyncio.to_thread(in_thread)
+            try:
+                with span("failing"):
+                    raise KeyError("x")
+            except KeyError:
+                pass
+
+    try:
+        asyncio.run(main())
+    finally:
+        _current.reset(token)
+    outer, worker, failing = trace.spans
+    assert outer["language"] == "python" and outer["parent"] is None
+    assert worker["parent"] == outer["id"] and failing["parent"] == outer["id"]
+    assert failing["error"] == "KeyError"
+    assert outer["duration_ms"] >= worker["duration_ms"]
+
+
+def test_trace_buffer_is_bounded():
+    buffer = TraceBuffer(max_entries=2)
+    for i in range(3):
+        t = Trace(f"GET /{i}")
+        t.duration_ms = float(i)
+        buffer.add(t)
+    assert len(buffer) == 2
+    assert [t.name for t in buffer.recent(min_ms=1.5)] == ["GET /2"]
+
+
+def test_request_trace_and_profile(client, monkeypatch):
+    async def fake_runner(payload, timeout):
+        if payload.get("op") == "info":
+            return {}
+        return {"status": "passed", "log": "", "duration_ms": 3}
+
+    monkeypatch.setattr(sandbox_client, "_runner_request", fake_runner)
+    monkeypatch.setattr(tracing, "PROFILING_ENABLED", True)
+    r = client.post(
+        "/v1/run-tests",
+        json={"code": "print('trace')", "language": "python", "no_cache": True},
+        headers={"X-Trace-Id": "trace-test-0001", "X-Profile": "1"},
+    )
+    assert r.status_code == 200
+    assert r.headers["x-trace-id"] == "trace-test-0001"
+
+    detail = client.get("/debug/traces/trace-test-0001").json()
+    assert detail["status"] == 200
+    assert [s["name"] for s in detail["spans"]] == ["sandbox"]
+    assert detail["spans"][0]["language"] == "python"
+    assert "samples" in detail["profile"]
+
+    listed = client.get("/debug/traces", params={"name": "/v1/run-tests"}).json()["traces"]
+    assert listed[0]["trace_id"] == "trace-test-0001" and listed[0]["profiled"]
+    assert client.get("/debug/traces/unknown-trace").status_code == 404
@@ -0,0 +1,70 @@
+# tests/test_warmup.py
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from utils import warmup
+from utils.warmup import Readiness
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+
+
+def test_readiness_retries_until_ready(monkeypatch):
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_INTERVAL", 0.001)
+    calls = {"flaky": 0}
+    errors = []
+
+    async def flaky():
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            raise ConnectionError("pas encore démarré")
+
+    async def ok():
+        return None
+
+    async def scenario():
+        readiness = Readiness(required=["flaky", "ok"], enabled=True)
+        readiness.start({"flaky": flaky, "ok": ok}, on_error=lambda n, e: errors.append(n))
+        assert not readiness.ready
+        assert await readiness.wait(timeout=5)
+        return readiness.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["flaky"]["state"] == "ready" and snapshot["flaky"]["attempts"] == 3
+    assert errors == ["flaky", "flaky"]
+
+
+def test_optional_dependency_does_not_block_readiness():
+    async def broken():
+        raise RuntimeError("absent")
+
+    async def scenario():
+        readiness = Readiness(required=[], enabled=True)
+        readiness.start({"sandbox": broken})
+        await asyncio.sleep(0.01)
+        state = readiness.snapshot()["sandbox"]["state"]
+        readiness.stop()
+        return readiness.ready, state
+
+    assert asyncio.run(scenario()) == (True, "failed")
+
+
+def test_importing_api_does_not_load_chromadb(tmp_path):
+    code = "import sys, main; print('chromadb' in sys.modules)"
+    env = dict(os.environ, LOG_ROOT=str(tmp_path))
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND, env=env, capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == "False"
+
+
+def test_readyz_reports_each_dependency(client):
+    r = client.get("/readyz")
+    body = r.json()
+    assert set(body["dependencies"]) == {"chroma", "embedder", "ollama"}
+    assert r.status_code == (200 if body["ready"] else 503)
+    # Préchauffage désactivé en tests (conftest) : l’API n’est pas prête mais reste vivante
+    assert body["dependencies"]["ollama"]["state"] == "disabled"
+    assert client.get("/healthz").status_code == 200